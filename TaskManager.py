@@ -2,35 +2,83 @@
 Консольный менеджер задач
 """
 import argparse
-import os
+import io
 import json
-import dateutil.parser as date_parser
+import os
+import shlex
+import socket
+import sys
 import csv
+import time
+import traceback
+from array import array
+from bisect import bisect_left, insort
+from collections import deque
+from contextlib import ExitStack, contextmanager, nullcontext, redirect_stderr, redirect_stdout
+from itertools import batched, chain, islice
+from operator import attrgetter
+from datetime import date
+from functools import lru_cache
+from heapq import nsmallest
+
+import storage
 
 VERSION = '1.0 20241202'
 TASKS_CSV = 'tasks.csv'  # Путь к CSV-файлу с задачами.
 TASKS_JSON = 'tasks.json'  # Путь к JSON-файлу с задачами.
+TASKS_JOURNAL = 'tasks.journal'  # Путь к журналу изменений списка задач (режим хранения journal).
+TASKS_DB = 'tasks.db'  # Путь к базе данных SQLite с задачами (режим хранения sqlite).
+TASKS_SNAPSHOT = 'tasks.snap'  # Путь к двоичному снимку списка задач (режим хранения snapshot).
+TASKS_SHARDS = 'tasks.shards'  # Путь к каталогу шардов списка задач по категориям (режим хранения shards).
+TASKS_SOCKET = 'tasks.sock'  # Путь к сокету Unix демона (команда serve).
+SAVE_INTERVAL = 1.0  # Период сохранения изменений демоном (с).
+SORTS = ('id', 'due_date', 'priority')  # Порядок вывода задач (--sort).
+NO_DAY = date.max.toordinal() + 1  # Ключ сортировки срока не в формате гггг-мм-дд (после всех дат).
+JOURNAL_LIMIT = 1 << 20  # Размер журнала (байт), по достижении которого он сворачивается в JSON-файл.
+# Режимы хранения: полная перезапись JSON-файла, дозапись журнала изменений, база данных SQLite, двоичный снимок,
+# шарды по категориям.
+STORAGES = ('json', 'journal', 'sqlite', 'snapshot', 'shards')
+STORAGE = 'json'  # Режим хранения по умолчанию.
+# Наименьшие длины строк-ячеек таблицы (по заголовкам столбцов).
+NAME_LENGTH = dict(id=2, title=8, description=8, category=9, due_date=15, priority=9, status=12)
 HEADS = dict(id='ID', title='Название', description='Описание', category='Категория', due_date='Срок выполнения',
              priority='Приоритет', status='Статус')  # Словарь заголовков столбцов таблицы.
 PRIORITIES = ('Низкий', 'Средний', 'Высокий')  # Ограниченный набор приоритетов.
 STATUSES = ('Не выполнена', 'Выполнена')  # Ограниченный набор статусов.
+OUT_ROWS = 1024  # Количество строк таблицы, выводимых одной записью в поток вывода.
+DATES_CACHE = 4096  # Количество запоминаемых результатов разбора дат в свободном формате.
+IMPORT_FORMATS = ('csv', 'ndjson', 'json')  # Форматы импортируемых файлов.
+IMPORT_BATCH = 10000  # Количество задач в пакете проверки при импорте.
+IMPORT_ERRORS = 10  # Количество выводимых ошибок импорта.
+EXPORT_FORMATS = ('csv', 'ndjson', 'columns', 'json')  # Форматы выгрузки (команда csv).
+EXPORT_CHUNK = 10000  # Количество задач в части выгрузки.
+SHARD_MIN = 50000  # Наименьшее количество задач в части списка при параллельном поиске (--jobs).
+SHELL_PROMPT = 'tasks> '  # Приглашение оболочки (команда shell).
+SHELL_COMMANDS = ('save', 'quit', 'exit', 'help')  # Собственные команды оболочки.
+COMPLETIONS = 1000  # Наибольшее количество вариантов дополнения ID в оболочке.
+HISTORY_TASKS = 1000  # Наибольшее количество задач в записи истории изменений (бóльшие изменения очищают историю).
+HISTORY_SIZE = 1 << 20  # Наибольший размер файла истории изменений (байт).
 
 
 class Task:
     """
-    Задача.
+    Задача. Приоритет хранится номером (см. PRIORITIES), атрибут priority возвращает его название.
+    Срок выполнения хранится порядковым номером дня (date.toordinal), атрибут due_date возвращает дату
+    в формате гггг-мм-дд; срок в другом формате (из старых файлов) хранится строкой.
     """
+    __slots__ = ('id', 'title', 'description', 'category', '_due_date', '_priority', 'status')
     index = 0  # Текущий индекс (ID задачи).
+    dates = {}  # Даты сроков выполнения: {порядковый номер дня: дата в формате гггг-мм-дд}.
 
-    def __init__(self, title: str, description: str, category: str, due_date: str, priority: int, id: int = 0,
+    def __init__(self, title: str, description: str, category: str, due_date: str | int, priority: int, id: int = 0,
                  status: bool = False):
         """
         Задача.
         :param title: Название задачи.
         :param description: Описание задачи.
         :param category: Категория задачи.
-        :param due_date: Срок выполнения задачи. Формат гггг-мм-дд.
-        :param priority: Приоритет задачи: 0 — низкий, 1 — средний, 2 — высокий.
+        :param due_date: Срок выполнения задачи. Формат гггг-мм-дд (или порядковый номер дня).
+        :param priority: Приоритет задачи: 0 — низкий, 1 — средний, 2 — высокий (или название из PRIORITIES).
         :param id: ID задачи, импортируемой из файла, при инициализации менеджера задач.
         :param status: Статус задачи.
         """
@@ -45,9 +93,65 @@ class Task:
         self.description = description
         self.category = category
         self.due_date = due_date
-        self.priority = PRIORITIES[priority]
+        self.priority = priority
         self.status = status
 
+    @property
+    def priority(self) -> str:
+        """
+        Название приоритета задачи.
+        """
+        return PRIORITIES[self._priority]
+
+    @priority.setter
+    def priority(self, value: int | str):
+        self._priority = PRIORITIES.index(value) if isinstance(value, str) else value
+
+    @property
+    def due_date(self) -> str:
+        """
+        Срок выполнения задачи в формате гггг-мм-дд.
+        """
+        day = self._due_date
+        if isinstance(day, str):
+            return day
+        value = Task.dates.get(day)
+        if value is None:
+            value = Task.dates[day] = date.fromordinal(day).isoformat()
+        return value
+
+    @due_date.setter
+    def due_date(self, value: str | int):
+        self._due_date = (self.to_day(value) or value) if isinstance(value, str) else value
+
+    @staticmethod
+    def to_day(value: str) -> int:
+        """
+        Порядковый номер дня даты в формате гггг-мм-дд.
+        :param value: Дата.
+        :return: Порядковый номер дня или 0, если дата не в формате гггг-мм-дд.
+        """
+        if len(value) == 10 and value[4] == value[7] == '-':
+            try:
+                return date.fromisoformat(value).toordinal()
+            except ValueError:
+                pass
+        return 0
+
+    @property
+    def day(self) -> int:
+        """
+        Порядковый номер дня срока выполнения (0 — срок не в формате гггг-мм-дд).
+        """
+        return 0 if isinstance(self._due_date, str) else self._due_date
+
+    def as_dict(self) -> dict:
+        """
+        Словарь полей задачи (приоритет — названием), в том виде, в каком задача записывается в файлы.
+        """
+        return dict(id=self.id, title=self.title, description=self.description, category=self.category,
+                    due_date=self.due_date, priority=PRIORITIES[self._priority], status=self.status)
+
     def __contains__(self, item) -> bool:
         """
         Поиск текста в задаче (в названии или в описании).
@@ -57,18 +161,600 @@ class Task:
         return item.lower() in self.title.lower() or item.lower() in self.description.lower()
 
 
+class TaskColumns:
+    """
+    Поколоночное хранение списка задач для команд, только читающих список (--columnar).
+    ID, приоритет, статус и срок (порядковый номер дня) хранятся в числовых массивах,
+    категория — номером в списке уникальных категорий. Объекты Task создаются при переборе и не хранятся.
+    """
+
+    def __init__(self, tasks=()):
+        """
+        Поколоночное хранение списка задач.
+        :param tasks: Итерируемый набор словарей полей задач с приведёнными приоритетом и статусом
+            (см. TaskManager._normalize).
+        """
+        self.ids = array('q')
+        self.priorities = array('b')
+        self.statuses = array('b')
+        self.due_dates = array('l')  # Порядковые номера дней (date.toordinal); 0 — срок не в формате гггг-мм-дд.
+        self.raw_dates = {}  # Сроки не в формате гггг-мм-дд: {номер строки: срок}.
+        self.categories = array('l')  # Номера категорий в списке category_names.
+        self.category_names = []  # Уникальные категории.
+        self.category_codes = {}  # Номера категорий: {категория: номер}.
+        self.titles = []
+        self.descriptions = []
+        for task in tasks:
+            self.append(task)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self):
+        return map(self.row, range(len(self.ids)))
+
+    def append(self, task: dict):
+        """
+        Добавление задачи.
+        :param task: Словарь полей задачи с приведёнными приоритетом и статусом.
+        """
+        day = Task.to_day(task['due_date'])
+        if not day:
+            self.raw_dates[len(self.ids)] = task['due_date']
+        code = self.category_codes.get(task['category'])
+        if code is None:
+            code = self.category_codes[task['category']] = len(self.category_names)
+            self.category_names.append(task['category'])
+        self.ids.append(task['id'])
+        self.priorities.append(task['priority'])
+        self.statuses.append(task['status'])
+        self.due_dates.append(day)
+        self.categories.append(code)
+        self.titles.append(task['title'])
+        self.descriptions.append(task['description'])
+
+    def row(self, i: int) -> Task:
+        """
+        Задача по номеру строки.
+        :param i: Номер строки.
+        :return: Объект Task.
+        """
+        day = self.due_dates[i]
+        return Task(self.titles[i], self.descriptions[i], self.category_names[self.categories[i]],
+                    day or self.raw_dates[i], self.priorities[i], self.ids[i], bool(self.statuses[i]))
+
+    def sort(self):
+        """
+        Упорядочивание строк по ID.
+        """
+        order = sorted(range(len(self.ids)), key=self.ids.__getitem__)
+        if all(order[i] == i for i in range(len(order))):
+            return
+        for name in ('ids', 'priorities', 'statuses', 'due_dates', 'categories'):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, (column[i] for i in order)))
+        self.titles = [self.titles[i] for i in order]
+        self.descriptions = [self.descriptions[i] for i in order]
+        position = {old: new for new, old in enumerate(order)}
+        self.raw_dates = {position[i]: value for i, value in self.raw_dates.items()}
+
+    def select(self, query: 'Query'):
+        """
+        Поиск задач (условия те же, что и в Query.match). Категории проверяются один раз
+        на уникальное значение, статус, приоритет и срок — по числовым массивам.
+        :param query: Запрос.
+        :return: Итератор задач (Task), упорядоченных по ID.
+        """
+        conditions = []
+        if query.text:
+            text = query.text.lower()
+            titles, descriptions = self.titles, self.descriptions
+            conditions.append(lambda i: text in titles[i].lower() or text in descriptions[i].lower())
+        if query.category:
+            codes = {code for name, code in self.category_codes.items() if query.category in name}
+            categories = self.categories
+            conditions.append(lambda i: categories[i] in codes)
+        if query.status is not None:
+            statuses, status = self.statuses, int(bool(query.status))
+            conditions.append(lambda i: statuses[i] == status)
+        if query.priority is not None:
+            priorities, priority = self.priorities, query.priority
+            conditions.append(lambda i: priorities[i] == priority)
+        if query.due_from or query.due_to:
+            days, raw_dates = self.due_dates, self.raw_dates
+            first, last = query.due_from or '', query.due_to or '\uffff'
+            lo, hi = query.first, query.last
+            conditions.append(lambda i: lo <= days[i] <= hi if days[i] else first <= raw_dates[i] <= last)
+        if not conditions:
+            return iter(self) if query.inner else iter(())
+        check = all if query.inner else any
+        return (self.row(i) for i in range(len(self.ids)) if check(c(i) for c in conditions))
+
+
+class TextIndex:
+    """
+    Триграммный индекс названий и описаний задач для поиска фрагмента текста без учёта регистра.
+    Для каждой триграммы (трёх подряд идущих символов текста в нижнем регистре) хранится массив ID задач.
+    Массивы только дополняются: после удаления или изменения задачи в них остаются устаревшие ID,
+    поэтому найденные по индексу задачи-кандидаты проверяются точным поиском подстроки.
+    """
+
+    def __init__(self, tasks=()):
+        """
+        Триграммный индекс.
+        :param tasks: Итерируемый набор индексируемых задач (Task).
+        """
+        self.grams = {}  # {триграмма: array ID задач}.
+        self.stale = 0  # Количество устаревших записей (удалённые и изменённые задачи).
+        for task in tasks:
+            self.add(task)
+
+    @staticmethod
+    def split(text: str) -> set:
+        """
+        Триграммы текста.
+        :param text: Текст в нижнем регистре.
+        :return: Множество триграмм.
+        """
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def add(self, task: Task):
+        """
+        Индексирование задачи.
+        :param task: Объект Task.
+        """
+        grams = self.grams
+        for gram in self.split(task.title.lower()) | self.split(task.description.lower()):
+            ids = grams.get(gram)
+            if ids is None:
+                grams[gram] = array('I', (task.id,))
+            elif ids[-1] != task.id:
+                ids.append(task.id)
+
+    def remove(self, task: Task):
+        """
+        Учёт удаления задачи из индекса (записи задачи становятся устаревшими).
+        :param task: Объект Task.
+        """
+        self.stale += 1
+
+    def candidates(self, text: str):
+        """
+        Задачи-кандидаты, содержащие все триграммы искомого текста.
+        :param text: Искомый текст.
+        :return: Массив ID (возможны повторы и ID удалённых задач) или None, если текст короче трёх символов
+            и индекс неприменим.
+        """
+        grams = self.split(text.lower())
+        if not grams:
+            return None
+        return min((self.grams.get(gram, ()) for gram in grams), key=len)
+
+
+class SortedIndex:
+    """
+    Упорядоченный индекс задач: отсортированный список ключей сортировки (см. Query.KEYS), который
+    поддерживается вставкой и удалением с двоичным поиском (bisect) при добавлении, изменении и удалении задач.
+    Ключ заканчивается ID задачи, поэтому ключи уникальны. Обход индекса с проверкой условий позволяет
+    получить первые K задач в нужном порядке, не сортируя весь список.
+    """
+
+    def __init__(self, key, tasks=()):
+        """
+        Упорядоченный индекс.
+        :param key: Функция ключа сортировки задачи (кортеж, первый элемент — упорядочиваемое значение).
+        :param tasks: Итерируемый набор индексируемых задач (Task).
+        """
+        self.key = key
+        self.keys = sorted(map(key, tasks))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __iter__(self):
+        """
+        :return: Итератор ID задач в порядке ключей.
+        """
+        return (key[-1] for key in self.keys)
+
+    def add(self, task: Task):
+        """
+        Индексирование задачи.
+        :param task: Объект Task.
+        """
+        insort(self.keys, self.key(task))
+
+    def remove(self, task: Task):
+        """
+        Удаление задачи из индекса (до изменения полей ключа).
+        :param task: Объект Task.
+        """
+        key = self.key(task)
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+
+    def between(self, first, last) -> tuple:
+        """
+        Диапазон индекса по первому элементу ключа (включительно), найденный двоичным поиском.
+        :param first: Начало диапазона.
+        :param last: Конец диапазона (целое число).
+        :return: Количество задач диапазона и итератор их ID в порядке ключей.
+        """
+        keys = self.keys
+        i = bisect_left(keys, (first,))
+        j = bisect_left(keys, (last + 1,))
+        return j - i, (keys[n][-1] for n in range(i, j))
+
+
+class TaskStats:
+    """
+    Агрегированные счётчики списка задач (команда stats): количество задач по категориям, статусам и приоритетам,
+    невыполненных задач по срокам (для подсчёта просроченных) и значений столбцов таблицы по длинам
+    (для ширины столбцов). Счётчики изменяются вместе со списком задач и сохраняются рядом с ним,
+    поэтому статистика не требует загрузки списка, а её время не зависит от количества задач.
+    """
+    WIDTHS = ('id', 'title', 'description', 'category', 'due_date', 'status')  # Столбцы с учётом длин значений.
+
+    def __init__(self, tasks=()):
+        """
+        Агрегированные счётчики.
+        :param tasks: Итерируемый набор задач (Task), по которым счётчики пересчитываются с нуля.
+        """
+        self.total = 0
+        self.categories = {}  # {категория: количество задач}.
+        self.statuses = [0, 0]  # Количество задач по статусам.
+        self.priorities = [0, 0, 0]  # Количество задач по приоритетам.
+        self.days = {}  # Невыполненные задачи по срокам: {срок: количество}.
+        self.lengths = {key: {} for key in self.WIDTHS}  # {столбец: {длина значения: количество задач}}.
+        for task in tasks:
+            self.add(task)
+
+    @staticmethod
+    def _count(counter: dict, key, n: int):
+        """
+        Изменение счётчика словаря; нулевые счётчики удаляются.
+        """
+        value = counter.get(key, 0) + n
+        if value:
+            counter[key] = value
+        else:
+            del counter[key]
+
+    def add(self, task: Task, n: int = 1):
+        """
+        Учёт задачи (после изменения её полей).
+        :param task: Объект Task.
+        :param n: 1 — задача учитывается, -1 — исключается (см. remove).
+        """
+        self.total += n
+        self._count(self.categories, task.category, n)
+        self.statuses[task.status] += n
+        self.priorities[task._priority] += n
+        if not task.status:
+            self._count(self.days, task.due_date, n)
+        values = (f'{task.id}', task.title, task.description, task.category, task.due_date, STATUSES[task.status])
+        for key, value in zip(self.WIDTHS, values):
+            self._count(self.lengths[key], len(value), n)
+
+    def remove(self, task: Task):
+        """
+        Исключение задачи (до изменения её полей).
+        :param task: Объект Task.
+        """
+        self.add(task, -1)
+
+    def overdue(self, today: str) -> int:
+        """
+        :param today: Сегодняшняя дата в формате гггг-мм-дд.
+        :return: Количество невыполненных задач со сроком раньше сегодняшнего дня
+            (сроки не в формате гггг-мм-дд сравниваются строками, как при поиске).
+        """
+        return sum(cnt for day, cnt in self.days.items() if day < today)
+
+    def widths(self) -> dict:
+        """
+        :return: Наибольшие длины значений столбцов: {столбец: длина}.
+        """
+        return {key: max(lengths, default=0) for key, lengths in self.lengths.items()}
+
+    def as_dict(self) -> dict:
+        """
+        Словарь счётчиков для сохранения в хранилище.
+        """
+        return dict(total=self.total, categories=self.categories, statuses=self.statuses,
+                    priorities=self.priorities, days=self.days, lengths=self.lengths)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'TaskStats':
+        """
+        Счётчики из словаря, сохранённого в хранилище (ключи-длины JSON хранит строками).
+        :param data: Словарь счётчиков (см. as_dict).
+        :return: Объект TaskStats.
+        """
+        stats = cls()
+        stats.total = data['total']
+        stats.categories = data['categories']
+        stats.statuses = data['statuses']
+        stats.priorities = data['priorities']
+        stats.days = data['days']
+        stats.lengths = {key: {int(n): cnt for n, cnt in data['lengths'][key].items()} for key in cls.WIDTHS}
+        return stats
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, TaskStats) and self.as_dict() == other.as_dict()
+
+
+class Query:
+    """
+    Запрос поиска задач. Срок выполнения задаётся диапазоном дат в формате гггг-мм-дд (включительно,
+    любая из границ может быть опущена). В режиме INNER задача должна удовлетворять всем условиям,
+    иначе — хотя бы одному. Из найденных задач, упорядоченных по ID (или по ключу sort), пропускаются
+    первые offset и выводятся не более limit.
+    """
+    NAMES = dict(text='текст', category='категория', status='статус', priority='приоритет',
+                 due_date='срок')  # Названия условий для плана поиска.
+    # Ключи сортировки (см. SORTS): срок — по возрастанию, приоритет — по убыванию, при равенстве — по ID.
+    KEYS = dict(
+        id=attrgetter('id'),
+        due_date=lambda task: (task.day or NO_DAY, task.id),
+        priority=lambda task: (-task._priority, task.id),
+    )
+
+    def __init__(self, text: str | None = None, category: str | None = None, status: int | None = None,
+                 inner: bool = False, priority: int | None = None, due_from: str | None = None,
+                 due_to: str | None = None, limit: int | None = None, offset: int = 0, sort: str = 'id'):
+        """
+        Запрос поиска задач.
+        :param text: Фрагмент названия или описания (без учёта регистра).
+        :param category: Фрагмент категории.
+        :param status: Статус (0 или 1).
+        :param inner: True — задача должна удовлетворять всем условиям; False — хотя бы одному.
+        :param priority: Приоритет (0, 1 или 2).
+        :param due_from: Начало диапазона срока выполнения.
+        :param due_to: Конец диапазона срока выполнения.
+        :param limit: Наибольшее количество задач в результате (None — без ограничения).
+        :param offset: Количество пропускаемых задач.
+        :param sort: Порядок задач в результате (см. SORTS).
+        """
+        self.text = text or None
+        self.category = category or None
+        self.status = status
+        self.inner = inner
+        self.priority = priority
+        self.due_from = due_from or None
+        self.due_to = due_to or None
+        # Диапазон срока выполнения порядковыми номерами дней.
+        self.first = due_from and Task.to_day(due_from) or 1
+        self.last = due_to and Task.to_day(due_to) or date.max.toordinal()
+        self.limit = limit
+        self.offset = offset
+        self.sort = sort
+        self.key = self.KEYS[sort]
+        self.checks = {}  # Проверки заданных условий: {имя условия: функция(Task) -> bool}.
+        if self.text:
+            self.checks['text'] = lambda task: self.text in task
+        if self.category:
+            self.checks['category'] = lambda task: self.category in task.category
+        if status is not None:
+            self.checks['status'] = lambda task: bool(status) == task.status
+        if priority is not None:
+            self.checks['priority'] = lambda task: task.priority == PRIORITIES[priority]
+        if self.due_from or self.due_to:
+            self.checks['due_date'] = self._check_due_date
+
+    def _check_due_date(self, task: Task) -> bool:
+        """
+        Проверка срока выполнения задачи: по порядковому номеру дня, для срока не в формате гггг-мм-дд —
+        сравнением строк.
+        """
+        day = task.day
+        if day:
+            return self.first <= day <= self.last
+        return (self.due_from or '') <= task.due_date <= (self.due_to or '\uffff')
+
+    def match(self, task: Task) -> bool:
+        """
+        Проверка соответствия задачи условиям запроса.
+        :param task: Объект Task.
+        :return: True, если задача соответствует.
+        """
+        if self.inner:
+            return all(check(task) for check in self.checks.values())
+        return any(check(task) for check in self.checks.values())
+
+    def page(self, tasks):
+        """
+        Выбор страницы результата (offset, limit). Итератор не материализуется.
+        :param tasks: Итератор найденных задач.
+        :return: Итератор задач страницы.
+        """
+        if not self.offset and self.limit is None:
+            return tasks
+        return islice(tasks, self.offset, None if self.limit is None else self.offset + self.limit)
+
+    def params(self) -> dict:
+        """
+        Условия запроса для хранилища (select хранилищ, выполняющих запросы сами: lazy).
+        """
+        return dict(text=self.text, category=self.category, status=self.status, inner=self.inner,
+                    priority=self.priority, due_from=self.due_from, due_to=self.due_to, limit=self.limit,
+                    offset=self.offset, sort=self.sort)
+
+
+class Profiler:
+    """
+    Замер выполнения команды (--profile, --metrics, --cprofile): время фаз (разбор аргументов, загрузка списка задач,
+    команда, вывод, сохранение), пиковая память (tracemalloc) и количество задач. Методы фаз заменяются замеряющими
+    обёртками только у профилируемого менеджера задач (атрибутами экземпляра), поэтому без параметров профилирования
+    замер ничего не стоит. Время вложенных фаз (сохранение перед загрузкой, вывод внутри команды) вычитается
+    из времени внешней фазы.
+    """
+    # Фазы: {метод TaskManager: фаза}; команда — args.func.
+    METHODS = dict(_load='load', _save='save', _set_name_length='render', _set_result='render')
+    NAMES = dict(parse='разбор аргументов', load='загрузка', command='команда', render='вывод',
+                 save='сохранение')  # Названия фаз для отчёта.
+
+    def __init__(self, parse: float, memory: bool = True, cprofile: str | None = None):
+        """
+        Замер выполнения команды.
+        :param parse: Время разбора аргументов (с): разбор предшествует созданию замера.
+        :param memory: Замерять пиковую память (tracemalloc замедляет выделение памяти).
+        :param cprofile: Путь к файлу профиля cProfile (None — без cProfile).
+        """
+        self.times = dict.fromkeys(self.NAMES, 0.0)
+        self.times['parse'] = parse
+        self.total = parse
+        self.inner = []  # Время вложенных фаз выполняемых фаз (стек).
+        self.changes = 0  # Количество сохранённых изменений.
+        self.peak = None  # Пиковая память (байт).
+        self.memory = memory
+        self.cprofile = cprofile
+        self.profile = None
+        self.start = 0.0
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Замер фазы.
+        :param name: Фаза (см. NAMES).
+        """
+        self.inner.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            t = time.perf_counter() - start
+            self.times[name] += t - self.inner.pop()
+            if self.inner:
+                self.inner[-1] += t
+
+    def _timed(self, name: str, func):
+        """
+        Замеряющая обёртка метода.
+        :param name: Фаза.
+        :param func: Метод.
+        """
+        def timed(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return timed
+
+    def attach(self, tm: 'TaskManager', args: argparse.Namespace):
+        """
+        Начало замера: обёртки методов фаз менеджера задач и команды, запуск tracemalloc и cProfile.
+        :param tm: Менеджер задач.
+        :param args: Аргументы из командной строки (func заменяется обёрткой).
+        """
+        for method, name in self.METHODS.items():
+            setattr(tm, method, self._timed(name, getattr(tm, method)))
+        timed_save = tm._save
+
+        def save():
+            self.changes += len(tm.changes)
+            timed_save()
+
+        tm._save = save
+        args.func = self._timed('command', args.func)
+        if self.memory:
+            import tracemalloc  # Импорт только при замере.
+            tracemalloc.start()
+        if self.cprofile:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.start = time.perf_counter()
+
+    def detach(self, tm: 'TaskManager'):
+        """
+        Завершение замера: восстановление методов, остановка tracemalloc, запись профиля cProfile.
+        :param tm: Менеджер задач.
+        """
+        self.total += time.perf_counter() - self.start
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(self.cprofile)
+        if self.memory:
+            import tracemalloc
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        for method in self.METHODS:
+            vars(tm).pop(method, None)  # Снова методы класса.
+
+    def report(self, command: str, tasks: int) -> str:
+        """
+        Отчёт о выполнении команды (--profile).
+        :param command: Команда.
+        :param tasks: Количество загруженных задач.
+        :return: Отчёт текстом.
+        """
+        res = f'Профиль команды {command}:\n'
+        for name, t in self.times.items():
+            res += f'  {self.NAMES[name]:<18} {t * 1000:10.1f} мс\n'
+        res += f'  {'всего':<18} {self.total * 1000:10.1f} мс\n'
+        if self.peak is not None:
+            res += f'Пиковая память (tracemalloc): {self.peak / (1 << 20):.1f} МиБ.\n'
+        res += f'Загружено задач: {tasks}, сохранено изменений: {self.changes}.\n'
+        return res
+
+    def metrics(self, command: str, tasks: int, argv: list, storage_name: str, conflicts: int) -> dict:
+        """
+        Метрики выполнения команды (--metrics) для записи JSON-объектом.
+        :param command: Команда.
+        :param tasks: Количество загруженных задач.
+        :param argv: Аргументы команды.
+        :param storage_name: Режим хранения.
+        :param conflicts: Количество повторов команды из-за изменения хранилища другим процессом.
+        :return: Словарь метрик (время — в секундах, память — в байтах).
+        """
+        return dict(time=time.strftime('%Y-%m-%dT%H:%M:%S'), version=VERSION, command=command, argv=argv,
+                    storage=storage_name, phases=self.times, total=self.total, peak_memory=self.peak,
+                    tasks=tasks, changes=self.changes, conflicts=conflicts, lock_wait=storage.Storage.waited)
+
+
 class TaskManager:
     """
     Менеджер задач.
     """
     tasks = []  # Список задач.
+    loaded = False  # Флаг загрузки списка задач из хранилища (загружается по первому требованию команды).
+    counted = False  # Флаг определения последнего выданного ID (достаточно для добавления задач без загрузки).
+    ids = {}  # Индекс задач по ID: {ID: Task}.
+    categories = {}  # Индекс задач по категории (в нижнем регистре): {категория: {ID: Task}}.
+    # Триграммный индекс текста задач (TextIndex), строится при первом поиске по тексту в долгоживущем процессе.
+    texts = None
+    orders = {}  # Упорядоченные индексы задач (SortedIndex): {ключ сортировки: индекс}, строятся по требованию.
+    scanning = None  # Запрос параллельного поиска (см. _select_parallel), наследуемый процессами пула при fork.
 
-    def __init__(self):
+    def __init__(self, storage: str = STORAGE, columnar: bool = False):
+        """
+        Менеджер задач.
+        :param storage: Режим хранения (см. STORAGES).
+        :param columnar: Загружать список задач в поколоночное хранение (TaskColumns).
+            Только для команд, не изменяющих список задач.
+        """
         self.parser = self._get_parser()  # Парсер консольной команды.
         self.result = ''  # Текст (строка) для вывода в консоль.
-        # Длины строк-ячеек.
-        self.name_length = dict(id=2, title=8, description=8, category=9, due_date=15, priority=9, status=12)
-        self._load_tasks()
+        self.out = None  # Поток вывода таблиц по мере формирования строк (None — таблица возвращается текстом).
+        self.changes = {}  # Несохранённые изменения: {ID: Task или None для удалённой задачи}.
+        self.name_length = dict(NAME_LENGTH)  # Длины строк-ячеек (сбрасываются перед каждой командой, см. _call).
+        self.storage = self._get_storage(storage)  # Хранилище списка задач.
+        self.columnar = columnar
+        self.table = None  # Поколоночное хранение загруженного списка задач (TaskColumns) при columnar.
+        self.version = None  # Версия хранилища, из которой загружен список задач (None — не загружался).
+        self.stats = None  # Агрегированные счётчики списка задач (TaskStats; None — не сохранены или устарели).
+        self.conflicts = 0  # Количество команд, повторённых из-за изменения хранилища другим процессом.
+        self.error = None  # Описание ошибки выполняемой команды (см. _fail) или None, если она выполнена.
+        self.failed = False  # Команда пакетного режима завершилась ошибкой (код завершения скрипта 1).
+        # Исключительная блокировка хранилища демоном или оболочкой до сохранения изменений (ExitStack).
+        self.hold = None
+        self.step = None  # Запись истории изменений выполняемой команды (см. _call).
+        self.steps = []  # Несохранённые записи истории изменений (см. _track).
+        self.undone = 0  # Количество сохранённых записей истории, отменённых командой undo (удаляются при сохранении).
+        self.forget = False  # При сохранении история очищается (изменено больше HISTORY_TASKS задач одной командой).
+        # Список задач хранится в памяти между командами (пакетный режим, оболочка, демон): построение
+        # триграммного индекса окупается. Отдельная команда ищет текст перебором, если индекс не построен.
+        self.resident = False
 
     # @staticmethod
     def _get_parser(self) -> argparse.ArgumentParser:
@@ -78,6 +764,7 @@ class TaskManager:
         """
         parser = argparse.ArgumentParser(prog='TaskManager.py', description=f'Менеджер задач (версия {VERSION})')
         subparsers = parser.add_subparsers(help='Команды:')
+        self.commands = subparsers.choices  # Парсеры команд: {имя команды: парсер} (дополнение в оболочке).
 
         parser_add = subparsers.add_parser('add', help='Добавление задачи одной командой.')
         parser_add.add_argument('title', help='Название задачи.')
@@ -93,149 +780,1037 @@ class TaskManager:
         parser_add.set_defaults(func=self.add)
 
         parser_add_inter = subparsers.add_parser('add_inter', help='Добавление задачи в интерактивном режиме.')
-        parser_add_inter.set_defaults(func=self.add_inter)
+        parser_add_inter.set_defaults(func=self.add_inter, interactive=True)
+
+        parser_completed = subparsers.add_parser('completed', help='Отметка задачи как выполненной.')
+        parser_completed.add_argument('id', nargs='*', type=int, help='Список ID задач, разделённых пробелом.')
+        parser_completed.set_defaults(func=self.completed)
+
+        parser_cur = subparsers.add_parser('current', help='Вывод всех текущих задач.')
+        self._add_order_arguments(parser_cur)
+        parser_cur.add_argument('--overdue', action='store_true', help='Только просроченные задачи.')
+        parser_cur.set_defaults(func=self.current, readonly=True)
+
+        parser_del = subparsers.add_parser('del', help='Удаление задачи.')
+        group_del = parser_del.add_mutually_exclusive_group(required=True)
+        group_del.add_argument('-c', '--category', nargs='*', help='Список категорий задач, разделённых пробелом.')
+        group_del.add_argument('-i', '--id', nargs='*', type=int, help='Список ID задач, разделённых пробелом.')
+        parser_del.set_defaults(func=self.delete)
+
+        parser_edit = subparsers.add_parser('edit', help='Редактирование задачи одной командой.')
+        parser_edit.add_argument('id', type=int, help='ID задачи.')
+        parser_edit.add_argument('title', help='Название задачи.')
+        parser_edit.add_argument('description', help='Описание задачи.')
+        parser_edit.add_argument('category', help='Категория задачи.')
+        parser_edit.add_argument('due_date', help='Срок выполнения задачи (дата).')
+        parser_edit.add_argument(
+            'priority',
+            type=int,
+            choices=(0, 1, 2),
+            help=f'Приоритет задачи (число): 0 — {PRIORITIES[0]}, 1 — {PRIORITIES[1]}, 2 — {PRIORITIES[2]}.'
+        )
+        parser_edit.add_argument('status', type=int, choices=(0, 1),
+                                 help=f'Статус задачи (число): 0 — {STATUSES[0]}, 1 — {STATUSES[1]}.')
+        parser_edit.set_defaults(func=self.edit)
+
+        parser_edit_inter = subparsers.add_parser('edit_inter', help='Редактирование задачи в интерактивном режиме.')
+        parser_edit_inter.add_argument('id', type=int, help='ID задачи.')
+        parser_edit_inter.set_defaults(func=self.edit_inter, interactive=True)
+
+        parser_csv = subparsers.add_parser('csv', help='Экспорт списка задач в CSV-файл.')
+        parser_csv.add_argument('-o', '--output', default=TASKS_CSV,
+                                help=f'Путь к файлу (по умолчанию {TASKS_CSV}; - — стандартный вывод). '
+                                     'Файл с расширением .gz сжимается gzip.')
+        parser_csv.add_argument(
+            '-f', '--format',
+            choices=EXPORT_FORMATS,
+            help='Формат (по умолчанию — по расширению файла, иначе csv): csv — таблица CSV, '
+                 'ndjson — JSON-объект задачи в каждой строке, '
+                 f'columns — JSON-объект со столбцами (списками значений) каждых {EXPORT_CHUNK} задач в каждой строке, '
+                 f'json — JSON-массив в том же виде, что и {TASKS_JSON}.'
+        )
+        parser_csv.add_argument('-z', '--gzip', action='store_true', help='Сжатие gzip.')
+        parser_csv.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Выгрузка только задач, добавленных или изменённых с прошлой выгрузки в этот же файл '
+                 '(контрольная точка — файл <путь>.checkpoint).'
+        )
+        self._add_query_arguments(parser_csv, inner=False)
+        parser_csv.set_defaults(func=self.export_csv, readonly=True)
+
+        parser_search = subparsers.add_parser('search', help='Поиск задачи.')
+        self._add_query_arguments(parser_search)
+        parser_search.add_argument('--limit', type=int, help='Наибольшее количество выводимых задач.')
+        parser_search.add_argument('--offset', type=int, default=0, help='Количество пропускаемых задач.')
+        self._add_order_arguments(parser_search)
+        parser_search.add_argument('--explain', action='store_true',
+                                   help='Вывод плана поиска (используемых индексов) без выполнения поиска.')
+        parser_search.set_defaults(func=self.search, readonly=True)
+
+        parser_stats = subparsers.add_parser('stats', help='Статистика списка задач без его загрузки.')
+        parser_stats.add_argument('--check', action='store_true',
+                                  help='Проверка согласованности: пересчёт счётчиков по всем задачам.')
+        parser_stats.set_defaults(func=self.stats, readonly=True)
+
+        parser_undo = subparsers.add_parser('undo', help='Отмена последних изменений списка задач.')
+        parser_undo.add_argument('-n', '--count', type=int, default=1,
+                                 help='Количество отменяемых команд (по умолчанию 1).')
+        parser_undo.set_defaults(func=self.undo)
+
+        parser_history = subparsers.add_parser('history', help='История изменений списка задач.')
+        parser_history.add_argument('-n', '--count', type=int, default=10,
+                                    help='Количество выводимых записей (по умолчанию 10).')
+        parser_history.set_defaults(func=self.history, readonly=True)
+
+        parser_import = subparsers.add_parser('import', help='Импорт задач из файла CSV, NDJSON или JSON.')
+        parser_import.add_argument('file', help='Путь к файлу с задачами.')
+        parser_import.add_argument('-f', '--format', choices=IMPORT_FORMATS,
+                                   help='Формат файла (по умолчанию — по расширению файла): csv — столбцы команды csv, '
+                                        'ndjson — JSON-объект задачи в каждой строке, json — JSON-массив задач.')
+        parser_import.add_argument('-w', '--workers', type=int, default=1,
+                                   help='Количество процессов для проверки задач (по умолчанию 1 — без пула).')
+        parser_import.set_defaults(func=self.import_tasks)
+
+        parser_migrate = subparsers.add_parser(
+            'migrate', help='Импорт JSON-файла с задачами в базу данных SQLite, двоичный снимок или шарды.'
+        )
+        parser_migrate.add_argument('file', nargs='?', default=TASKS_JSON,
+                                    help=f'Путь к JSON-файлу с задачами (по умолчанию {TASKS_JSON}).')
+        parser_migrate.add_argument('--to', choices=('sqlite', 'snapshot', 'shards'), default='sqlite',
+                                    help=f'Хранилище: sqlite — {TASKS_DB} (по умолчанию), snapshot — {TASKS_SNAPSHOT}, '
+                                         f'shards — каталог {TASKS_SHARDS}.')
+        parser_migrate.set_defaults(func=self.migrate)
+
+        parser_serve = subparsers.add_parser('serve', help='Запуск демона, выполняющего команды без загрузки списка.')
+        parser_serve.add_argument('-S', '--socket', default=TASKS_SOCKET,
+                                  help=f'Путь к сокету (по умолчанию {TASKS_SOCKET}).')
+        parser_serve.add_argument('-i', '--interval', type=float, default=SAVE_INTERVAL,
+                                  help=f'Период сохранения изменений, с (по умолчанию {SAVE_INTERVAL}; '
+                                       '0 — после каждой команды).')
+        parser_serve.set_defaults(func=self.serve, local=True)
+
+        parser_batch = subparsers.add_parser('batch', help='Выполнение команд из файла с одним сохранением.')
+        parser_batch.add_argument('file', nargs='?', default='-',
+                                  help='Файл команд, по одной в строке (по умолчанию - — стандартный ввод).')
+        parser_batch.add_argument('-e', '--every', type=int, default=0,
+                                  help='Сохранять изменения каждые N команд (по умолчанию — один раз в конце).')
+        parser_batch.add_argument('-a', '--atomic', action='store_true',
+                                  help='Всё или ничего: при ошибке команды выполнение прекращается, '
+                                       'изменения не сохраняются.')
+        parser_batch.set_defaults(func=self.batch, local=True)
+
+        parser_shell = subparsers.add_parser('shell', help='Интерактивный сеанс над загруженным списком задач.')
+        parser_shell.add_argument('-i', '--interval', type=float,
+                                  help='Сохранять изменения после команды, если с первого несохранённого изменения '
+                                       'прошло не меньше INTERVAL с (по умолчанию — только командой save и при выходе; '
+                                       '0 — после каждой команды).')
+        parser_shell.add_argument('-t', '--timing', action='store_true',
+                                  help='Вывод в stderr времени выполнения каждой команды.')
+        parser_shell.set_defaults(func=self.shell, local=True, interactive=True)
+
+        for name, subparser in subparsers.choices.items():
+            subparser.set_defaults(command=name)  # Имя команды для истории изменений.
+
+        parser.add_argument('--version', action='version', version=VERSION)
+        parser.add_argument(
+            '--storage',
+            choices=STORAGES,
+            default=STORAGE,
+            help='Режим хранения: json — перезапись JSON-файла целиком, '
+                 f'journal — дозапись изменений в журнал {TASKS_JOURNAL} со сворачиванием в JSON-файл '
+                 f'по достижении {JOURNAL_LIMIT} байт, sqlite — база данных {TASKS_DB}, snapshot — двоичный снимок '
+                 f'{TASKS_SNAPSHOT}, читаемый через отображение в память, shards — каталог {TASKS_SHARDS} '
+                 'с JSON-файлом на каждую категорию и манифестом (см. команду migrate).'
+        )
+        parser.add_argument('--profile', action='store_true',
+                            help='Вывод в stderr времени фаз выполнения команды (разбор аргументов, загрузка, команда, '
+                                 'вывод, сохранение), пиковой памяти (tracemalloc) и количества задач.')
+        parser.add_argument('--metrics', metavar='FILE',
+                            help='Дозапись метрик выполнения команды (как --profile) JSON-объектом в строку файла.')
+        parser.add_argument('--cprofile', metavar='FILE',
+                            help='Запись профиля cProfile в файл (просмотр: python -m pstats FILE).')
+        parser.add_argument(
+            '--columnar',
+            action='store_true',
+            help='Компактное поколоночное хранение загруженного списка задач для команд current, search и csv '
+                 '(меньше памяти на больших списках).'
+        )
+        return parser
+
+    @staticmethod
+    def _add_query_arguments(parser: argparse.ArgumentParser, inner: bool = True):
+        """
+        Добавление в парсер команды параметров поиска задач (search, csv).
+        :param parser: Парсер команды.
+        :param inner: False — режим INNER по умолчанию (задача должна удовлетворять всем параметрам).
+        """
+        parser.add_argument('-c', '--category', help='Категория задачи.')
+        if inner:
+            parser.add_argument(
+                '-i', '--inner',
+                action='store_true',
+                help='Активатор режима INNER, когда поиск задачи производится с учётом каждого указанного параметра. '
+                     'Если активатор опущен, то в результат поиска попадают задачи, '
+                     'соответствующие хотя бы одному из параметров поиска.'
+            )
+        else:
+            parser.add_argument(
+                '-a', '--any',
+                dest='inner',
+                action='store_false',
+                help='Задача должна соответствовать хотя бы одному из параметров поиска (по умолчанию — всем).'
+            )
+        parser.add_argument(
+            '-s', '--status',
+            type=int,
+            choices=(0, 1),
+            help=f'Статус задачи для поиска (search) (число): 0 — {STATUSES[0]}, 1 — {STATUSES[1]}.'
+        )
+        parser.add_argument('-t', '--text', help='Фрагмент названия задачи или её описания.')
+        parser.add_argument(
+            '-p', '--priority',
+            type=int,
+            choices=(0, 1, 2),
+            help=f'Приоритет задачи (число): 0 — {PRIORITIES[0]}, 1 — {PRIORITIES[1]}, 2 — {PRIORITIES[2]}.'
+        )
+        parser.add_argument('--due-from', help='Срок выполнения задачи не раньше даты.')
+        parser.add_argument('--due-to', help='Срок выполнения задачи не позже даты.')
+        parser.add_argument('--overdue', action='store_true',
+                            help='Просроченные задачи: невыполненные со сроком раньше сегодняшнего дня '
+                                 '(включает режим INNER).')
+
+    @staticmethod
+    def _add_order_arguments(parser: argparse.ArgumentParser):
+        """
+        Добавление в парсер команды параметров порядка вывода задач и параллельного поиска (current, search).
+        :param parser: Парсер команды.
+        """
+        parser.add_argument('--sort', choices=SORTS, default='id',
+                            help='Порядок вывода: id, due_date — по сроку, priority — по убыванию приоритета.')
+        parser.add_argument('--top', type=int, help='Вывести только первые K задач в порядке --sort.')
+        parser.add_argument('-j', '--jobs', type=int, default=1,
+                            help=f'Параллельный перебор загруженного списка задач в N процессах (частями не меньше '
+                                 f'{SHARD_MIN} задач; по умолчанию 1 — без пула).')
+
+    def _get_query(self, args: argparse.Namespace) -> Query:
+        """
+        Запрос поиска задач по параметрам командной строки (см. _add_query_arguments).
+        :param args: Аргументы из командной строки.
+        :return: Запрос.
+        :raise ValueError: Если дата диапазона срока выполнения не распознана.
+        """
+        due_from = args.due_from and self._parse_date(args.due_from)
+        due_to = args.due_to and self._parse_date(args.due_to)
+        status, inner = args.status, args.inner
+        if args.overdue:
+            due_to = min(due_to or self._yesterday(), self._yesterday())
+            status, inner = 0, True
+        limit = getattr(args, 'top', None)
+        if limit is None:
+            limit = getattr(args, 'limit', None)
+        return Query(args.text, args.category, status, inner, args.priority, due_from, due_to, limit,
+                     getattr(args, 'offset', 0), getattr(args, 'sort', 'id'))
+
+    @staticmethod
+    def _yesterday() -> str:
+        """
+        :return: Вчерашняя дата в формате гггг-мм-дд (конец диапазона сроков просроченных задач).
+        """
+        return date.fromordinal(date.today().toordinal() - 1).isoformat()
+
+    @staticmethod
+    def _get_storage(name: str) -> storage.Storage:
+        """
+        Создание хранилища списка задач.
+        :param name: Режим хранения (см. STORAGES).
+        :return: Хранилище.
+        """
+        if name == 'sqlite':
+            return storage.SqliteStorage(TASKS_DB, PRIORITIES)
+        if name == 'snapshot':
+            return storage.SnapshotStorage(TASKS_SNAPSHOT, PRIORITIES)
+        if name == 'shards':
+            return storage.ShardedStorage(TASKS_SHARDS, PRIORITIES)
+        if name == 'journal':
+            return storage.JournalStorage(TASKS_JSON, TASKS_JOURNAL, JOURNAL_LIMIT)
+        return storage.JsonStorage(TASKS_JSON, TASKS_JOURNAL)
+
+    def _open(self, name: str):
+        """
+        Переключение на другое хранилище: список задач и индексы очищаются и будут загружены заново
+        по первому требованию.
+        :param name: Режим хранения (см. STORAGES).
+        """
+        self._reset()
+        self.storage = self._get_storage(name)
+
+    def _reset(self):
+        """
+        Очистка загруженного списка задач, индексов и несохранённых изменений (список задач будет загружен заново).
+        """
+        self.tasks.clear()
+        self.ids.clear()
+        self.categories.clear()
+        self.changes.clear()
+        self.table = None
+        self.version = None
+        self.stats = None
+        TaskManager.texts = None
+        self.orders.clear()
+        TaskManager.loaded = TaskManager.counted = False
+        Task.index = 0
+        self.steps = []
+        self.undone = 0
+        self.forget = False
+
+    def _refresh(self):
+        """
+        Сброс загруженного списка задач, если после загрузки хранилище изменено другим процессом.
+        """
+        if self.version is not None and self.version != self.storage.version():
+            self._reset()
+
+    def _load(self, full: bool = True):
+        """
+        Загрузка списка задач по первому требованию команды.
+        :param full: True — нужен весь список задач; False — достаточно знать последний выданный ID
+            (добавление задач без загрузки списка).
+        """
+        if self.loaded or (self.counted and not full) or self.table is not None:
+            return
+        if full and not self.storage.lazy and self.changes:
+            self._save()  # Задачи, добавленные до загрузки, дописываются в хранилище.
+        with self.storage.lock():
+            self._load_stats()
+            if full and not self.storage.lazy:
+                if self.columnar:
+                    self.table = TaskColumns(map(self._normalize, self.storage.load()))
+                    self.table.sort()
+                    return
+                self.tasks.clear()
+                self.ids.clear()
+                self.categories.clear()
+                TaskManager.texts = None
+                self.orders.clear()
+                self._load_tasks()
+                TaskManager.loaded = TaskManager.counted = True
+            else:
+                Task.index = max(Task.index, self.storage.max_id())
+                TaskManager.counted = True
+                TaskManager.loaded = self.storage.lazy
+
+    def _load_stats(self):
+        """
+        Чтение версии хранилища и сохранённых агрегированных счётчиков (под общей блокировкой хранилища).
+        """
+        self.version = self.storage.version()
+        data = self.storage.load_stats()
+        self.stats = data and TaskStats.from_dict(data)
+
+    def _load_tasks(self):
+        """
+        Загрузка списка задач из хранилища. Задачи создаются по мере чтения, список сортируется по ID,
+        только если хранилище вернуло их не по порядку.
+        """
+        last = 0  # ID предыдущей задачи.
+        ordered = True  # Флаг упорядоченности задач хранилища по ID.
+        for task in self.storage.load():
+            task = Task(**self._normalize(task))
+            if task.id < last:
+                ordered = False
+            last = task.id
+            self.tasks.append(task)
+            self._index_task(task)
+        if not ordered:
+            self.tasks.sort(key=lambda t: t.id)  # Сортировка по ID.
+
+    @staticmethod
+    def _parse_date(value: str) -> str:
+        """
+        Разбор даты в свободном формате. Дата в формате гггг-мм-дд только проверяется (date.fromisoformat),
+        остальные разбираются dateutil (см. _parse_free_date).
+        :param value: Дата.
+        :return: Дата в формате гггг-мм-дд.
+        :raise ValueError: Если дата не распознана.
+        """
+        if Task.to_day(value):
+            return value
+        return TaskManager._parse_free_date(value)
+
+    @staticmethod
+    @lru_cache(maxsize=DATES_CACHE)
+    def _parse_free_date(value: str) -> str:
+        """
+        Разбор даты в свободном формате dateutil. Результаты кэшируются: при импорте строки дат повторяются.
+        :param value: Дата.
+        :return: Дата в формате гггг-мм-дд.
+        :raise ValueError: Если дата не распознана.
+        """
+        import dateutil.parser as date_parser  # Импорт только для дат не в формате гггг-мм-дд (~15 мс).
+        return date_parser.parse(value).strftime('%Y-%m-%d')
+
+    @staticmethod
+    def _normalize(task: dict) -> dict:
+        """
+        Приведение приоритета и статуса задачи, прочитанной из файла, к виду аргументов Task.
+        :param task: Словарь полей задачи. Изменяется на месте.
+        :return: Тот же словарь.
+        """
+        p = task['priority']
+        if not isinstance(p, int) or (isinstance(p, str) and not p.isdigit()):
+            if p == PRIORITIES[2]:
+                task['priority'] = 2
+            elif p == PRIORITIES[1]:
+                task['priority'] = 1
+            elif p == PRIORITIES[0]:
+                task['priority'] = 0
+        elif isinstance(p, str) and p.isdigit():
+            task['priority'] = int(p)
+        s = task['status']
+        if not isinstance(s, bool) or not isinstance(s, int) or (isinstance(s, str) and not s.isdigit()):
+            if s == STATUSES[1]:
+                task['status'] = True
+            else:
+                task['status'] = False
+        return task
+
+    @staticmethod
+    def _check_task(row: dict) -> dict:
+        """
+        Проверка и приведение импортируемой задачи: приоритет и статус приводятся по правилам чтения файла
+        (см. _normalize), дополнительно принимаются значения, записываемые командой csv (True/False), и номера.
+        :param row: Словарь полей задачи (ID не используется: задаче присваивается новый ID).
+        :return: Словарь полей задачи без ID.
+        :raise ValueError: Если задача не прошла проверку (текст ошибки — в исключении).
+        """
+        try:
+            task = {key: row[key] for key in ('title', 'description', 'category', 'due_date', 'priority', 'status')}
+        except KeyError as e:
+            raise ValueError(f'нет поля {e}') from None
+        except TypeError:
+            raise ValueError('запись не является объектом') from None
+        p, s = task['priority'], task['status']
+        if isinstance(p, str) and p.isdigit():
+            task['priority'] = int(p)
+        if s in ('True', 'False', '1', '0', '') or type(s) is int:
+            task['status'] = s in ('True', '1', 1)
+        TaskManager._normalize(task)
+        if type(task['priority']) is not int or task['priority'] not in (0, 1, 2):  # Не bool и не float (1.0).
+            raise ValueError(f'неверный приоритет {row['priority']!r}')
+        for key in ('title', 'description', 'category', 'due_date'):
+            if not isinstance(task[key], str) or not task[key]:
+                raise ValueError(f'пустое или неверное поле «{HEADS[key]}»')
+        try:
+            task['due_date'] = TaskManager._parse_date(task['due_date'])
+        except (ValueError, OverflowError):
+            raise ValueError(f'неверный срок выполнения {task['due_date']!r}') from None
+        return task
+
+    @staticmethod
+    def _check_batch(batch: list) -> list:
+        """
+        Проверка пакета импортируемых задач (выполняется и в процессах пула при --workers).
+        :param batch: Список пар (номер записи, словарь полей задачи или строка NDJSON).
+        :return: Список пар (номер записи, словарь полей задачи без ID или текст ошибки).
+        """
+        res = []
+        for n, row in batch:
+            try:
+                if isinstance(row, str):
+                    try:
+                        row = json.loads(row)
+                    except ValueError:
+                        raise ValueError('неверный JSON') from None
+                res.append((n, TaskManager._check_task(row)))
+            except ValueError as e:
+                res.append((n, str(e)))
+        return res
+
+    @staticmethod
+    def _read_import(file, fmt: str):
+        """
+        Потоковое чтение импортируемого файла пакетами по IMPORT_BATCH записей.
+        :param file: Текстовый файл.
+        :param fmt: Формат: csv (столбцы команды csv), ndjson (JSON-объект в каждой строке) или json (массив).
+        :return: Итератор пакетов: списков пар (номер записи, словарь полей задачи или строка NDJSON).
+        """
+        if fmt == 'csv':
+            reader = csv.DictReader(file)
+            rows = ((reader.line_num, row) for row in reader)
+        elif fmt == 'ndjson':
+            rows = ((n, line) for n, line in enumerate(file, 1) if line.strip())
+        else:
+            rows = enumerate(storage.iter_json_array(file), 1)
+        while batch := list(islice(rows, IMPORT_BATCH)):
+            yield batch
+
+    @staticmethod
+    def _check_parallel(pool, batches, window: int):
+        """
+        Проверка пакетов импортируемых задач в пуле процессов с сохранением порядка пакетов.
+        В работе одновременно не более window пакетов, чтобы файл не читался целиком.
+        :param pool: Пул процессов (concurrent.futures.ProcessPoolExecutor).
+        :param batches: Итератор пакетов (см. _read_import).
+        :param window: Наибольшее количество пакетов в работе.
+        :return: Итератор результатов _check_batch.
+        """
+        pending = deque(pool.submit(TaskManager._check_batch, batch) for batch in islice(batches, window))
+        while pending:
+            res = pending.popleft().result()
+            for batch in islice(batches, 1):
+                pending.append(pool.submit(TaskManager._check_batch, batch))
+            yield res
+
+    def _new_task(self, *args, **kwargs) -> Task:
+        """
+        Создание новой задачи с очередным ID. Список задач для этого не загружается,
+        определяется только последний выданный ID.
+        :return: Объект Task.
+        """
+        self._load(full=False)
+        return Task(*args, **kwargs)
+
+    def _add_task(self, task: Task):
+        """
+        Добавление новой задачи в список задач и индексы.
+        :param task: Объект Task.
+        """
+        self.tasks.append(task)
+        self._index_task(task)
+        self._count_task(task)
+        self._track(task.id, None)
+        self.changes[task.id] = task
+
+    def _update(self, task: Task, **fields) -> bool:
+        """
+        Изменение полей задачи (setattr) с обновлением индексов и счётчиков. Задача считается изменённой (сохраняется
+        и попадает в историю изменений), только если значение хотя бы одного поля действительно изменилось.
+        :param task: Объект Task.
+        :param fields: Новые значения полей (как аргументы Task).
+        :return: True, если задача изменена.
+        """
+        before = task.as_dict()
+        indexed = fields.keys() != {'status'}  # Статус не индексируется.
+        self._count_task(task, -1)
+        if indexed:
+            self._unindex_task(task)
+        for name, value in fields.items():
+            setattr(task, name, value)
+        if indexed:
+            self._index_task(task)
+        self._count_task(task)
+        if task.as_dict() == before:
+            return False
+        self._track(task.id, before)
+        self.changes[task.id] = task
+        return True
+
+    def _track(self, i: int, before: dict | None):
+        """
+        Учёт изменения задачи в записи истории изменений выполняемой команды (см. _call; вне её — в отдельной записи):
+        запоминается состояние задачи до первого изменения командой. Состояние после изменения определяется
+        при сохранении (см. _records). Команда, изменившая больше HISTORY_TASKS задач, очищает историю.
+        :param i: ID задачи.
+        :param before: Словарь полей задачи до изменения (None — задача добавлена).
+        """
+        step = self.step
+        if step is None:
+            step = dict(command=None, time=time.strftime('%Y-%m-%d %H:%M:%S'), before={})
+            self.steps.append(step)
+        if step.get('skip'):
+            return
+        step['before'].setdefault(i, before)
+        if len(step['before']) > HISTORY_TASKS:
+            self.forget = True
+            self.steps.clear()
+            step['skip'] = True
+            step['before'].clear()
+
+    def _index_task(self, task: Task):
+        """
+        Добавление задачи в индексы по ID, по категории и построенные индексы текста и сортировки.
+        :param task: Объект Task.
+        """
+        self.ids[task.id] = task
+        self.categories.setdefault(task.category.lower(), {})[task.id] = task
+        if self.texts is not None:
+            self.texts.add(task)
+        for index in self.orders.values():
+            index.add(task)
+
+    def _unindex_task(self, task: Task):
+        """
+        Удаление задачи из индексов (до изменения индексируемых полей).
+        :param task: Объект Task.
+        """
+        if self.ids.get(task.id) is task:
+            del self.ids[task.id]
+        key = task.category.lower()
+        bucket = self.categories.get(key)
+        if bucket is not None and bucket.get(task.id) is task:
+            del bucket[task.id]
+            if not bucket:
+                del self.categories[key]
+        if self.texts is not None:
+            self.texts.remove(task)
+        for index in self.orders.values():
+            index.remove(task)
+
+    def _count_task(self, task: Task, n: int = 1):
+        """
+        Учёт задачи в агрегированных счётчиках (если они известны): после добавления или изменения задачи (n=1),
+        до удаления или изменения (n=-1).
+        :param task: Объект Task.
+        :param n: 1 — задача учитывается, -1 — исключается.
+        """
+        if self.stats is not None:
+            self.stats.add(task, n)
+
+    def _remove_tasks(self, ids) -> list[Task]:
+        """
+        Удаление задач из списка задач и индексов за один проход по списку.
+        :param ids: Множество (или словарь) ID удаляемых задач.
+        :return: Список удалённых задач.
+        """
+        if not ids:
+            return []
+        removed = []
+        kept = []
+        for task in self.tasks:
+            (removed if task.id in ids else kept).append(task)
+        self.tasks[:] = kept
+        for task in removed:
+            self._unindex_task(task)
+            self._count_task(task, -1)
+            self._track(task.id, task.as_dict())
+            self.changes[task.id] = None
+        return removed
+
+    def _task(self, data: dict) -> Task:
+        """
+        Задача, полученная запросом к хранилищу (lazy): уже загруженный объект Task или новый (не сохраняемый в списке).
+        :param data: Словарь полей задачи.
+        :return: Объект Task.
+        """
+        return self.ids.get(data['id']) or Task(**self._normalize(data))
+
+    def _cache(self, data: dict) -> Task:
+        """
+        Задача, полученная запросом к хранилищу (lazy) для изменения: уже загруженный объект Task или новый,
+        добавляемый в список задач и индексы.
+        :param data: Словарь полей задачи.
+        :return: Объект Task.
+        """
+        task = self.ids.get(data['id'])
+        if task is None:
+            task = Task(**self._normalize(data))
+            self.tasks.append(task)
+            self._index_task(task)
+        return task
+
+    def _flush(self):
+        """
+        Сохранение изменений перед запросом к хранилищу (lazy), чтобы запрос их учитывал.
+        """
+        if self.changes:
+            self._save()
+
+    def _get(self, i: int) -> Task | None:
+        """
+        Поиск задачи по ID.
+        :param i: ID задачи.
+        :return: Объект Task или None.
+        """
+        self._load()
+        task = self.ids.get(i)
+        if task is None and self.storage.lazy and i not in self.changes:
+            data = self.storage.get(i)
+            if data is not None:
+                task = self._cache(data)
+        return task
+
+    def _get_category(self, category: str) -> list[Task]:
+        """
+        Поиск задач по категории без учёта регистра.
+        :param category: Категория.
+        :return: Список задач, упорядоченный по ID.
+        """
+        self._load()
+        if self.storage.lazy:
+            self._flush()
+            return [self._cache(data) for data in self.storage.category(category.lower())]
+        return sorted(self.categories.get(category.lower(), {}).values(), key=lambda t: t.id)
+
+    def _select(self, query: Query):
+        """
+        Поиск задач по запросу (см. _plan).
+        :param query: Запрос.
+        :return: Итератор задач, упорядоченных по ID.
+        """
+        self._load()
+        if self.table is not None:
+            return query.page(self._sort(self.table.select(query), query))
+        if self.storage.lazy:
+            self._flush()
+            return map(self._task, self.storage.select(**query.params()))
+        ids, _ = self._plan(query)
+        if ids is None:
+            # Задачи перебираются в нужном порядке (по списку или упорядоченному индексу) и проверяются по мере
+            # вывода: при limit перебор останавливается на последней задаче страницы.
+            tasks = self.tasks if query.sort == 'id' else map(self.ids.get, self._order(query.sort))
+            return query.page(task for task in tasks if query.match(task))
+        tasks = map(self.ids.get, sorted(set(ids)))
+        return query.page(self._sort((task for task in tasks if task is not None and query.match(task)), query))
+
+    def _found(self, query: Query, jobs: int = 1) -> tuple:
+        """
+        Поиск задач для вывода таблицей с установкой длин строк-ячеек: первый проход по результату поиска — длины,
+        второй — вывод строк таблицы. Параллельный поиск (см. _select_parallel) выполняется один раз,
+        длины строк-ячеек вычисляются процессами пула.
+        :param query: Запрос.
+        :param jobs: Количество процессов (--jobs).
+        :return: Количество найденных задач и итератор задач для вывода.
+        """
+        found = self._select_parallel(query, jobs) if jobs > 1 else None
+        if found is None:
+            return self._set_name_length(self._select(query)), self._select(query)
+        tasks, lengths = found
+        return self._set_name_length(tasks, lengths), iter(tasks)
 
-        parser_completed = subparsers.add_parser('completed', help='Отметка задачи как выполненной.')
-        parser_completed.add_argument('id', nargs='*', type=int, help='Список ID задач, разделённых пробелом.')
-        parser_completed.set_defaults(func=self.completed)
+    def _select_parallel(self, query: Query, jobs: int) -> tuple | None:
+        """
+        Параллельный поиск в загруженном списке задач: список делится на части подряд по ID, условия запроса
+        проверяются в процессах, порождённых fork (список задач и запрос наследуются без сериализации, обратно
+        передаются номера найденных задач в списке и длины строк-ячеек). Результаты частей объединяются в порядке ID,
+        затем упорядочиваются по ключу запроса и выбирается страница — результат тот же, что и у _select.
+        :param query: Запрос.
+        :param jobs: Наибольшее количество процессов.
+        :return: Список задач страницы и длины строк-ячеек (см. _lengths; None — длины вычисляются по странице)
+            или None, если параллельный поиск неприменим или не нужен: хранилище выполняет запросы само, список
+            поколоночный, fork не поддерживается, список меньше двух частей по SHARD_MIN задач, задан limit
+            (последовательный перебор останавливается на последней задаче страницы) или последовательный поиск
+            использует готовый индекс (см. _plan). Триграммный индекс ради одного поиска не строится: перебор частей
+            быстрее.
+        """
+        import multiprocessing  # Импорт только для параллельного поиска.
+        self._load()
+        n = len(self.tasks)
+        shards = min(jobs, n // SHARD_MIN)
+        if (self.storage.lazy or self.table is not None or shards < 2 or (not query.checks and not query.inner)
+                or query.limit is not None or 'fork' not in multiprocessing.get_all_start_methods()):
+            return None
+        if not (query.text and self.texts is None) and self._plan(query)[0] is not None:
+            return None
+        bounds = [n * k // shards for k in range(shards + 1)]
+        context = multiprocessing.get_context('fork')
+        workers = []  # (процесс, канал результата).
+        TaskManager.scanning = query
+        try:
+            # Процессы без пула: у пула есть служебные потоки, а fork в многопоточном процессе опасен.
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                reader, writer = context.Pipe(duplex=False)
+                process = context.Process(target=TaskManager._scan, args=(lo, hi, writer))
+                process.start()
+                writer.close()
+                workers.append((process, reader))
+            parts = [reader.recv() for _, reader in workers]  # Раньше join: канал ограничен буфером.
+        finally:
+            TaskManager.scanning = None
+            for process, reader in workers:
+                reader.close()
+                process.join()
+        tasks = [self.tasks[k] for found, _ in parts for k in found]
+        if query.sort != 'id':
+            tasks.sort(key=query.key)
+        if query.offset:
+            return tasks[query.offset:], None
+        return tasks, self._merge_lengths(lengths for _, lengths in parts)
 
-        parser_cur = subparsers.add_parser('current', help='Вывод всех текущих задач.')
-        parser_cur.set_defaults(func=self.current)
+    @staticmethod
+    def _scan(lo: int, hi: int, pipe):
+        """
+        Проверка условий запроса TaskManager.scanning для задач списка с номерами от lo до hi (в порождённом процессе).
+        В канал передаются номера найденных задач в списке (array) и их длины строк-ячеек (см. _lengths).
+        :param pipe: Канал результата (multiprocessing.Pipe).
+        """
+        match = TaskManager.scanning.match
+        tasks = TaskManager.tasks
+        found = array('q', (k for k in range(lo, hi) if match(tasks[k])))
+        pipe.send((found, TaskManager._lengths(tasks[k] for k in found)))
+        pipe.close()
 
-        parser_del = subparsers.add_parser('del', help='Удаление задачи.')
-        group_del = parser_del.add_mutually_exclusive_group(required=True)
-        group_del.add_argument('-c', '--category', nargs='*', help='Список категорий задач, разделённых пробелом.')
-        group_del.add_argument('-i', '--id', nargs='*', type=int, help='Список ID задач, разделённых пробелом.')
-        parser_del.set_defaults(func=self.delete)
+    @staticmethod
+    def _sort(tasks, query: Query):
+        """
+        Упорядочивание найденных задач по ключу запроса. Если нужна только первая страница (limit),
+        весь результат не сортируется: heapq.nsmallest отбирает offset + limit задач за O(N log K).
+        :param tasks: Итератор задач, упорядоченных по ID.
+        :param query: Запрос.
+        :return: Итератор задач.
+        """
+        if query.sort == 'id':
+            return tasks
+        if query.limit is not None:
+            return iter(nsmallest(query.offset + query.limit, tasks, key=query.key))
+        return iter(sorted(tasks, key=query.key))
 
-        parser_edit = subparsers.add_parser('edit', help='Редактирование задачи одной командой.')
-        parser_edit.add_argument('id', type=int, help='ID задачи.')
-        parser_edit.add_argument('title', help='Название задачи.')
-        parser_edit.add_argument('description', help='Описание задачи.')
-        parser_edit.add_argument('category', help='Категория задачи.')
-        parser_edit.add_argument('due_date', help='Срок выполнения задачи (дата).')
-        parser_edit.add_argument(
-            'priority',
-            type=int,
-            choices=(0, 1, 2),
-            help=f'Приоритет задачи (число): 0 — {PRIORITIES[0]}, 1 — {PRIORITIES[1]}, 2 — {PRIORITIES[2]}.'
-        )
-        parser_edit.add_argument('status', type=int, choices=(0, 1),
-                                 help=f'Статус задачи (число): 0 — {STATUSES[0]}, 1 — {STATUSES[1]}.')
-        parser_edit.set_defaults(func=self.edit)
+    def _order(self, sort: str) -> SortedIndex:
+        """
+        Упорядоченный индекс задач. Строится при первом обращении и далее поддерживается
+        при добавлении, изменении и удалении задач (см. _index_task).
+        :param sort: Ключ сортировки (см. SORTS).
+        """
+        index = self.orders.get(sort)
+        if index is None:
+            index = self.orders[sort] = SortedIndex(Query.KEYS[sort], self.tasks)
+        return index
 
-        parser_edit_inter = subparsers.add_parser('edit_inter', help='Редактирование задачи в интерактивном режиме.')
-        parser_edit_inter.add_argument('id', type=int, help='ID задачи.')
-        parser_edit_inter.set_defaults(func=self.edit_inter)
+    def _plan(self, query: Query) -> tuple:
+        """
+        План поиска задач в загруженном списке. Условия по тексту (триграммный индекс, если он построен
+        или процесс долгоживущий, см. resident) и по категории (индекс категорий) дают ID задач-кандидатов.
+        В режиме INNER выбирается условие с наименьшим числом кандидатов, остальные условия проверяются только
+        для них (пересечение). Иначе кандидаты условий объединяются, если индекс есть у каждого условия.
+        В остальных случаях перебираются все задачи.
+        :param query: Запрос.
+        :return: ID задач-кандидатов (None — перебор всех задач; возможны повторы и ID удалённых задач)
+            и описание шагов плана (список строк).
+        """
+        names = ', '.join(Query.NAMES[name] for name in query.checks)
+        if not query.checks and not query.inner:
+            return (), ['Условия не заданы: результат пуст.']
+        sources = []  # Кандидаты условий: (количество, описание, ID).
+        if query.inner or all(name in ('text', 'category', 'due_date') for name in query.checks):
+            if query.text and (self.texts is not None or self.resident):
+                ids = self._text_index().candidates(query.text)
+                if ids is not None:
+                    sources.append((len(ids), f'триграммный индекс текста «{query.text}»', ids))
+            if query.category:
+                key = query.category.lower()
+                buckets = [bucket for name, bucket in self.categories.items() if key in name]
+                sources.append((sum(map(len, buckets)), f'индекс категорий «{query.category}»',
+                                chain.from_iterable(buckets)))
+            if 'due_date' in query.checks:
+                index = self._order('due_date')
+                cnt, ids = index.between(query.first, query.last)
+                extra, raw = index.between(NO_DAY, NO_DAY)  # Сроки не в формате гггг-мм-дд: сравнение строк.
+                sources.append((cnt + extra, f'диапазон упорядоченного индекса сроков '
+                                f'({query.due_from or '…'} — {query.due_to or '…'})', chain(ids, raw)))
+        if sources and (query.inner or len(sources) == len(query.checks)):
+            if query.inner:
+                cnt, source, ids = min(sources, key=lambda item: item[0])
+                steps = [f'Кандидаты: {source} — {cnt}.']
+            else:
+                cnt = sum(item[0] for item in sources)
+                steps = [f'Кандидаты: объединение ({'; '.join(item[1] for item in sources)}) — {cnt}.']
+                ids = chain.from_iterable(item[2] for item in sources)
+            steps.append(f'Упорядочивание кандидатов по ID, проверка условий ({names}).')
+            if query.sort != 'id':
+                steps.append(f'{'Отбор первых' if query.limit is not None else 'Сортировка'} по ключу '
+                             f'«{HEADS[query.sort]}»{' (heapq)' if query.limit is not None else ''}.')
+            return ids, steps
+        if query.sort != 'id':
+            return None, [f'Обход упорядоченного индекса «{HEADS[query.sort]}» ({len(self.tasks)}) до заполнения '
+                          f'страницы, проверка условий ({names or 'нет'}).']
+        return None, [f'Перебор всех задач ({len(self.tasks)}), проверка условий ({names or 'нет'}).']
 
-        parser_csv = subparsers.add_parser('csv', help='Экспорт списка задач в CSV-файл.')
-        parser_csv.set_defaults(func=self.export_csv)
+    def _explain(self, query: Query) -> str:
+        """
+        Описание плана поиска задач (search --explain). Поиск не выполняется.
+        :param query: Запрос.
+        :return: План текстом.
+        """
+        self._load()
+        if self.table is not None:
+            steps = [f'Поколоночный перебор всех задач ({len(self.table)}).']
+        elif self.storage.lazy:
+            self._flush()
+            steps = [f'{self.storage.label}: {step}.' for step in self.storage.explain(**query.params())]
+        else:
+            steps = self._plan(query)[1]
+        if query.offset:
+            steps.append(f'Пропуск первых {query.offset} задач.')
+        if query.limit is not None:
+            steps.append(f'Вывод не более {query.limit} задач.')
+        res = f'План поиска ({'INNER' if query.inner else 'OR'}):\n'
+        for n, step in enumerate(steps, 1):
+            res += f'{n}. {step}\n'
+        return res
 
-        parser_search = subparsers.add_parser('search', help='Поиск задачи.')
-        parser_search.add_argument('-c', '--category', help='Категория задачи.')
-        parser_search.add_argument(
-            '-i', '--inner',
-            action='store_true',
-            help='Активатор режима INNER, когда поиск задачи производится с учётом каждого указанного параметра. '
-                 'Если активатор опущен, то в результат поиска попадают задачи, '
-                 'соответствующие хотя бы одному из параметров поиска.'
-        )
-        parser_search.add_argument(
-            '-s', '--status',
-            type=int,
-            choices=(0, 1),
-            help=f'Статус задачи для поиска (search) (число): 0 — {STATUSES[0]}, 1 — {STATUSES[1]}.'
-        )
-        parser_search.add_argument('-t', '--text', help='Фрагмент названия задачи или её описания.')
-        parser_search.set_defaults(func=self.search)
+    def _text_index(self) -> TextIndex:
+        """
+        Триграммный индекс текста задач. Строится при первом обращении и перестраивается,
+        когда устаревших записей становится больше, чем задач.
+        """
+        if self.texts is None or self.texts.stale > len(self.ids):
+            TaskManager.texts = TextIndex(self.ids.values())
+        return self.texts
 
-        parser.add_argument('--version', action='version', version=VERSION)
-        return parser
+    def _all(self):
+        """
+        :return: Итератор всех задач, упорядоченных по ID.
+        """
+        self._load()
+        if self.table is not None:
+            return iter(self.table)
+        if self.storage.lazy:
+            self._flush()
+            return map(self._task, self.storage.all())
+        return iter(self.tasks)
 
-    def _load_tasks(self):
+    def _set_name_length(self, tasks, lengths: tuple | None = None) -> int:
         """
-        Загрузка списка задач из JSON-файла.
-        """
-        if os.path.exists(TASKS_JSON):
-            with open(TASKS_JSON, 'r', encoding='utf8') as file:
-                temp = json.load(file)
-            if temp:
-                temp = sorted(temp, key=lambda d: d['id'])  # Сортировка по ID.
-                for task in temp:
-                    p = task['priority']
-                    if not isinstance(p, int) or (isinstance(p, str) and not p.isdigit()):
-                        if p == PRIORITIES[2]:
-                            task['priority'] = 2
-                        elif p == PRIORITIES[1]:
-                            task['priority'] = 1
-                        elif p == PRIORITIES[0]:
-                            task['priority'] = 0
-                    elif isinstance(p, str) and p.isdigit():
-                        task['priority'] = int(p)
-                    s = task['status']
-                    if not isinstance(s, bool) or not isinstance(s, int) or (isinstance(s, str) and not s.isdigit()):
-                        if s == STATUSES[1]:
-                            task['status'] = True
-                        else:
-                            task['status'] = False
-                    self.tasks.append(Task(**task))
-
-    def _set_name_length(self, task: Task):
-        """
-        Установка новых длин строк-ячеек, если в новой строке таблицы они больше ранее установленных.
-        :param task: Объект Task, выводимый в строку таблицы, ячейки которой будут сравниваться
-            с ранее установленными длинами.
-        """
-        for key, item in vars(task).items():
-            if key == 'id':
-                x = len(f'{item}')
-            elif key == 'status':
-                x = len(STATUSES[item])
-            elif key == 'priority':
-                continue
-            else:
-                x = len(item)
+        Установка новых длин строк-ячеек по наибольшим значениям столбцов за один проход по выводимым задачам
+        (если они больше ранее установленных).
+        :param tasks: Итератор задач (Task), выводимых в строки таблицы.
+        :param lengths: Длины, уже вычисленные по этим задачам (см. _lengths): задачи не перебираются.
+        :return: Количество задач.
+        """
+        cnt, last, title, description, category, due_date, statuses = lengths or self._lengths(tasks)
+        status = max((len(STATUSES[s]) for s in statuses), default=0)
+        for key, x in (('id', len(f'{last}') if cnt else 0), ('title', title), ('description', description),
+                       ('category', category), ('due_date', due_date), ('status', status)):
             if self.name_length[key] < x:
                 self.name_length[key] = x
+        return cnt
+
+    @staticmethod
+    def _lengths(tasks) -> tuple:
+        """
+        Наибольшие длины значений столбцов выводимых задач за один проход.
+        :param tasks: Итератор задач (Task).
+        :return: Количество задач, наибольший ID, длины названия, описания, категории и срока, множество статусов.
+        """
+        last, title, description, category, due_date = 0, 0, 0, 0, 0
+        statuses = set()
+        cnt = 0
+        for task in tasks:
+            cnt += 1
+            if task.id > last:
+                last = task.id
+            if len(task.title) > title:
+                title = len(task.title)
+            if len(task.description) > description:
+                description = len(task.description)
+            if len(task.category) > category:
+                category = len(task.category)
+            if len(task.due_date) > due_date:
+                due_date = len(task.due_date)
+            statuses.add(task.status)
+        return cnt, last, title, description, category, due_date, statuses
+
+    @staticmethod
+    def _merge_lengths(parts) -> tuple:
+        """
+        Объединение длин значений столбцов частей списка задач (см. _lengths).
+        :param parts: Итератор результатов _lengths.
+        :return: Длины для всех частей.
+        """
+        cnt, *maxima, statuses = zip(*parts)
+        return sum(cnt), *map(max, maxima), set().union(*statuses)
 
-    def _set_result(self, data: list[Task], caption: str = '', ignor: tuple = ()):
+    def _set_result(self, data, caption: str = '', ignor: tuple = ()) -> str:
         """
-        Формирование текста для вывода в консоль.
-        :param data: Данные для вывода (список задач (Task)).
+        Вывод таблицы: в self.out по мере формирования строк (частями по OUT_ROWS строк), иначе — текстом.
+        Длины строк-ячеек должны быть установлены заранее (см. _set_name_length).
+        :param data: Данные для вывода (итератор задач (Task)).
         :param caption: Заголовок.
         :param ignor: Кортеж игнорируемых столбцов при выводе таблицы. None — выводить все столбцы.
             Столбец ID выводится всегда.
+        :return: Таблица текстом или '' (таблица выведена в self.out; перевод строки в конце выводит print).
         """
+        out = self.out or io.StringIO()
         # Ширина таблицы.
         width = sum(i for k, i in self.name_length.items() if k not in ignor)
         width += 3 * (len(self.name_length) - len(ignor) - 1) + 1
-        # Заголовок таблицы.
-        self.result += f'{'-' * width}\n'
-        self.result += f'{caption:^{width}}\n'
-        self.result += f'{'—' * width}\n'
-        # Заголовки столбцов таблицы.
-        self.result += f'{HEADS['id']:^{self.name_length['id']}}'
+        # Заголовок таблицы и заголовки столбцов.
+        head = f'{'-' * width}\n{caption:^{width}}\n{'—' * width}\n{HEADS['id']:^{self.name_length['id']}}'
         for key, item in self.name_length.items():
             if key != 'id' and key not in ignor:
-                self.result += f' | {HEADS[key]:^{item}}'
-        self.result += f'\n{'—' * width}'
-        # Данные.
+                head += f' | {HEADS[key]:^{item}}'
+        out.write(f'{head}\n{'—' * width}')
+        # Данные. Шаблон строки таблицы формируется один раз.
         # al — выравнивание в ячейках.
         al = dict(title='<', description='<', category='^', due_date='^', priority='^', status='^')
+        cells = [cell for cell in ('title', 'description', 'category', 'due_date', 'priority') if cell not in ignor]
+        row = f'\n{{0:>{self.name_length['id']}}} '
+        for n, cell in enumerate(cells, 1):
+            row += f'| {{{n}:{al[cell]}{self.name_length[cell]}}} '
+        if 'status' not in ignor:
+            row += f'| {{{len(cells) + 1}:{al['status']}{self.name_length['status']}}} '
+        row = row.format
+        get = attrgetter(*cells)
+        rows = []
         for task in data:
-            self.result += f'\n{task.id:>{self.name_length['id']}} '
-            for cell in ('title', 'description', 'category', 'due_date', 'priority', 'status'):
-                if cell not in ignor:
-                    c = STATUSES[task.status] if cell == 'status' else getattr(task, cell)
-                    self.result += f'| {c:{al[cell]}{self.name_length[cell]}} '
-        self.result += f'\n{'—' * width}'
+            rows.append(row(task.id, *get(task), STATUSES[task.status]))  # Лишний аргумент шаблон не выводит.
+            if len(rows) == OUT_ROWS:
+                out.write(''.join(rows))
+                rows.clear()
+        rows.append(f'\n{'—' * width}')
+        out.write(''.join(rows))
+        if self.out:
+            return ''
+        self.result = out.getvalue()
+        return self.result
+
+    def _save(self):
+        """
+        Сохранение изменений списка задач в хранилище. Если изменений нет, хранилище не перезаписывается.
+        Если список задач не загружался (только добавление), новые задачи дописываются в хранилище.
+        Запись выполняется под исключительной блокировкой хранилища и только если его версия не изменилась
+        после загрузки (иначе изменения другого процесса были бы потеряны или ID задач повторились бы).
+        Вместе с изменениями сохраняются агрегированные счётчики (см. TaskStats) и история изменений (см. _records).
+        :raise storage.Conflict: Хранилище изменено другим процессом; изменения не сохранены.
+        """
+        if self.changes:
+            with self.storage.lock(exclusive=True), self.storage.transaction():
+                self._check_version()
+                if self.loaded:
+                    self.storage.save(self.tasks, self.changes)
+                else:
+                    self.storage.append(self.changes)
+                self.storage.save_stats(self.stats and self.stats.as_dict())
+                if self.steps or self.undone or self.forget:
+                    self.storage.save_history(self._records(), None if self.forget else self.undone, HISTORY_SIZE)
+                self.version = self.storage.version()
+            self.changes.clear()
+            self.steps.clear()
+            self.undone = 0
+            self.forget = False
+
+    def _records(self) -> list[dict]:
+        """
+        Несохранённые записи истории изменений: для каждой команды — состояния изменённых ею задач до и после.
+        Состояние после изменения — состояние до изменения следующей командой (или текущее), поэтому записи
+        перебираются от новых к старым начиная с выполняемой команды.
+        :return: Записи {command, time, changes: [[ID, до, после], ...]} от старых к новым (None — задачи нет).
+        """
+        state = {}  # Состояния задач после изменения очередной командой: {ID: словарь полей или None}.
+        records = []
+        steps = self.steps if self.step is None else self.steps + [self.step]
+        for step in reversed(steps):
+            changes = []
+            for i, before in step['before'].items():
+                if i in state:
+                    after = state[i]
+                else:
+                    task = self.ids.get(i)
+                    after = task and task.as_dict()
+                changes.append([i, before, after])
+                state[i] = before
+            if step is not self.step:
+                records.append(dict(command=step['command'], time=step['time'], changes=changes))
+        records.reverse()
+        return records
 
-    def _save_json(self):
+    def _check_version(self):
         """
-        Сохранение списка задач в JSON-файл.
+        Проверка версии хранилища перед записью (под исключительной блокировкой).
+        :raise storage.Conflict: Хранилище изменено другим процессом после загрузки.
         """
-        with open(TASKS_JSON, 'w') as file:
-            json.dump([vars(task) for task in self.tasks], file, indent=4)
+        if self.version is not None and self.version != self.storage.version():
+            raise storage.Conflict('Список задач изменён другим процессом.')
 
     def add(self, args: argparse.Namespace) -> str:
         """
@@ -244,13 +1819,13 @@ class TaskManager:
         :return: Отчёт.
         """
         try:
-            date = date_parser.parse(args.due_date).strftime('%Y-%m-%d')
+            date = self._parse_date(args.due_date)
         except ValueError:
-            return 'Ошибка в введённых данных! Проверьте дату срока выполнения.\n'
+            return self._fail('Ошибка в введённых данных! Проверьте дату срока выполнения.\n')
         else:
-            self.tasks.append(Task(args.title, args.description, args.category, date, args.priority))
-            cnt = len(self.tasks)
-            return f'Задача «{args.title}» добавлена. Присвоен ID {self.tasks[cnt - 1].id}.\n'
+            task = self._new_task(args.title, args.description, args.category, date, args.priority)
+            self._add_task(task)
+            return f'Задача «{args.title}» добавлена. Присвоен ID {task.id}.\n'
 
     def add_inter(self, args: argparse.Namespace) -> str:
         """
@@ -269,7 +1844,7 @@ class TaskManager:
                         cnc = True
                         break
                     try:
-                        task[head] = date_parser.parse(task[head]).strftime('%Y-%m-%d')
+                        task[head] = self._parse_date(task[head])
                     except ValueError:
                         print('Ошибка!')
                     else:
@@ -299,9 +1874,9 @@ class TaskManager:
                     print('Ошибка!')
             if cnc or task[head] == 'cancel':
                 return 'Добавление задачи отменено.'
-        self.tasks.append(Task(**task))
-        cnt = len(self.tasks)
-        return f'Задача «{task['title']}» добавлена. Присвоен ID {self.tasks[cnt - 1].id}.\n'
+        task = self._new_task(**task)
+        self._add_task(task)
+        return f'Задача «{task.title}» добавлена. Присвоен ID {task.id}.\n'
 
     def completed(self, args: argparse.Namespace) -> str:
         """
@@ -311,27 +1886,24 @@ class TaskManager:
         """
         res = ''
         for i in args.id:
-            for t in range(len(self.tasks)):
-                if self.tasks[t].id == i:
-                    self.tasks[t].status = True
-                    res += f'Задача «{self.tasks[t].title}» отмечена как «{STATUSES[1]}».\n'
-                    break
+            task = self._get(i)
+            if task is None:
+                res += self._fail(f'Задача с ID {i} не найдена.\n')
             else:
-                res += f'Задача с ID {i} не найдена.\n'
+                self._update(task, status=True)
+                res += f'Задача «{task.title}» отмечена как «{STATUSES[1]}».\n'
         return res
 
     def current(self, args: argparse.Namespace) -> str:
         """
         Вывод всех текущих задач.
-        :return: Таблица текстом.
+        :param args: Аргументы из командной строки (sort, top, overdue).
+        :return: Таблица текстом (или '', если таблица выведена в self.out).
         """
-        data = []  # Будущий результат поиска.
-        for task in self.tasks:
-            if not task.status:
-                data.append(task)
-                self._set_name_length(task)
-        self._set_result(data, 'Текущие задачи', ('status',))
-        return self.result
+        query = Query(status=0, inner=True, due_to=self._yesterday() if args.overdue else None, limit=args.top,
+                      sort=args.sort)
+        _, tasks = self._found(query, args.jobs)
+        return self._set_result(tasks, 'Текущие задачи', ('status',))
 
     def delete(self, args: argparse.Namespace) -> str:
         """
@@ -340,28 +1912,26 @@ class TaskManager:
         :return: Отчёт.
         """
         res = ''
-        deli = []  # Список индексов удаляемых задач из списка задач.
+        deli = {}  # Удаляемые задачи: {ID: Task}.
         if args.id:
             for i in args.id:
-                for t in range(len(self.tasks)):
-                    if self.tasks[t].id == i:
-                        deli.append(t)
-                        res += f'Задача «{self.tasks[t].title}» удалена. (ID {i}.)\n'
-                        break
+                task = None if i in deli else self._get(i)
+                if task is None:
+                    res += self._fail(f'Задача с ID {i} не найдена.\n')
                 else:
-                    res += f'Задача с ID {i} не найдена.\n'
+                    deli[i] = task
+                    res += f'Задача «{task.title}» удалена. (ID {i}.)\n'
         else:
             for i in args.category:
-                c = False  # Флаг обнаружения задачи с категорией.
-                for t in range(len(self.tasks)):
-                    if self.tasks[t].category.lower() == i.lower():
-                        c = True
-                        deli.append(t)
-                        res += f'Задача «{self.tasks[t].title}» удалена. (Категория «{self.tasks[t].category}».)\n'
-                if not c:
-                    res += f'Задача с категорией «{i}» не найдена.\n'
-        for i in deli:
-            self.tasks.pop(i)
+                bucket = self._get_category(i)
+                if bucket:
+                    for task in bucket:
+                        if task.id not in deli:
+                            deli[task.id] = task
+                            res += f'Задача «{task.title}» удалена. (Категория «{task.category}».)\n'
+                else:
+                    res += self._fail(f'Задача с категорией «{i}» не найдена.\n')
+        self._remove_tasks(deli)
         return res
 
     def edit(self, args: argparse.Namespace) -> str:
@@ -370,156 +1940,893 @@ class TaskManager:
         :param args: Аргументы из командной строки (id, title, description, category, due_date, priority, status).
         :return: Отчёт.
         """
-        for task in self.tasks:
-            if task.id == args.id:
-                try:
-                    date = date_parser.parse(args.due_date).strftime('%Y-%m-%d')
-                    status = bool(args.status)
-                except ValueError:
-                    return 'Ошибка в введённых данных! Проверьте дату срока выполнения и статус.\n'
-                else:
-                    task.title = args.title
-                    task.description = args.description
-                    task.category = args.category
-                    task.due_date = date
-                    task.priority = PRIORITIES[args.priority]
-                    task.status = bool(status)
-                    return f'Задача с ID {args.id} изменена.\n'
-        return f'Задача с ID {args.id} не найдена.\n'
+        task = self._get(args.id)
+        if task is None:
+            return self._fail(f'Задача с ID {args.id} не найдена.\n')
+        try:
+            date = self._parse_date(args.due_date)
+            status = bool(args.status)
+        except ValueError:
+            return self._fail('Ошибка в введённых данных! Проверьте дату срока выполнения и статус.\n')
+        else:
+            self._update(task, title=args.title, description=args.description, category=args.category,
+                         due_date=date, priority=args.priority, status=status)
+            return f'Задача с ID {args.id} изменена.\n'
 
-    def edit_inter(self, args: argparse.Namespace):
+    def edit_inter(self, args: argparse.Namespace) -> str:
         """
         Редактирование задачи в интерактивном режиме.
         :param args: Аргументы из командной строки (id).
+        :return: Отчёт.
         """
-        for task in self.tasks:
-            if task.id == args.id:
-                cnc = False  # Флаг отмены.
-                print('Редактирование задачи')
-                print('Введите соответствующие данные или команду cancel для отмены редактирования задачи.')
-                for head in ('title', 'description', 'category', 'due_date', 'priority', 'status'):
-                    print(f'{HEADS[head]}{' (дата)' if head == 'due_date' else ''}: {getattr(task, head)}')
-                    if head == 'priority':
-                        s = 'Введите целое число от 0 до 2:'
-                        for n, p in enumerate(PRIORITIES):
-                            s += f'\n{n} — {p}'
-                        print(s)
-                    elif head == 'status':
-                        s = 'Введите 0 или 1:'
-                        for n, p in enumerate(STATUSES):
-                            s += f'\n{n} — {p}'
-                        print(s)
-                    t = input('Заменить на: ')
+        task = self._get(args.id)
+        if task is None:
+            return self._fail(f'Задача с ID {args.id} не найдена.\n')
+        cnc = False  # Флаг отмены.
+        fields = {}  # Новые значения полей (применяются после ввода всех полей).
+        print('Редактирование задачи')
+        print('Введите соответствующие данные или команду cancel для отмены редактирования задачи.')
+        for head in ('title', 'description', 'category', 'due_date', 'priority', 'status'):
+            print(f'{HEADS[head]}{' (дата)' if head == 'due_date' else ''}: {getattr(task, head)}')
+            if head == 'priority':
+                s = 'Введите целое число от 0 до 2:'
+                for n, p in enumerate(PRIORITIES):
+                    s += f'\n{n} — {p}'
+                print(s)
+            elif head == 'status':
+                s = 'Введите 0 или 1:'
+                for n, p in enumerate(STATUSES):
+                    s += f'\n{n} — {p}'
+                print(s)
+            t = input('Заменить на: ')
+            if t == 'cancel':
+                cnc = True
+            if head == 'due_date':
+                while True:
+                    try:
+                        t = self._parse_date(t)
+                    except ValueError:
+                        t = input(f'Ошибка!\n{getattr(task, head)} заменить на: ')
+                        if t == 'cancel':
+                            cnc = True
+                            break
+                    else:
+                        break
+            elif head == 'priority':
+                while True:
+                    try:
+                        t = int(t)
+                        if t not in (0, 1, 2):
+                            raise ValueError
+                    except ValueError:
+                        t = input('Ошибка!\nЗаменить на: ')
+                        if t == 'cancel':
+                            cnc = True
+                            break
+                    else:
+                        t = PRIORITIES[t]
+                        break
+            elif head == 'status':
+                while True:
+                    try:
+                        t = bool(t)
+                    except ValueError:
+                        t = input('Ошибка!\nЗаменить на: ')
+                        if t == 'cancel':
+                            cnc = True
+                            break
+                    else:
+                        break
+            else:
+                while True:
+                    if len(t):
+                        break
+                    t = input('Ошибка!\nЗаменить на: ')
                     if t == 'cancel':
                         cnc = True
-                    if head == 'due_date':
-                        while True:
-                            try:
-                                t = date_parser.parse(t).strftime('%Y-%m-%d')
-                            except ValueError:
-                                t = input(f'Ошибка!\n{getattr(task, head)} заменить на: ')
-                                if t == 'cancel':
-                                    cnc = True
-                                    break
-                            else:
-                                break
-                    elif head == 'priority':
-                        while True:
-                            try:
-                                t = int(t)
-                                if t not in (0, 1, 2):
-                                    raise ValueError
-                            except ValueError:
-                                t = input('Ошибка!\nЗаменить на: ')
-                                if t == 'cancel':
-                                    cnc = True
-                                    break
-                            else:
-                                t = PRIORITIES[t]
-                                break
-                    elif head == 'status':
-                        while True:
-                            try:
-                                t = bool(t)
-                            except ValueError:
-                                t = input('Ошибка!\nЗаменить на: ')
-                                if t == 'cancel':
-                                    cnc = True
-                                    break
-                            else:
-                                break
-                    else:
-                        while True:
-                            if len(t):
-                                break
-                            t = input('Ошибка!\nЗаменить на: ')
-                            if t == 'cancel':
-                                cnc = True
-                                break
-                    if cnc:
-                        return 'Редактирование задачи отменено.'
-                    setattr(task, head, t)
-                break
-        return f'Задача с ID {args.id} не найдена.\n'
+                        break
+            if cnc:
+                return 'Редактирование задачи отменено.'
+            fields[head] = t
+        self._update(task, **fields)
+        return f'Задача с ID {args.id} изменена.\n'
 
     def search(self, args: argparse.Namespace) -> str:
         """
-        Поиск задачи по переданному фрагменту названия, фрагменту описания, категории или статусу.
-        :param args: Аргументы из командной строки (category, status, text).
-        :return: Таблица текстом или отчёт об отрицательном результате.
+        Поиск задачи по переданному фрагменту названия, фрагменту описания, категории, статусу, приоритету
+        или диапазону срока выполнения.
+        :param args: Аргументы из командной строки (category, status, text, priority, due_from, due_to, inner,
+            limit, offset, explain).
+        :return: Таблица текстом, план поиска или отчёт об отрицательном результате.
         """
-        res = []
-        for task in self.tasks:
-            if args.inner:
-                if args.text and args.text not in task:
-                    continue
-                elif args.category and args.category not in task.category:
-                    continue
-                elif args.status is not None and (bool(args.status) != task.status):
-                    continue
+        try:
+            query = self._get_query(args)
+        except ValueError:
+            return self._fail('Ошибка в введённых данных! Проверьте даты срока выполнения.\n')
+        if args.explain:
+            return self._explain(query)
+        cnt, tasks = self._found(query, args.jobs)
+        if cnt:
+            return self._set_result(tasks, 'Результат поиска')
+        return 'Нет задач, соответствующих параметрам поиска.\n'
+
+    def export_csv(self, args: argparse.Namespace) -> str | None:
+        """
+        Потоковая выгрузка списка задач (или задач, найденных по параметрам поиска) в файл или стандартный вывод
+        частями по EXPORT_CHUNK задач. Скорость выгрузки выводится в стандартный поток ошибок.
+        :param args: Аргументы из командной строки (output, format, gzip, incremental и параметры поиска).
+        :return: Отчёт или None (задачи выгружены в стандартный вывод).
+        """
+        try:
+            query = self._get_query(args)
+        except ValueError:
+            return self._fail('Ошибка в введённых данных! Проверьте даты срока выполнения.\n')
+        path = args.output
+        compress = args.gzip or path.endswith('.gz')
+        fmt = args.format or os.path.splitext(path.removesuffix('.gz'))[1].lstrip('.').lower()
+        if fmt not in EXPORT_FORMATS:
+            fmt = 'csv'
+        start = time.perf_counter()
+        tasks = self._select(query) if query.checks else self._all()
+        if args.incremental:
+            tasks = self._changed(tasks, f'{'stdout' if path == '-' else path}.checkpoint')
+        with self._open_export(path, compress) as file:
+            cnt = self._write_export(file, fmt, tasks)
+        t = time.perf_counter() - start
+        print(f'Выгружено задач: {cnt} за {t:.3f} с ({cnt / t if t else 0:.0f} строк/с).', file=sys.stderr)
+        if path == '-':
+            return None
+        return f'Выгружено задач: {cnt}. Смотрите файл {path}.'
+
+    @staticmethod
+    def _open_export(path: str, compress: bool):
+        """
+        Открытие файла выгрузки.
+        :param path: Путь к файлу (- — стандартный вывод).
+        :param compress: Сжатие gzip.
+        :return: Контекстный менеджер текстового файла.
+        """
+        if compress:
+            import gzip  # Импорт только для сжатой выгрузки.
+            return gzip.open(sys.stdout.buffer if path == '-' else path, 'wt', encoding='utf8', newline='')
+        if path == '-':
+            return nullcontext(sys.stdout)
+        return open(path, 'w', encoding='utf8', newline='')
+
+    @staticmethod
+    def _write_export(file, fmt: str, tasks) -> int:
+        """
+        Запись задач в файл выгрузки частями по EXPORT_CHUNK задач.
+        :param file: Текстовый файл.
+        :param fmt: Формат (см. EXPORT_FORMATS).
+        :param tasks: Итератор задач (Task).
+        :return: Количество выгруженных задач.
+        """
+        cnt = 0
+        if fmt == 'json':
+            for chunk in batched(storage.iter_dump(task.as_dict() for task in tasks), EXPORT_CHUNK):
+                cnt += len(chunk)
+                file.write(''.join(chunk))
+            return cnt - 1  # Последняя часть — закрывающая скобка массива.
+        if fmt == 'csv':
+            writer = csv.writer(file, lineterminator='\n')
+            writer.writerow(storage.FIELDS)
+        for chunk in batched(tasks, EXPORT_CHUNK):
+            cnt += len(chunk)
+            if fmt == 'csv':
+                writer.writerows((t.id, t.title, t.description, t.category, t.due_date, t.priority, t.status)
+                                 for t in chunk)
+            elif fmt == 'ndjson':
+                file.write(''.join(f'{json.dumps(task.as_dict(), ensure_ascii=False)}\n' for task in chunk))
+            else:
+                rows = [task.as_dict() for task in chunk]
+                columns = {field: [row[field] for row in rows] for field in storage.FIELDS}
+                file.write(f'{json.dumps(columns, ensure_ascii=False)}\n')
+        return cnt
+
+    @staticmethod
+    def _changed(tasks, path: str):
+        """
+        Отбор задач, добавленных или изменённых с прошлой выгрузки. Контрольная точка — двоичный файл записей
+        (ID, CRC32 полей задачи), упорядоченных по ID. Старая контрольная точка читается, а новая пишется
+        по мере перебора задач (слиянием по ID), поэтому память не зависит от количества задач.
+        Новая контрольная точка заменяет старую только после перебора всех задач.
+        :param tasks: Итератор задач (Task), упорядоченных по ID.
+        :param path: Путь к файлу контрольной точки.
+        :return: Итератор добавленных или изменённых задач.
+        """
+        import struct
+        import zlib  # Импорт только для инкрементальной выгрузки.
+        record = struct.Struct('<qI')
+
+        def read():
+            """Записи старой контрольной точки: (ID, CRC32)."""
+            if os.path.exists(path):
+                with open(path, 'rb') as file:
+                    while block := file.read(record.size * EXPORT_CHUNK):
+                        yield from record.iter_unpack(block)
+
+        old = read()
+        last = next(old, None)
+        with open(f'{path}.tmp', 'wb') as file:
+            for task in tasks:
+                while last is not None and last[0] < task.id:
+                    last = next(old, None)
+                crc = zlib.crc32('\x1f'.join(map(str, task.as_dict().values())).encode())
+                file.write(record.pack(task.id, crc))
+                if last != (task.id, crc):
+                    yield task
+        old.close()
+        os.replace(f'{path}.tmp', path)
+
+    def stats(self, args: argparse.Namespace) -> str:
+        """
+        Статистика списка задач по агрегированным счётчикам, сохранённым рядом с ним (список не загружается).
+        Если счётчики не сохранены или устарели (список изменён без их обновления), а также при --check
+        они пересчитываются по всем задачам и сохраняются.
+        :param args: Аргументы из командной строки (check).
+        :return: Отчёт.
+        """
+        if self.version is None:  # Список задач не загружался: достаточно счётчиков.
+            with self.storage.lock():
+                self._load_stats()
+        res = ''
+        if args.check or self.stats is None:
+            fresh = TaskStats(self._all())  # Загрузка списка может заново прочитать счётчики.
+            if self.stats is None:
+                res = 'Счётчики не сохранены или устарели: пересчитаны по списку задач.\n'
+            elif fresh != self.stats:
+                old = self.stats.as_dict()
+                diff = ', '.join(key for key, value in fresh.as_dict().items() if old[key] != value)
+                res = f'Счётчики расходились со списком задач ({diff}): пересчитаны.\n'
+            else:
+                res = 'Счётчики согласованы со списком задач.\n'
+            if fresh != self.stats:
+                self.stats = fresh
+                self._save_stats()
+        stats = self.stats
+        res += f'Всего задач: {stats.total}.\n'
+        res += f'По статусам: {', '.join(f'{s} — {n}' for s, n in zip(STATUSES, stats.statuses))}.\n'
+        res += f'По приоритетам: {', '.join(f'{p} — {n}' for p, n in zip(PRIORITIES, stats.priorities))}.\n'
+        res += f'Просроченные: {stats.overdue(date.today().isoformat())}.\n'
+        res += 'По категориям:\n'
+        for category, n in sorted(stats.categories.items(), key=lambda item: (-item[1], item[0])):
+            res += f'    {category} — {n}\n'
+        res += f'Ширина столбцов: {', '.join(f'{HEADS[k]} — {n}' for k, n in stats.widths().items())}.\n'
+        return res
+
+    def _save_stats(self):
+        """
+        Сохранение пересчитанных агрегированных счётчиков (вместе с несохранёнными изменениями, если они есть).
+        :raise storage.Conflict: Хранилище изменено другим процессом после загрузки.
+        """
+        if self.changes:
+            self._save()
+            return
+        with self.storage.lock(exclusive=True):
+            self._check_version()
+            self.storage.save_stats(self.stats.as_dict())
+
+    def undo(self, args: argparse.Namespace) -> str:
+        """
+        Отмена последних изменений списка задач по истории изменений (сначала несохранённых, затем сохранённых).
+        Команда не отменяется, если изменённые ею задачи изменены после неё без учёта в истории
+        (например, другим процессом при отключённой истории): их текущее состояние должно совпадать
+        с сохранённым состоянием после изменения. Сама отмена в историю не записывается.
+        :param args: Аргументы из командной строки (count).
+        :return: Отчёт.
+        """
+        res = ''
+        saved = None  # Сохранённые записи истории (читаются при необходимости).
+        for _ in range(args.count):
+            if self.steps:
+                record = self._records()[-1]
+                self.steps.pop()
+            else:
+                if saved is None:
+                    saved = self.storage.load_history()
+                if self.undone >= len(saved):
+                    res += 'Нет изменений для отмены.\n'
+                    break
+                record = saved[-self.undone - 1]
+                for i, before, after in record['changes']:
+                    task = self._get(i)
+                    if (task and task.as_dict()) != after:
+                        return res + self._fail(f'Задача с ID {i} изменена после команды {record['command']} '
+                                                f'({record['time']}): отмена невозможна.\n')
+                self.undone += 1
+            for i, before, after in record['changes']:
+                task = self._get(i)
+                if before is None:
+                    self._remove_tasks({i})
+                elif task is None:
+                    self._add_task(Task(**self._normalize(dict(before))))
                 else:
-                    res.append(task)
-                    self._set_name_length(task)
-            elif (
-                (args.text and args.text in task) or
-                (args.category and args.category in task.category) or
-                (args.status is not None and (bool(args.status) == task.status))
-            ):
-                res.append(task)
-                self._set_name_length(task)
-        if len(res):
-            self._set_result(res, 'Результат поиска')
-            return self.result
-        else:
-            return 'Нет задач, соответствующих параметрам поиска.\n'
+                    self._update(task, **{k: v for k, v in before.items() if k != 'id'})
+            if self.step is not None:
+                self.step['before'].clear()  # Отмена не записывается в историю.
+            res += (f'Отменена команда {record['command']} ({record['time']}): '
+                    f'задач — {len(record['changes'])}.\n')
+        return res
+
+    def history(self, args: argparse.Namespace) -> str:
+        """
+        Вывод последних записей истории изменений списка задач (несохранённые отмечаются).
+        :param args: Аргументы из командной строки (count).
+        :return: Отчёт.
+        """
+        saved = self.storage.load_history()
+        records = [(record, '') for record in saved[:len(saved) - self.undone]]
+        records += [(record, ' (не сохранено)') for record in self._records()]
+        if not records:
+            return 'История изменений пуста.\n'
+        res = ''
+        for record, mark in records[-args.count:] if args.count > 0 else ():
+            res += f'{record['time']} {record['command'] or '—'}{mark}:\n'
+            for i, before, after in record['changes']:
+                if before is None:
+                    res += f'    добавлена задача с ID {i} «{after['title']}»\n'
+                elif after is None:
+                    res += f'    удалена задача с ID {i} «{before['title']}»\n'
+                else:
+                    diff = '; '.join(f'{HEADS[k]}: {self._value(k, before[k])} → {self._value(k, after[k])}'
+                                     for k in before if before[k] != after[k])
+                    res += f'    изменена задача с ID {i}: {diff}\n'
+        return res
+
+    @staticmethod
+    def _value(key: str, value) -> str:
+        """
+        Значение поля задачи для вывода (статус — названием).
+        :param key: Поле задачи.
+        :param value: Значение.
+        :return: Строка.
+        """
+        return STATUSES[value] if key == 'status' else str(value)
+
+    def migrate(self, args: argparse.Namespace) -> str:
+        """
+        Импорт JSON-файла с задачами в базу данных SQLite, двоичный снимок или шарды (задачи с совпадающими ID
+        заменяются).
+        Обратно в JSON задачи выгружаются командой csv в формате json.
+        :param args: Аргументы из командной строки (file, to).
+        :return: Отчёт.
+        """
+        if not os.path.exists(args.file):
+            return self._fail(f'Файл {args.file} не найден.\n')
+        src = storage.JsonStorage(args.file, TASKS_JOURNAL if args.file == TASKS_JSON else None)
+        db = self.storage if self.storage.name == args.to else self._get_storage(args.to)
+        with src.lock(), db.lock(exclusive=True):
+            cnt = db.insert(self._normalize(task) for task in src.load())
+        return f'Импортировано задач: {cnt}. Смотрите файл {db.path}.\n'
 
-    def export_csv(self, args: argparse.Namespace) -> str:
+    def import_tasks(self, args: argparse.Namespace) -> str:
         """
-        Сохранение списка задач в CSV-файл.
+        Импорт задач из файла CSV, NDJSON или JSON. Задачи проверяются пакетами (при --workers — в пуле процессов),
+        получают новые ID и сохраняются в хранилище одной записью; записи с ошибками пропускаются.
+        :param args: Аргументы из командной строки (file, format, workers).
         :return: Отчёт.
         """
-        fn = ('id', 'title', 'description', 'category', 'due_date', 'priority', 'status')
-        with open(TASKS_CSV, 'w', encoding='utf8') as file:
-            csv_writer = csv.DictWriter(file, fn, lineterminator='\n')
-            csv_writer.writeheader()
-            csv_writer.writerows(vars(task) for task in self.tasks)
-        return f'Смотрите файл {TASKS_CSV}.'
+        if not os.path.exists(args.file):
+            return self._fail(f'Файл {args.file} не найден.\n')
+        fmt = args.format or os.path.splitext(args.file)[1].lstrip('.').lower()
+        if fmt not in IMPORT_FORMATS:
+            return self._fail(f'Неизвестный формат файла {args.file}. Укажите формат параметром --format.\n')
+        new = []  # Новые задачи: добавляются в список задач после чтения всего файла.
+        errors = []  # Ошибки: (номер записи, текст ошибки).
+        self._load(full=False)  # Последний выданный ID (восстанавливается, если файл не прочитан).
+        index = Task.index
+        with open(args.file, 'r', encoding='utf8', newline='' if fmt == 'csv' else None) as file:
+            batches = self._read_import(file, fmt)
+            pool = None
+            if args.workers > 1:
+                from concurrent.futures import ProcessPoolExecutor  # Импорт только для пула процессов.
+                pool = ProcessPoolExecutor(args.workers)
+                checked = self._check_parallel(pool, batches, 2 * args.workers)
+            else:
+                checked = map(self._check_batch, batches)
+            try:
+                for batch in checked:
+                    for n, task in batch:
+                        if isinstance(task, str):
+                            errors.append((n, task))
+                        else:
+                            new.append(self._new_task(**task))
+            except (ValueError, csv.Error) as e:  # Ошибка структуры JSON- или CSV-файла.
+                Task.index = index
+                return self._fail(f'Ошибка чтения файла {args.file}: {str(e).rstrip('.')}. Задачи не импортированы.\n')
+            finally:
+                if pool is not None:
+                    pool.shutdown(cancel_futures=True)
+        for task in new:
+            self._add_task(task)
+        res = f'Импортировано задач: {len(new)}.\n'
+        if errors:
+            res += self._fail(f'Пропущено записей с ошибками: {len(errors)}.\n')
+            for n, error in errors[:IMPORT_ERRORS]:
+                res += f'Запись {n}: {error}.\n'
+            if len(errors) > IMPORT_ERRORS:
+                res += '…\n'
+        return res
 
-    def run(self):
+    def run(self, argv: list | None = None) -> int:
         """
         Запуск парсера команды, выполнение команды и сохранение изменений списка задач в JSON-файле.
+        :param argv: Аргументы команды (None — из командной строки).
+        :return: Код завершения: 1 — команда пакетного режима завершилась ошибкой (см. batch), иначе 0.
         """
+        start = time.perf_counter()
+        self.failed = False
         try:
-            args = self.parser.parse_args()
+            args = self.parser.parse_args(argv)
         except:
             pass
             # Можно вывести сообщение об ошибке (отсутствует обязательный позиционный аргумент (команда)),
             # но оно выведется и при выводе справки (--help) или версии (--version).
         else:
-            print(args.func(args))
-            self._save_json()
+            if args.storage != self.storage.name:
+                self._open(args.storage)
+            else:
+                self._refresh()
+            self.columnar = args.columnar and getattr(args, 'readonly', False)
+            self.out = sys.stdout
+            profiler = None
+            if args.profile or args.metrics or args.cprofile:
+                profiler = Profiler(time.perf_counter() - start, args.profile or bool(args.metrics), args.cprofile)
+                command = args.func.__name__
+                profiler.attach(self, args)
+            try:
+                try:
+                    res = self._execute(args)
+                except storage.Conflict as e:
+                    res = f'{e} Изменения не сохранены, повторите команду.\n'
+                if res is not None:  # None — команда сама вывела результат (csv -o -).
+                    with profiler.phase('render') if profiler else nullcontext():
+                        print(res)  # Таблицы уже выведены в self.out, print завершает их переводом строки.
+            finally:
+                if profiler is not None:
+                    profiler.detach(self)
+            if profiler is not None:
+                tasks = len(self.table) if self.table is not None else len(self.tasks)
+                if args.profile:
+                    sys.stdout.flush()
+                    sys.stderr.write(profiler.report(command, tasks))
+                if args.metrics:
+                    metrics = profiler.metrics(command, tasks, sys.argv[1:] if argv is None else argv,
+                                               self.storage.name, self.conflicts)
+                    with open(args.metrics, 'a', encoding='utf8') as file:
+                        file.write(json.dumps(metrics, ensure_ascii=False) + '\n')
+        return int(self.failed)
+
+    def _fail(self, message: str) -> str:
+        """
+        Отчёт о неудачном выполнении команды: запоминается первая ошибка команды (признак неудачи для пакетного
+        режима, см. _batch_command).
+        :param message: Отчёт об ошибке.
+        :return: Тот же отчёт.
+        """
+        if self.error is None:
+            self.error = message.strip()
+        return message
+
+    def _call(self, args: argparse.Namespace) -> str | None:
+        """
+        Выполнение команды с учётом изменённых ею задач в отдельной записи истории изменений (см. _track).
+        Команды пакета, оболочки и демона записываются каждая отдельно; ширина столбцов таблицы каждой команды
+        определяется только её задачами, как при запуске скрипта.
+        :param args: Аргументы из командной строки.
+        :return: Результат команды.
+        """
+        outer = self.step
+        self.error = None
+        self.name_length = dict(NAME_LENGTH)
+        self.step = dict(command=getattr(args, 'command', None), time=time.strftime('%Y-%m-%d %H:%M:%S'), before={})
+        try:
+            return args.func(args)
+        finally:
+            if self.step['before']:
+                self.steps.append(self.step)
+            self.step = outer
+
+    def _execute(self, args: argparse.Namespace) -> str | None:
+        """
+        Выполнение команды и сохранение изменений. Команда выполняется без блокировки хранилища (оптимистично);
+        если до сохранения хранилище изменил другой процесс, список задач загружается заново и команда
+        повторяется целиком под исключительной блокировкой, поэтому второй раз конфликт невозможен.
+        Интерактивные команды не повторяются (блокировка держалась бы во время ввода).
+        :param args: Аргументы из командной строки.
+        :return: Результат команды.
+        :raise storage.Conflict: Конфликт при выполнении интерактивной команды.
+        """
+        try:
+            res = self._call(args)
+            self._save()
+            return res
+        except storage.Conflict:
+            self._reset()
+            if getattr(args, 'interactive', False):
+                raise
+        self.conflicts += 1
+        with self.storage.lock(exclusive=True):
+            res = self._call(args)
+            self._save()
+        return res
+
+    def batch(self, args: argparse.Namespace) -> str:
+        """
+        Пакетный режим: команды из файла (по одной в строке, как в командной строке; пустые строки и комментарии #
+        пропускаются) выполняются в одном процессе над загруженным списком задач, изменения сохраняются один раз
+        в конце или каждые every команд. Хранилище заблокировано исключительно на всё время выполнения.
+        Ошибка команды (неверные аргументы, исключение или отчёт об ошибке, см. _fail) выводится в stderr
+        с номером строки; в режиме atomic выполнение прекращается и изменения не сохраняются. Если хотя бы одна
+        команда завершилась ошибкой, код завершения скрипта — 1.
+        :param args: Аргументы из командной строки (file, every, atomic).
+        :return: Отчёт.
+        """
+        self.failed = True  # Пока пакет не выполнен.
+        self.resident = True
+        if args.atomic and args.every:
+            return 'Параметры --atomic и --every несовместимы.\n'
+        if args.file != '-' and not os.path.exists(args.file):
+            return f'Файл {args.file} не найден.\n'
+        done = failed = 0
+        with (nullcontext(sys.stdin) if args.file == '-' else open(args.file, encoding='utf8')) as file:
+            try:
+                with self.storage.lock(exclusive=True), (self.storage.transaction() if args.atomic else nullcontext()):
+                    if args.atomic:
+                        self._load()  # Иначе загрузка после добавления задач сохранила бы их (см. _load).
+                    for n, line in enumerate(file, 1):
+                        error = self._batch_command(line)
+                        if error is None:
+                            continue
+                        done += 1
+                        if error:
+                            failed += 1
+                            print(f'Строка {n}: {error}', file=sys.stderr)
+                            if args.atomic:
+                                raise storage.Rollback(n)
+                        if args.every and not done % args.every:
+                            self._save()
+                    self._save()
+            except storage.Rollback as e:
+                self._reset()
+                return f'Ошибка в строке {e}. Изменения не сохранены (выполнено команд до ошибки: {done - 1}).\n'
+        self.failed = bool(failed)
+        return f'Выполнено команд: {done}, с ошибками: {failed}.\n'
+
+    def _parse_line(self, line: str) -> argparse.Namespace | str | None:
+        """
+        Разбор строки команды пакетного режима или оболочки (как аргументов командной строки, без имени скрипта).
+        Режим хранения по умолчанию — текущий.
+        :param line: Строка команды.
+        :return: Аргументы; None — строка пуста; '' — argparse вывел справку; иначе — описание ошибки.
+        """
+        err = io.StringIO()
+        try:
+            argv = shlex.split(line, comments=True)
+            if not argv:
+                return None
+            with redirect_stderr(err):
+                args = self.parser.parse_args(argv, argparse.Namespace(storage=self.storage.name, columnar=False))
+        except ValueError as e:  # Незакрытые кавычки.
+            return str(e)
+        except SystemExit:
+            return (err.getvalue().strip().splitlines() or [''])[-1]
+        if not hasattr(args, 'func'):
+            return 'не указана команда'
+        return args
+
+    def _batch_command(self, line: str) -> str | None:
+        """
+        Выполнение команды пакетного режима (см. batch). Результат команды выводится, как при запуске скрипта.
+        :param line: Строка команды.
+        :return: None — строка пуста, '' — команда выполнена, иначе — описание ошибки.
+        """
+        args = self._parse_line(line)
+        if not isinstance(args, argparse.Namespace):
+            return args or (None if args is None else 'неверные аргументы')
+        if getattr(args, 'interactive', False) or getattr(args, 'local', False):
+            return 'интерактивные команды, serve, batch и shell в пакете не выполняются'
+        if args.storage != self.storage.name:
+            return 'другой режим хранения'
+        try:
+            res = self._call(args)
+        except Exception as e:
+            return f'{type(e).__name__}: {e}'
+        if res is not None:
+            print(res)
+        return self.error or ''
+
+    def shell(self, args: argparse.Namespace) -> str:
+        """
+        Оболочка: список задач загружается один раз и хранится в памяти, команды (как в командной строке, без имени
+        скрипта) вводятся по одной и выполняются над ним без загрузки и разбора хранилища. Изменения сохраняются
+        командой save, при выходе (quit, exit, Ctrl+D) и, если задан interval, после команды, выполненной не раньше
+        чем через interval секунд после первого несохранённого изменения. Перед первым изменением хранилище
+        блокируется исключительно до сохранения (как демоном, см. _request): другие процессы не прочтут
+        несохранённое состояние, а список, изменённый ими до блокировки, загружается заново. Дополнение по Tab
+        (если есть модуль readline): команды, параметры, ID и категории из индексов загруженного списка задач.
+        :param args: Аргументы из командной строки (interval, timing).
+        :return: Отчёт.
+        """
+        self.resident = True
+        tty = sys.stdin.isatty()
+        if tty:
+            try:
+                import readline  # Дополнение и история ввода (в Windows модуля нет).
+            except ImportError:
+                pass
+            else:
+                matches = []  # Варианты дополнения текущего слова.
+
+                def complete(text: str, state: int) -> str | None:
+                    if not state:
+                        matches[:] = self._complete(readline.get_line_buffer()[:readline.get_begidx()], text)
+                    return matches[state] if state < len(matches) else None
+
+                readline.set_completer_delims(' \t\n')
+                readline.set_completer(complete)
+                readline.parse_and_bind('tab: complete')
+        self.columnar = False  # Загруженный список задач нужен и изменяющим командам.
+        self._load()
+        print(f'Оболочка: задач {len(self.tasks)}. Команды — как в командной строке, help — справка, '
+              'save — сохранение изменений, quit — сохранение и выход.', file=sys.stderr, flush=True)
+        held = None  # Время первого несохранённого изменения (perf_counter).
+        try:
+            while True:
+                try:
+                    line = input(SHELL_PROMPT if tty else '')
+                except EOFError:
+                    break
+                except KeyboardInterrupt:  # Ctrl+C отменяет ввод строки, как в интерпретаторе Python.
+                    print()
+                    continue
+                word = line.strip()
+                if word in ('quit', 'exit'):
+                    break
+                if word == 'help':
+                    print(f'Команды: {', '.join(self.commands)}; справка по команде: <команда> -h.\n'
+                          'save — сохранение изменений, quit (exit, Ctrl+D) — сохранение и выход.')
+                    continue
+                if word == 'save':
+                    print('Изменения сохранены.' if self._shell_save() else 'Несохранённых изменений нет.')
+                    held = None
+                    continue
+                start = time.perf_counter()
+                error = self._shell_command(line)
+                if error:
+                    print(f'Ошибка: {error}', file=sys.stderr)
+                if self.hold is not None:
+                    held = held or start
+                    if args.interval is not None and time.perf_counter() - held >= args.interval:
+                        self._shell_save()
+                        held = None
+                if args.timing and error is not None:
+                    print(f'({(time.perf_counter() - start) * 1000:.1f} мс)', file=sys.stderr)
+        finally:
+            saved = self._shell_save()
+        return f'Сеанс завершён.{' Изменения сохранены.' if saved else ''}\n'
+
+    def _shell_save(self) -> bool:
+        """
+        Сохранение изменений оболочки и снятие исключительной блокировки хранилища (см. _release).
+        :return: True, если были несохранённые изменения.
+        """
+        changed = bool(self.changes)
+        self._release()
+        return changed
+
+    def _shell_command(self, line: str) -> str | None:
+        """
+        Выполнение команды оболочки (см. shell). Результат команды выводится, как при запуске скрипта; исключение
+        команды не завершает сеанс.
+        :param line: Строка команды.
+        :return: None — строка пуста, '' — команда выполнена, иначе — описание ошибки.
+        """
+        args = self._parse_line(line)
+        if not isinstance(args, argparse.Namespace):
+            return args
+        if getattr(args, 'local', False):
+            return 'serve, batch и shell в оболочке не выполняются'
+        if args.storage != self.storage.name:
+            return 'другой режим хранения'
+        if not getattr(args, 'readonly', False) and self.hold is None:
+            self.hold = ExitStack()
+            self.hold.enter_context(self.storage.lock(exclusive=True))
+        self._refresh()
+        self.out = sys.stdout
+        try:
+            res = self._call(args)
+        except Exception as e:
+            return f'{type(e).__name__}: {e}'
+        if res is not None:
+            print(res)
+        return ''
+
+    def _complete(self, line: str, text: str) -> list[str]:
+        """
+        Варианты дополнения слова в оболочке: имя команды, параметр команды, ID (по индексу ID) или категория
+        (по индексу категорий, в кавычках, если содержит пробелы).
+        :param line: Строка до дополняемого слова.
+        :param text: Начало дополняемого слова.
+        :return: Список вариантов.
+        """
+        try:
+            words = shlex.split(line)
+        except ValueError:  # Незакрытые кавычки.
+            words = line.split()
+        if not words:
+            return [name for name in (*self.commands, *SHELL_COMMANDS) if name.startswith(text)]
+        parser = self.commands.get(words[0])
+        if parser is None:
+            return []
+        if text.startswith('-'):
+            return sorted(option for option in parser._option_string_actions if option.startswith(text))
+        options = [word for word in words[1:] if word.startswith('-')]
+        option = options[-1] if options else None
+        position = len(words) - 1 - len(options)  # Номер позиционного аргумента (без параметров).
+        command = words[0]
+        if option in ('-c', '--category') and (command == 'del' or words[-1] == option) or (
+                not options and (command, position) in (('add', 2), ('edit', 3))):
+            prefix = text.lstrip('\'"').lower()
+            names = {next(iter(bucket.values())).category for bucket in self.categories.values() if bucket}
+            return sorted(self._quote(name) for name in names if name.lower().startswith(prefix))
+        if option in ('-i', '--id') and command == 'del' or command == 'completed' or (
+                not options and (command, position) in (('edit', 0), ('edit_inter', 0))):
+            return sorted(islice((str(i) for i in self.ids if str(i).startswith(text)), COMPLETIONS), key=int)
+        return []
+
+    @staticmethod
+    def _quote(word: str) -> str:
+        """
+        Слово строки команды в кавычках (shlex.quote), если без них оно разбирается не как одно слово
+        (shlex.quote заключает в кавычки и любые не-ASCII слова).
+        """
+        if word and not set(word) & set(' \t\n\'"\\#'):
+            return word
+        return shlex.quote(word)
+
+    def serve(self, args: argparse.Namespace) -> str:
+        """
+        Демон: список задач загружается один раз и хранится в памяти, команды клиентов (см. forward) выполняются
+        по очереди в цикле событий asyncio. Изменения сохраняются раз в interval секунд и при остановке;
+        до сохранения хранилище заблокировано демоном исключительно, поэтому другие процессы не прочтут
+        и не перезапишут несохранённое состояние. Остановка — сигналом SIGINT (Ctrl+C) или SIGTERM.
+        :param args: Аргументы из командной строки (socket, interval).
+        :return: Отчёт.
+        """
+        if not hasattr(socket, 'AF_UNIX'):
+            return 'Демон не поддерживается: в системе нет сокетов Unix.\n'
+        if os.path.exists(args.socket):
+            with socket.socket(socket.AF_UNIX) as sock:
+                if not sock.connect_ex(args.socket):
+                    return f'Демон уже запущен (сокет {args.socket}).\n'
+            os.remove(args.socket)  # Сокет остался от аварийно завершённого демона.
+        import asyncio  # Импорт только при запуске демона.
+        self.resident = True
+        self.columnar = False  # Загруженный список задач нужен и изменяющим командам.
+        self._load()
+        print(f'Демон запущен: сокет {args.socket}, задач {len(self.tasks)}.', file=sys.stderr, flush=True)
+        try:
+            asyncio.run(self._serve(args.socket, args.interval))
+        finally:
+            self._release()
+            if os.path.exists(args.socket):
+                os.remove(args.socket)
+        return 'Демон остановлен.\n'
+
+    async def _serve(self, path: str, interval: float):
+        """
+        Цикл событий демона: приём команд через сокет и периодическое сохранение изменений.
+        :param path: Путь к сокету.
+        :param interval: Период сохранения изменений (с); 0 — после каждой команды.
+        """
+        import asyncio
+        import signal
+
+        async def handle(reader, writer):
+            argv = json.loads(await reader.readline())
+            head, body = self._request(argv, not interval)
+            writer.write(json.dumps(head).encode() + b'\n' + body)
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+
+        async def autosave():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    self._release()
+                except Exception:
+                    traceback.print_exc()
+
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        async with await asyncio.start_unix_server(handle, path):
+            saver = asyncio.create_task(autosave()) if interval else None
+            await stop.wait()
+            if saver:
+                saver.cancel()
+
+    def _request(self, argv: list, save: bool = False) -> tuple[dict, bytes]:
+        """
+        Выполнение команды клиента демоном. Вывод команды перехватывается и возвращается клиенту.
+        Перед первой изменяющей командой демон блокирует хранилище исключительно (до сохранения, см. _release).
+        :param argv: Аргументы команды.
+        :param save: Сохранить изменения сразу после команды.
+        :return: Заголовок ответа (local — команду нужно выполнить в процессе клиента; err — вывод в stderr)
+            и вывод команды в кодировке UTF-8.
+        """
+        out = io.TextIOWrapper(io.BytesIO(), encoding='utf8', newline='')  # С buffer для двоичного вывода (gzip).
+        err = io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            try:
+                args = self.parser.parse_args(argv)
+            except SystemExit:  # --help, --version или ошибка в аргументах: argparse уже вывел сообщение.
+                args = None
+            if args is not None:
+                if (not hasattr(args, 'func') or args.storage != self.storage.name
+                        or getattr(args, 'interactive', False) or getattr(args, 'local', False)
+                        or args.profile or args.metrics or args.cprofile):
+                    return dict(local=True), b''
+                try:
+                    if not getattr(args, 'readonly', False) and self.hold is None:
+                        self.hold = ExitStack()
+                        self.hold.enter_context(self.storage.lock(exclusive=True))
+                    self._refresh()
+                    self.out = sys.stdout
+                    res = self._call(args)
+                    if res is not None:
+                        print(res)
+                    if save:
+                        self._release()
+                except Exception:  # Ошибка команды не должна останавливать демон.
+                    traceback.print_exc()
+            out.flush()
+        return dict(local=False, err=err.getvalue()), out.buffer.getvalue()
+
+    def _release(self):
+        """
+        Сохранение изменений, накопленных демоном или оболочкой, и снятие исключительной блокировки хранилища.
+        """
+        if self.hold is not None:
+            try:
+                self._save()
+            finally:
+                self.hold.close()
+                self.hold = None
+
+
+def forward(argv: list, path: str = TASKS_SOCKET) -> bool:
+    """
+    Тонкий клиент: передача команды запущенному демону (команда serve) и вывод её результата.
+    :param argv: Аргументы команды.
+    :param path: Путь к сокету демона.
+    :return: True — команда выполнена демоном; False — демон не запущен или команду нужно выполнить в процессе
+        клиента (интерактивный ввод, другой режим хранения, профилирование, сама команда serve).
+    """
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return False
+    with socket.socket(socket.AF_UNIX) as sock:
+        try:
+            sock.connect(path)
+        except OSError:  # Сокет остался от аварийно завершённого демона.
+            return False
+        sock.sendall(json.dumps(argv).encode() + b'\n')
+        with sock.makefile('rb') as reply:
+            head = json.loads(reply.readline())
+            if head['local']:
+                return False
+            sys.stderr.write(head['err'])
+            sys.stdout.flush()
+            sys.stdout.buffer.write(reply.read())
+            sys.stdout.flush()
+    return True
 
 
 if __name__ == '__main__':
-    tm = TaskManager()
-    tm.run()
+    if not forward(sys.argv[1:]):
+        tm = TaskManager()
+        sys.exit(tm.run())
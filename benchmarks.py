@@ -0,0 +1,1138 @@
+"""
+Замеры производительности менеджера задач.
+
+Запуск: python benchmarks.py [имя замера ...] [-n РАЗМЕР ...] [--json ФАЙЛ] [--compare БАЗОВЫЙ [НОВЫЙ]]
+"""
+import argparse
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+import storage
+from TaskManager import (PRIORITIES, STORAGE, STORAGES, TASKS_DB, TASKS_JOURNAL, TASKS_JSON, TASKS_SHARDS,
+                         TASKS_SNAPSHOT, TASKS_SOCKET, VERSION, Query, Task, TaskColumns, TaskManager, TaskStats,
+                         forward)
+
+# Основные категории по убыванию частоты; за ними — длинный хвост редких категорий «Проект K».
+CATEGORIES = ('Работа', 'Дом', 'Обучение', 'Здоровье', 'Покупки', 'Финансы', 'Хобби', 'Семья')
+PROJECTS = 200  # Количество редких категорий.
+# Слова названий и описаний по убыванию частоты.
+WORDS = ('задача', 'отчёт', 'проект', 'встреча', 'письмо', 'документ', 'звонок', 'план', 'код', 'тест', 'обзор',
+         'релиз', 'бюджет', 'курс', 'книга', 'спорт', 'клиент', 'договор', 'счёт', 'оплата', 'ремонт', 'врач',
+         'заказ', 'доставка', 'подарок', 'праздник', 'поездка', 'билеты', 'гостиница', 'презентация', 'сервер',
+         'ошибка', 'дизайн', 'макет', 'статья', 'перевод', 'экзамен', 'лекция', 'тренировка', 'бассейн', 'аптека',
+         'продукты', 'уборка', 'стирка', 'машина', 'страховка', 'налог', 'квартира')
+PRIORITY_WEIGHTS = (50, 35, 15)  # Доли приоритетов PRIORITIES (%).
+DONE_SHARE = 0.3  # Доля задач со статусом STATUSES[1].
+SETTINGS = dict(seed=0, repeat=3, storages=['json'])  # Параметры замера commands (задаются в main).
+RESULTS = []  # Результаты замеров для --json: словари (bench, storage, name, n и измеренные величины).
+
+
+def reset():
+    """
+    Очистка общего состояния менеджера задач. Список задач считается загруженным: его заполняет fill.
+    """
+    TaskManager.tasks.clear()
+    TaskManager.ids.clear()
+    TaskManager.categories.clear()
+    TaskManager.texts = None
+    TaskManager.orders.clear()
+    TaskManager.loaded = TaskManager.counted = True
+    Task.index = 0
+
+
+def generate(n: int, seed: int = 0):
+    """
+    Синтетические задачи, одинаковые при одинаковом зерне. Категории и слова текста распределены по закону Ципфа
+    (частота обратно пропорциональна рангу: несколько частых категорий и длинный хвост редких), длина названия —
+    от 2 до 5 слов, описания — от 4 до 16, приоритеты и статусы — в долях PRIORITY_WEIGHTS и DONE_SHARE.
+    :param n: Количество задач.
+    :param seed: Зерно генератора случайных чисел.
+    :return: Итератор словарей полей задач (приоритет — номером в PRIORITIES, статус — bool), ID с 1 по порядку.
+    """
+    rnd = random.Random(seed)
+    categories = (*CATEGORIES, *(f'Проект {k}' for k in range(1, PROJECTS + 1)))
+    category_weights = list(accumulate(1 / rank ** 1.5 for rank in range(1, len(categories) + 1)))
+    word_weights = list(accumulate(1 / rank for rank in range(1, len(WORDS) + 1)))
+    priority_weights = list(accumulate(PRIORITY_WEIGHTS))
+    priorities = range(len(PRIORITIES))
+    for i in range(1, n + 1):
+        yield dict(
+            id=i,
+            title=' '.join(rnd.choices(WORDS, cum_weights=word_weights, k=rnd.randint(2, 5))).capitalize(),
+            description=' '.join(rnd.choices(WORDS, cum_weights=word_weights, k=rnd.randint(4, 16))).capitalize(),
+            category=rnd.choices(categories, cum_weights=category_weights)[0],
+            due_date=f'2024-{rnd.randint(1, 12):02}-{rnd.randint(1, 28):02}',
+            priority=rnd.choices(priorities, cum_weights=priority_weights)[0],
+            status=rnd.random() < DONE_SHARE
+        )
+
+
+def write_store(path: str, n: int, seed: int = 0):
+    """
+    Запись синтетических задач в JSON-файл (как его записывает менеджер задач: приоритет — названием)
+    потоково, без создания объектов Task: так создаются и хранилища на 10 млн задач.
+    :param path: Путь к файлу.
+    :param n: Количество задач.
+    :param seed: Зерно генератора случайных чисел.
+    """
+    tasks = (dict(task, priority=PRIORITIES[task['priority']]) for task in generate(n, seed))
+    with open(path, 'w', encoding='utf8') as file:
+        for text in storage.iter_dump(tasks):
+            file.write(text)
+
+
+def fill(tm: TaskManager, n: int, seed: int = 0):
+    """
+    Заполнение менеджера задач синтетическими задачами.
+    :param tm: Менеджер задач.
+    :param n: Количество задач.
+    :param seed: Зерно генератора случайных чисел.
+    """
+    reset()
+    for data in generate(n, seed):
+        task = Task(**data)
+        tm.tasks.append(task)
+        tm._index_task(task)
+
+
+def remove(path: str):
+    """
+    Удаление файла или каталога (хранилище shards), если он есть.
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def timer(func, *args) -> float:
+    """
+    Замер времени выполнения функции.
+    :return: Время в секундах.
+    """
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def bench_index(tm: TaskManager, sizes: list[int]):
+    """
+    Массовые операции по списку ID (completed, edit) — время на одну задачу не должно расти с размером хранилища.
+    """
+    for n in sizes:
+        fill(tm, n)
+        ids = list(range(1, n + 1, 10))
+        args = tm.parser.parse_args(['completed', *map(str, ids)])
+        t = timer(tm.completed, args)
+        print(f'completed  N={n:>9}  M={len(ids):>8}  {t:8.3f} с  {t / len(ids) * 1e6:7.2f} мкс/задача')
+        t = timer(lambda: [tm.edit(tm.parser.parse_args(
+            ['edit', str(i), 'Название', 'Описание', 'Дом', '2024-12-01', '1', '0'])) for i in ids[:1000]])
+        m = min(len(ids), 1000)
+        print(f'edit       N={n:>9}  M={m:>8}  {t:8.3f} с  {t / m * 1e6:7.2f} мкс/задача')
+
+
+def bench_delete(tm: TaskManager, sizes: list[int]):
+    """
+    Массовое удаление: 1 % задач по ID (например, 10 тыс. из 1 млн) и целая категория.
+    """
+    for n in sizes:
+        fill(tm, n)
+        ids = random.Random(1).sample(range(1, n + 1), max(n // 100, 1))
+        args = tm.parser.parse_args(['del', '-i', *map(str, ids)])
+        t = timer(tm.delete, args)
+        print(f'del -i     N={n:>9}  M={len(ids):>8}  {t:8.3f} с  осталось {len(tm.tasks)}')
+        m = len(tm.categories[CATEGORIES[0].lower()])
+        t = timer(tm.delete, tm.parser.parse_args(['del', '-c', CATEGORIES[0]]))
+        print(f'del -c     N={n:>9}  M={m:>8}  {t:8.3f} с  осталось {len(tm.tasks)}')
+
+
+def bench_storage(tm: TaskManager, sizes: list[int]):
+    """
+    Запись при отметке одной задачи выполненной: перезапись JSON-файла целиком против дозаписи журнала.
+    """
+    for n in sizes:
+        fill(tm, n)
+        tm.storage = tm._get_storage('json')
+        tm.storage.save(tm.tasks, {})
+        tm.version = tm.storage.version()  # Файл записан в обход _save: версия предыдущего размера устарела.
+        # Невыполненные задачи из середины списка, своя для каждого режима: отметка выполненной задачи ничего
+        # не изменяет и не записывается.
+        pending = (t.id for t in tm.tasks[n // 2:] + tm.tasks[:n // 2] if not t.status)
+        for storage, i in zip(('json', 'journal'), pending):
+            tm.storage = tm._get_storage(storage)
+            tm.completed(tm.parser.parse_args(['completed', str(i)]))
+            path = TASKS_JOURNAL if storage == 'journal' else TASKS_JSON
+            size = os.path.getsize(path) if storage == 'journal' and os.path.exists(path) else 0
+            t = timer(tm._save)
+            size = (os.path.getsize(path) if os.path.exists(path) else 0) - size
+            print(f'{storage:<10} N={n:>9}  {t * 1000:9.3f} мс  записано {size:>11} байт')
+        if os.path.exists(TASKS_JOURNAL):
+            os.remove(TASKS_JOURNAL)
+        tm.storage = tm._get_storage(STORAGE)
+
+
+def bench_sqlite(tm: TaskManager, sizes: list[int]):
+    """
+    Команды над одной задачей в хранилище SQLite (открытие базы, запрос, сохранение).
+    """
+    commands = (
+        ('completed', '{i}'),
+        ('edit', '{i}', 'Название', 'Описание', 'Дом', '2024-12-01', '1', '0'),
+        ('search', '-i', '-c', 'Дом', '-t', 'название'),
+        ('del', '-i', '{i}'),
+    )
+    for n in sizes:
+        fill(tm, n)
+        tm.storage.save(tm.tasks, {})
+        if os.path.exists(TASKS_DB):
+            os.remove(TASKS_DB)
+        t = timer(tm.migrate, tm.parser.parse_args(['migrate']))
+        print(f'migrate    N={n:>9}  {t:9.3f} с')
+        for command in commands:
+            times = []
+            for i in range(1, n + 1, max(n // 20, 1)):
+                start = time.perf_counter()
+                tm._open('sqlite')
+                args = tm.parser.parse_args([a.format(i=i) for a in command])
+                args.func(args)
+                tm._save()
+                times.append(time.perf_counter() - start)
+            print(f'{command[0]:<10} N={n:>9}  {sorted(times)[len(times) // 2] * 1000:9.3f} мс (медиана)')
+        tm._open(STORAGE)
+
+
+# Загрузка JSON-файла до перехода на потоковое чтение: json.load, сортированная копия, затем объекты Task.
+LOAD_OLD = """
+import json, resource, time
+from TaskManager import Task, TaskManager
+start = time.perf_counter()
+with open('tasks.json', encoding='utf8') as file:
+    temp = json.load(file)
+temp = sorted(temp, key=lambda d: d['id'])
+tasks = [Task(**TaskManager._normalize(task)) for task in temp]
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, len(tasks))
+"""
+LOAD_NEW = """
+import resource, time
+from TaskManager import TaskManager
+start = time.perf_counter()
+tm = TaskManager()
+tm._load()  # Список задач загружается по первому требованию команды.
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, len(tm.tasks))
+"""
+
+
+def bench_load(tm: TaskManager, sizes: list[int]):
+    """
+    Загрузка JSON-файла: время и пиковый объём памяти процесса (RSS) до и после перехода на потоковое чтение.
+    """
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    for n in sizes:
+        fill(tm, n)
+        tm._get_storage('json').save(tm.tasks, {})
+        reset()
+        for name, code in (('json.load', LOAD_OLD), ('поток', LOAD_NEW)):
+            out = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True)
+            t, rss, cnt = out.stdout.split()
+            assert int(cnt) == n, f'{name}: загружено задач {cnt} из {n}'
+            print(f'{name:<10} N={n:>9}  {float(t):8.3f} с  пиковый RSS {int(rss) // 1024:>6} МиБ  задач {cnt}')
+
+
+# Одна операция над хранилищем отдельным процессом: открытие (загрузка), затем выборка по ID, поиск по статусу
+# или по тексту; время от создания менеджера задач и пиковый RSS процесса.
+SNAPSHOT_OP = """
+import resource, sys, time
+from TaskManager import Query, TaskManager
+start = time.perf_counter()
+tm = TaskManager(sys.argv[1])
+if sys.argv[2] == 'id':
+    cnt = int(tm._get(int(sys.argv[3])) is not None)
+else:
+    query = Query(status=1) if sys.argv[2] == 'status' else Query('отчёт', inner=True, limit=20)
+    cnt = sum(1 for _ in tm._select(query))
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, cnt)
+"""
+
+
+def bench_snapshot(tm: TaskManager, sizes: list[int]):
+    """
+    Двоичный снимок (mmap) против JSON-файла и базы SQLite: размер файла, время и пиковый RSS процесса, открывающего
+    хранилище и выполняющего одну операцию (выборка по ID, поиск по статусу, первые 20 задач с текстом).
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'TaskManager.py')
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    for n in sizes:
+        for path in (TASKS_JSON, TASKS_JOURNAL, TASKS_DB, TASKS_SNAPSHOT):
+            if os.path.exists(path):
+                os.remove(path)
+        write_store(TASKS_JSON, n)
+        for name, path in (('sqlite', TASKS_DB), ('snapshot', TASKS_SNAPSHOT)):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, script, 'migrate', '--to', name], capture_output=True, check=True)
+            print(f'migrate --to {name:<8} N={n:>9}  {time.perf_counter() - start:8.2f} с')
+        for name, path in (('json', TASKS_JSON), ('sqlite', TASKS_DB), ('snapshot', TASKS_SNAPSHOT)):
+            print(f'{name:<8} N={n:>9}  файл {os.path.getsize(path) / 2 ** 20:8.1f} МиБ')
+            for op in ('id', 'status', 'text'):
+                out = subprocess.run([sys.executable, '-c', SNAPSHOT_OP, name, op, str(n // 2 or 1)], env=env,
+                                     capture_output=True, text=True, check=True)
+                t, rss, cnt = out.stdout.split()
+                print(f'{name:<8} {op:<6} N={n:>9}  {float(t) * 1000:9.1f} мс  пиковый RSS {int(rss) // 1024:>6} МиБ  '
+                      f'задач {cnt}')
+    reset()
+
+
+SHARDS_SUITE = (
+    ('del -c редкая категория', ['del', '-c', f'Проект {PROJECTS}'], True),
+    ('del -c частая категория', ['del', '-c', CATEGORIES[1]], True),
+    ('search -i -c редкая', ['search', '-i', '-c', f'Проект {PROJECTS}', '-s', '0'], False),
+    ('search -t (все шарды)', ['search', '-t', 'отчёт', '--top', '20'], False),
+    ('add', ['add', 'Название', 'Описание', 'Дом', '2024-12-01', '1'], True),
+    ('edit (смена категории)', ['edit', '{id}', 'Название', 'Описание', f'Проект {PROJECTS}', '2024-12-01', '1', '0'],
+     True),
+)
+
+
+def bench_shards(tm: TaskManager, sizes: list[int]):
+    """
+    Шарды по категориям против JSON-файла: команды отдельными процессами (медиана трёх запусков; изменяющие —
+    над исходным хранилищем) и количество перезаписанных файлов шардов. Удаление и поиск по категории читают
+    и перезаписывают только шарды этой категории, остальные команды — все шарды (или шарды по диапазону ID).
+    """
+    for n in sizes:
+        write_store('pristine.json', n)
+        restore('json')
+        t = run_script(['migrate', '--to', 'shards'])
+        os.replace(TASKS_SHARDS, 'pristine.shards')
+        files = set(os.listdir('pristine.shards'))
+        print(f'migrate --to shards N={n:>9}  {t:8.2f} с  шардов {len(files) - 1}')
+        for title, argv, changes in SHARDS_SUITE:
+            argv = [arg.format(id=n // 2 or 1) for arg in argv]
+            for name in ('json', 'shards'):
+                restore(name)
+                times = []
+                for _ in range(3):
+                    if changes:
+                        restore(name)
+                    times.append(run_script(['--storage', name, *argv]))
+                t = sorted(times)[1]
+                written = len(set(os.listdir(TASKS_SHARDS)) - files) if name == 'shards' else int(changes)
+                RESULTS.append(dict(bench='shards', storage=name, name=title, n=n, time=t, times=times))
+                print(f'{name:<8} {title:<26} N={n:>9}  {t * 1000:9.1f} мс  записано файлов {written}')
+        restore(None)
+        for path in ('pristine.json', 'pristine.shards'):
+            remove(path)
+    reset()
+
+
+def bench_startup(tm: TaskManager, sizes: list[int]):
+    """
+    Время запуска скрипта для команд, не требующих загрузки хранилища (--version, --help, add),
+    и для completed (с загрузкой и сохранением); самые дорогие импорты по python -X importtime.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'TaskManager.py')
+    commands = (['--version'], ['--help'], ['add', 'Название', 'Описание', 'Дом', '2024-12-01', '1'],
+                ['completed', '1'])
+    for n in sizes:
+        fill(tm, n)
+        tm._get_storage('json').save(tm.tasks, {})
+        reset()
+        for command in commands:
+            times = []
+            for _ in range(5):
+                start = time.perf_counter()
+                subprocess.run([sys.executable, script, *command], capture_output=True, check=True)
+                times.append(time.perf_counter() - start)
+            print(f'{command[0]:<10} N={n:>9}  {min(times) * 1000:9.1f} мс')
+    out = subprocess.run([sys.executable, '-X', 'importtime', script, '--version'], capture_output=True, text=True)
+    imports = []
+    for line in out.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split('|')
+        imports.append((int(cumulative), name.strip()))
+    for cumulative, name in sorted(imports, reverse=True)[:5]:
+        print(f'импорт {name:<20} {cumulative / 1000:7.1f} мс')
+
+
+class DictTask:
+    """
+    Задача в прежнем представлении: обычный объект с __dict__ и названием приоритета.
+    """
+
+    def __init__(self, id, title, description, category, due_date, priority, status):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.category = category
+        self.due_date = due_date
+        self.priority = PRIORITIES[priority]
+        self.status = status
+
+
+def bench_memory(tm: TaskManager, sizes: list[int]):
+    """
+    Память под список задач, загруженный из JSON-файла (tracemalloc): объекты с __dict__, Task со __slots__,
+    TaskColumns.
+    """
+    for n in sizes:
+        fill(tm, n)
+        tm._get_storage('json').save(tm.tasks, {})
+        reset()
+        for name, build in (
+            ('__dict__', lambda rows: [DictTask(**data) for data in rows]),
+            ('__slots__', lambda rows: [Task(**data) for data in rows]),
+            ('колонки', TaskColumns),
+        ):
+            rows = map(TaskManager._normalize, tm._get_storage('json').load())
+            tracemalloc.start()
+            start = time.perf_counter()
+            data = build(rows)
+            t = time.perf_counter() - start
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del data
+            print(f'{name:<10} N={n:>9}  {size / 2 ** 20:8.1f} МиБ  {size / n:6.0f} байт/задача  {t:6.2f} с')
+
+
+def bench_text(tm: TaskManager, sizes: list[int]):
+    """
+    Поиск по тексту (search -t): перебор всех задач против триграммного индекса (результаты сверяются)
+    в одном процессе и команда отдельным процессом над JSON-файлом (медиана трёх запусков): отдельная команда
+    индекс не строит и ищет перебором.
+    """
+    queries = ('бюджет', 'отчёт проект', 'курс книга спорт', 'нет такого', 'ко')
+    for n in sizes:
+        fill(tm, n)
+        t = timer(tm._text_index)
+        print(f'индекс     N={n:>9}  построение {t:8.3f} с  триграмм {len(tm.texts.grams)}')
+        for q in queries:
+            start = time.perf_counter()
+            linear = [task for task in tm.tasks if q in task]
+            t1 = time.perf_counter() - start
+            start = time.perf_counter()
+            indexed = list(tm._select(Query(q)))
+            t2 = time.perf_counter() - start
+            assert indexed == linear
+            print(f'{q!r:<20} N={n:>9}  найдено {len(linear):>8}  перебор {t1 * 1000:9.2f} мс  '
+                  f'индекс {t2 * 1000:9.2f} мс')
+        tm._get_storage('json').save(tm.tasks, {})
+        for q in queries:
+            t = sorted(run_script(['--storage', 'json', 'search', '-t', q]) for _ in range(3))[1]
+            print(f'{q!r:<20} N={n:>9}  отдельный процесс search -t {t * 1000:9.1f} мс')
+    remove(TASKS_JSON)
+
+
+def bench_parallel(tm: TaskManager, sizes: list[int]):
+    """
+    Параллельный поиск (search/current --jobs) против последовательного: время команды при 1, 2, 4 и числе ядер
+    процессов (по медиане 3 запусков). Последовательный поиск по тексту — перебором: как и отдельный процесс
+    команды, он не строит триграммный индекс. Вывод параллельного поиска сверяется с последовательным.
+    """
+    commands = (['search', '-t', 'бюджет'], ['search', '-i', '-t', 'курс', '-s', '1'],
+                ['search', '-t', 'гостиница', '-c', 'Проект 1'], ['search', '-s', '1', '-p', '2', '--sort', 'priority'])
+    jobs = sorted({1, 2, 4, os.cpu_count() or 1})
+    print(f'ядер: {os.cpu_count()}')
+    for n in sizes:
+        fill(tm, n)
+        for command in commands:
+            line = f'{' '.join(command):<36} N={n:>9}'
+            expected = None
+            for j in jobs:
+                args = tm.parser.parse_args([*command, '--jobs', str(j)])
+                times = []
+                for _ in range(3):
+                    TaskManager.texts = None
+                    start = time.perf_counter()
+                    res = args.func(args)
+                    times.append(time.perf_counter() - start)
+                expected = expected or res
+                assert res == expected, (command, j)
+                line += f'  {j} — {sorted(times)[1] * 1000:8.1f} мс'
+            print(line)
+    reset()
+
+
+def bench_query(tm: TaskManager, sizes: list[int]):
+    """
+    Поиск по нескольким условиям (search): план с индексами и limit против перебора всех задач
+    с проверкой каждого условия (результаты сверяются).
+    """
+    queries = (
+        dict(text='бюджет отчёт', category='Дом', inner=True),
+        dict(category='Хобби', status=1, priority=2, inner=True),
+        dict(text='курс книга', category='Семья'),
+        dict(category='Финансы', due_from='2024-03-01', due_to='2024-03-31', inner=True),
+        dict(status=0, inner=True, limit=20),
+    )
+    for n in sizes:
+        fill(tm, n)
+        tm._text_index()
+        for params in queries:
+            query = Query(**params)
+            start = time.perf_counter()
+            linear = query.page(task for task in tm.tasks if query.match(task))
+            linear = list(linear)
+            t1 = time.perf_counter() - start
+            start = time.perf_counter()
+            planned = list(tm._select(query))
+            t2 = time.perf_counter() - start
+            assert planned == linear
+            print(f'{', '.join(f'{k}={v}' for k, v in params.items()):<72} N={n:>9}  найдено {len(linear):>7}  '
+                  f'перебор {t1 * 1000:8.2f} мс  план {t2 * 1000:8.2f} мс')
+
+
+def bench_sort(tm: TaskManager, sizes: list[int]):
+    """
+    Первые K задач по сроку или приоритету (current/search --sort --top): полная сортировка найденных задач
+    против обхода упорядоченного индекса (SortedIndex) и отбора heapq.nsmallest; диапазон сроков (--overdue)
+    по индексу против перебора; стоимость поддержки индексов при изменении задачи.
+    """
+    queries = (
+        dict(status=0, inner=True, limit=20, sort='due_date'),
+        dict(status=0, inner=True, limit=20, sort='priority'),
+        dict(status=0, inner=True, due_to='2024-01-31', limit=20, sort='priority'),
+        dict(category='Дом', status=0, inner=True, limit=20, sort='due_date'),
+        dict(status=0, due_from='2024-06-01', due_to='2024-06-07', inner=True, sort='due_date'),
+    )
+    for n in sizes:
+        fill(tm, n)
+        for sort in ('due_date', 'priority'):
+            t = timer(tm._order, sort)
+            print(f'построение индекса {sort:<13} N={n:>9}  {t * 1000:8.2f} мс')
+        for params in queries:
+            query = Query(**params)
+            start = time.perf_counter()
+            full = sorted((task for task in tm.tasks if query.match(task)), key=query.key)[:query.limit]
+            t1 = time.perf_counter() - start
+            start = time.perf_counter()
+            heap = list(tm._sort((task for task in tm.tasks if query.match(task)), query))
+            t2 = time.perf_counter() - start
+            start = time.perf_counter()
+            indexed = list(tm._select(query))
+            t3 = time.perf_counter() - start
+            assert full == heap == indexed
+            print(f'{', '.join(f'{k}={v}' for k, v in params.items()):<72} N={n:>9}  сортировка {t1 * 1000:8.2f} мс  '
+                  f'heapq {t2 * 1000:8.2f} мс  индекс {t3 * 1000:8.2f} мс')
+        rnd = random.Random(0)
+        start = time.perf_counter()
+        for _ in range(1000):
+            task = tm.ids[rnd.randint(1, n)]
+            tm._unindex_task(task)
+            task.due_date = f'2024-{rnd.randint(1, 12):02}-{rnd.randint(1, 28):02}'
+            task.priority = rnd.randint(0, 2)
+            tm._index_task(task)
+        t = time.perf_counter() - start
+        print(f'изменение задачи с индексами       N={n:>9}  {t * 1000:8.3f} мкс')
+        tm.orders.clear()
+
+
+def bench_render(tm: TaskManager, sizes: list[int]):
+    """
+    Вывод таблицы (current): время и пиковый прирост памяти при выводе в поток по мере формирования строк
+    и при формировании текста таблицы целиком.
+    """
+    args = tm.parser.parse_args(['current'])
+    for n in sizes:
+        fill(tm, n)
+        with open(os.devnull, 'w', encoding='utf8') as devnull:
+            for name, out in (('поток', devnull), ('текст', None)):
+                tm.out, tm.result = out, ''
+                tracemalloc.start()
+                start = time.perf_counter()
+                tm.current(args)
+                t = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f'{name:<10} N={n:>9}  {t:7.3f} с  пик памяти {peak / 2 ** 20:8.1f} МиБ')
+        tm.out, tm.result = None, ''
+
+
+def bench_dates(tm: TaskManager, sizes: list[int]):
+    """
+    Разбор сроков выполнения (add, edit, импорт): dateutil для каждой даты против проверки формата гггг-мм-дд
+    и кэша dateutil для повторяющихся дат в свободном формате.
+    """
+    import dateutil.parser as date_parser
+    rnd = random.Random(0)
+    formats = ('%Y-%m-%d', '%d.%m.%Y', '%d %b %Y')
+    for n in sizes:
+        for fmt in formats:
+            values = [date.fromordinal(rnd.randint(738886, 739250)).strftime(fmt) for _ in range(n)]
+            start = time.perf_counter()
+            old = [date_parser.parse(value).strftime('%Y-%m-%d') for value in values]
+            t1 = time.perf_counter() - start
+            TaskManager._parse_free_date.cache_clear()
+            start = time.perf_counter()
+            new = [TaskManager._parse_date(value) for value in values]
+            t2 = time.perf_counter() - start
+            assert new == old
+            print(f'{fmt:<10} N={n:>9}  dateutil {t1 / n * 1e6:8.2f} мкс/дата  '
+                  f'новый разбор {t2 / n * 1e6:8.2f} мкс/дата  ({t1 / t2:.0f}x)')
+
+
+def bench_import(tm: TaskManager, sizes: list[int]):
+    """
+    Импорт задач (import) из CSV, NDJSON и JSON одной записью в пустое хранилище, без пула и с пулом процессов.
+    Сроки — в формате гггг-мм-дд, дд.мм.гггг (повторяются) и с неповторяющимся временем (разбираются dateutil).
+    """
+    formats = ('%Y-%m-%d', '%d.%m.%Y', '%d %b %Y %H:%M:%S')
+    for n in sizes:
+        rows = list(generate(n))
+        for i, row in enumerate(rows):
+            day = datetime.fromisoformat(row['due_date']) + timedelta(seconds=i % 86400)
+            row['due_date'] = day.strftime(formats[i % 3])
+        with open('import.ndjson', 'w', encoding='utf8') as file:
+            file.writelines(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+        with open('import.json', 'w', encoding='utf8') as file:
+            json.dump(rows, file, ensure_ascii=False)
+        with open('import.csv', 'w', encoding='utf8', newline='') as file:
+            writer = csv.DictWriter(file, rows[0].keys(), lineterminator='\n')
+            writer.writeheader()
+            writer.writerows(rows)
+        del rows
+        for fmt in ('csv', 'ndjson', 'json'):
+            for workers in (1, 4):
+                if os.path.exists(TASKS_JSON):
+                    os.remove(TASKS_JSON)
+                tm._open(STORAGE)
+                TaskManager._parse_free_date.cache_clear()
+                args = tm.parser.parse_args(['import', f'import.{fmt}', '-w', str(workers)])
+                start = time.perf_counter()
+                res = tm.import_tasks(args)
+                tm._save()
+                t = time.perf_counter() - start
+                assert res == f'Импортировано задач: {n}.\n', res
+                print(f'{fmt:<7} -w {workers}  N={n:>9}  {t:7.2f} с  {n / t:9.0f} задач/с')
+        for fmt in ('csv', 'ndjson', 'json'):
+            os.remove(f'import.{fmt}')
+    reset()
+
+
+def bench_export(tm: TaskManager, sizes: list[int]):
+    """
+    Выгрузка (csv): скорость (просмотренных задач в секунду) и пиковый прирост памяти для форматов, сжатия,
+    поиска и инкрементальной выгрузки (повторная выгрузка после изменения 1 % задач).
+    """
+    variants = (['-o', 'out.csv'], ['-o', 'out.ndjson'], ['-o', 'out.columns'], ['-o', 'out.csv.gz'],
+                ['-o', 'out.csv', '-c', 'Дом', '-s', '0'], ['-o', 'inc.csv', '--incremental'])
+    for n in sizes:
+        fill(tm, n)
+        for argv in (*variants, variants[-1]):
+            if argv is variants[-1] and os.path.exists('inc.csv.checkpoint'):
+                for task in tm.tasks[::100]:
+                    task.status = not task.status
+            args = tm.parser.parse_args(['csv', *argv])
+            if argv is variants[-1] and os.path.exists('inc.csv.checkpoint'):
+                shutil.copy('inc.csv.checkpoint', 'inc.copy')
+            start = time.perf_counter()
+            res = tm.export_csv(args)
+            t = time.perf_counter() - start
+            if argv is variants[-1]:  # Замер памяти — от той же контрольной точки.
+                if os.path.exists('inc.copy'):
+                    os.replace('inc.copy', 'inc.csv.checkpoint')
+                else:
+                    os.remove('inc.csv.checkpoint')
+            tracemalloc.start()
+            tm.export_csv(args)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            cnt = int(res.split()[2].rstrip('.'))
+            print(f'{' '.join(argv):<32} N={n:>9}  выгружено {cnt:>9}  {t:7.2f} с  {n / t:9.0f} задач/с  '
+                  f'пик памяти {peak / 2 ** 20:6.1f} МиБ')
+        os.remove('inc.csv.checkpoint')
+
+
+def stress_worker(name: str, n: int, ops: int, seed: int, results):
+    """
+    Процесс замера одновременного доступа: чередует добавление задачи и отметку случайной задачи выполненной.
+    :param results: Очередь результатов: (добавленные ID, отмеченные ID, ожидание блокировок (с), повторы команд).
+    """
+    rnd = random.Random(seed)
+    tm = TaskManager(name)
+    tm._reset()
+    storage.Storage.waited = 0.0
+    added = []
+    done = []
+    out = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    for k in range(ops):
+        if k % 2:
+            i = rnd.randint(1, n)
+            tm.run(['--storage', name, 'completed', str(i)])
+            done.append(i)
+        else:
+            tm.run(['--storage', name, 'add', f'Поток {seed}', 'нагрузка', 'Тест', '2024-12-01', '0'])
+            added.append(Task.index)
+    sys.stdout = out
+    results.put((added, done, storage.Storage.waited, tm.conflicts))
+
+
+def bench_stress(tm: TaskManager, sizes: list[int]):
+    """
+    Одновременная работа нескольких процессов с одним хранилищем: пропускная способность (команд/с),
+    среднее ожидание блокировок на команду и доля повторённых из-за конфликта команд.
+    После замера проверяется, что ни одно добавление и ни одна отметка не потеряны.
+    """
+    ctx = multiprocessing.get_context('fork')
+    ops = 20  # Команд на процесс.
+    for n in sizes:
+        for name in STORAGES:
+            for procs in (1, 2, 4, 8):
+                for path in (TASKS_JSON, TASKS_JOURNAL, TASKS_DB, TASKS_SNAPSHOT, TASKS_SHARDS):
+                    remove(path)
+                if name in ('sqlite', 'snapshot', 'shards'):
+                    tm._get_storage(name).insert(generate(n))
+                else:
+                    fill(tm, n)
+                    tm._get_storage('json').save(tm.tasks, {})
+                results = ctx.Queue()
+                workers = [ctx.Process(target=stress_worker, args=(name, n, ops, seed, results))
+                           for seed in range(procs)]
+                start = time.perf_counter()
+                for worker in workers:
+                    worker.start()
+                stats = [results.get() for _ in workers]
+                for worker in workers:
+                    worker.join()
+                t = time.perf_counter() - start
+                check = TaskManager(name)
+                check._reset()
+                check._load()
+                added = sorted(i for s in stats for i in s[0])
+                lost = len(added) - sum(1 for i in added if (task := check._get(i)) and task.title.startswith('Поток'))
+                lost += sum(1 for s in stats for i in s[1] if not check._get(i).status)
+                lost += len(added) - len(set(added))  # Повторно выданные ID.
+                check._reset()
+                total = procs * ops
+                print(f'{name:<8} N={n:>9}  процессов {procs}  {total / t:8.1f} команд/с  '
+                      f'ожидание блокировок {sum(s[2] for s in stats) / total * 1000:8.2f} мс/команду  '
+                      f'повторов {sum(s[3] for s in stats):>3}  потеряно {lost}')
+        reset()
+
+
+def bench_serve(tm: TaskManager, sizes: list[int]):
+    """
+    Задержка команд: новый процесс на каждую команду (с загрузкой хранилища) против демона (команда serve):
+    через тонкий клиент в новом процессе и через сокет из уже запущенного процесса (forward);
+    пропускная способность демона при последовательных запросах.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'TaskManager.py')
+    commands = (['completed', '{i}'], ['search', '-i', '-c', 'Дом', '-t', 'код'], ['current'])
+    for n in sizes:
+        fill(tm, n)
+        tm._get_storage('json').save(tm.tasks, {})
+        reset()
+
+        def cold(argv):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, script, *argv], capture_output=True, check=True)
+            return time.perf_counter() - start
+
+        def warm(argv):
+            start = time.perf_counter()
+            with open(os.devnull, 'w') as out, contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+                if not forward(argv):
+                    raise RuntimeError('демон не выполнил команду')
+            return time.perf_counter() - start
+
+        rnd = random.Random(0)
+        results = {}
+        for mode in ('процесс', 'клиент', 'сокет'):
+            if mode == 'клиент':
+                daemon = subprocess.Popen([sys.executable, script, 'serve'], stdout=subprocess.DEVNULL,
+                                          stderr=subprocess.DEVNULL)
+                while not os.path.exists(TASKS_SOCKET):
+                    time.sleep(0.01)
+            for command in commands:
+                repeat = 50 if mode == 'сокет' else 5
+                times = [(warm if mode == 'сокет' else cold)([a.format(i=rnd.randint(1, n)) for a in command])
+                         for _ in range(repeat)]
+                results[mode, command[0]] = times
+                print(f'{mode:<8} {command[0]:<10} N={n:>9}  {sorted(times)[len(times) // 2] * 1000:9.1f} мс (медиана)')
+        start = time.perf_counter()
+        cnt = 0
+        while time.perf_counter() - start < 2:
+            warm(['completed', str(rnd.randint(1, n))])
+            cnt += 1
+        print(f'демон    completed  N={n:>9}  {cnt / (time.perf_counter() - start):9.0f} команд/с')
+        daemon.send_signal(signal.SIGTERM)
+        daemon.wait()
+        for command in commands:
+            cold_median = sorted(results['процесс', command[0]])[2]
+            warm_median = sorted(results['сокет', command[0]])[25]
+            print(f'ускорение {command[0]:<10} N={n:>9}  {cold_median / warm_median:7.1f} раз')
+
+
+def bench_batch(tm: TaskManager, sizes: list[int]):
+    """
+    1000 команд completed/edit: пакет (batch) в одном процессе — сохранение в конце, каждые 100 команд,
+    всё или ничего — против отдельного процесса на каждую команду (по медиане 5 запусков).
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'TaskManager.py')
+    count = 1000
+    for n in sizes:
+        fill(tm, n)
+        rnd = random.Random(0)
+        with open('batch.txt', 'w', encoding='utf8') as file:
+            for k in range(count):
+                i = rnd.randint(1, n)
+                file.write(f'completed {i}\n' if k % 2 else f'edit {i} Название "Новое описание" Дом 2024-12-01 1 0\n')
+        for storage in STORAGES:
+            for path in (TASKS_JSON, TASKS_JOURNAL, TASKS_DB, TASKS_SNAPSHOT, TASKS_SHARDS):
+                remove(path)
+            tm._get_storage('json').save(tm.tasks, {})
+            if storage in ('sqlite', 'snapshot', 'shards'):
+                subprocess.run([sys.executable, script, 'migrate', '--to', storage], capture_output=True, check=True)
+            times = []
+            for _ in range(5):
+                start = time.perf_counter()
+                subprocess.run([sys.executable, script, '--storage', storage, 'completed', str(rnd.randint(1, n))],
+                               capture_output=True, check=True)
+                times.append(time.perf_counter() - start)
+            single = sorted(times)[2] * count
+            print(f'{storage:<8} процессы            N={n:>9}  {single:9.2f} с (оценка)')
+            for options in ([], ['-e', '100'], ['-a']):
+                start = time.perf_counter()
+                subprocess.run([sys.executable, script, '--storage', storage, 'batch', *options, 'batch.txt'],
+                               capture_output=True, check=True)
+                t = time.perf_counter() - start
+                print(f'{storage:<8} batch {' '.join(options):<13} N={n:>9}  {t:9.2f} с  {count / t:8.0f} команд/с  '
+                      f'быстрее в {single / t:6.1f} раз')
+        os.remove('batch.txt')
+    reset()
+
+
+SHELL_SUITE = (
+    ('completed', 'completed {id}'),
+    ('edit', 'edit {id} Название "Новое описание" Дом 2024-12-01 1 0'),
+    ('search -t --top 20', 'search -t отчёт --top 20'),
+    ('search -i -c -s', 'search -i -c "Проект 7" -s 0'),
+    ('current --top 20', 'current --sort priority --top 20'),
+)
+
+
+def bench_shell(tm: TaskManager, sizes: list[int]):
+    """
+    Оболочка (shell): время ответа на команду в сеансе над загруженным списком (по --timing, 200 команд каждого вида
+    со случайными ID, изменения сохраняются при выходе) против отдельного процесса на каждую команду
+    (медиана трёх запусков).
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'TaskManager.py')
+    count = 200
+    for n in sizes:
+        write_store(TASKS_JSON, n)
+        rnd = random.Random(0)
+        for title, line in SHELL_SUITE:
+            times = []
+            for _ in range(3):
+                argv = shlex.split(line.format(id=rnd.randint(1, n)))
+                start = time.perf_counter()
+                subprocess.run([sys.executable, script, *argv], capture_output=True, check=True)
+                times.append(time.perf_counter() - start)
+            single = sorted(times)[1]
+            commands = ''.join(line.format(id=rnd.randint(1, n)) + '\n' for _ in range(count))
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, script, 'shell', '--timing'], input=commands, capture_output=True,
+                                 text=True, check=True)
+            session = time.perf_counter() - start
+            replies = sorted(float(row[1:].split()[0]) for row in out.stderr.splitlines() if row.endswith(' мс)'))
+            median, worst = replies[len(replies) // 2], replies[-1]
+            RESULTS.append(dict(bench='shell', storage='json', name=title, n=n, time=median / 1000,
+                                process=single, session=session))
+            print(f'{title:<20} N={n:>9}  процесс {single * 1000:9.1f} мс  оболочка: медиана {median:7.2f} мс, '
+                  f'худшее {worst:8.1f} мс, сеанс из {count} команд {session:6.2f} с')
+        os.remove(TASKS_JSON)
+    reset()
+
+
+def bench_stats(tm: TaskManager, sizes: list[int]):
+    """
+    Статистика (stats): по сохранённым счётчикам против пересчёта по всем задачам (stats --check),
+    отдельным процессом (по медиане 5 запусков); стоимость поддержки счётчиков при изменении задачи.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'TaskManager.py')
+    for n in sizes:
+        fill(tm, n)
+        t = timer(TaskStats, tm.tasks)
+        print(f'пересчёт счётчиков в памяти        N={n:>9}  {t * 1000:9.1f} мс')
+        tm.stats = TaskStats(tm.tasks)
+        rnd = random.Random(0)
+        start = time.perf_counter()
+        for _ in range(1000):
+            task = tm.ids[rnd.randint(1, n)]
+            tm._count_task(task, -1)
+            task.due_date = f'2024-{rnd.randint(1, 12):02}-{rnd.randint(1, 28):02}'
+            task.status = not task.status
+            tm._count_task(task)
+        t = time.perf_counter() - start
+        print(f'изменение задачи со счётчиками     N={n:>9}  {t * 1000:9.3f} мкс')
+        tm.stats = None
+        for storage in STORAGES:
+            for path in (TASKS_JSON, TASKS_JOURNAL, TASKS_DB, TASKS_SNAPSHOT, TASKS_SHARDS):
+                remove(path)
+            tm._get_storage('json').save(tm.tasks, {})
+            if storage in ('sqlite', 'snapshot', 'shards'):
+                subprocess.run([sys.executable, script, 'migrate', '--to', storage], capture_output=True, check=True)
+            results = {}
+            for options in (['--check'], []):  # Первый пересчёт сохраняет счётчики.
+                times = []
+                for _ in range(5):
+                    start = time.perf_counter()
+                    subprocess.run([sys.executable, script, '--storage', storage, 'stats', *options],
+                                   capture_output=True, check=True)
+                    times.append(time.perf_counter() - start)
+                results[' '.join(options)] = sorted(times)[2]
+            cached, check = results[''], results['--check']
+            print(f'{storage:<8} stats {cached * 1000:8.1f} мс  stats --check {check * 1000:8.1f} мс  N={n:>9}  '
+                  f'быстрее в {check / cached:6.1f} раз')
+    reset()
+
+
+def bench_profile(tm: TaskManager, sizes: list[int]):
+    """
+    Стоимость профилирования: команда search через run без параметров профилирования, с --profile (tracemalloc)
+    и с --cprofile (по медиане 5 запусков над загруженным списком).
+    """
+    argv = ['search', '-t', 'отчёт', '-c', 'Дом', '-i', '--top', '20']
+    for n in sizes:
+        fill(tm, n)
+        for options in ([], ['--profile'], ['--cprofile', 'run.prof']):
+            times = []
+            with open(os.devnull, 'w', encoding='utf8') as devnull, contextlib.redirect_stdout(devnull), \
+                    contextlib.redirect_stderr(devnull):
+                for _ in range(5):
+                    times.append(timer(tm.run, [*options, *argv]))
+            print(f'search {' '.join(options):<21} N={n:>9}  {sorted(times)[2] * 1000:9.2f} мс')
+        TaskManager.texts = None
+    if os.path.exists('run.prof'):
+        os.remove('run.prof')
+    reset()
+
+
+# Команды замера commands: (название, аргументы, изменяет ли команда хранилище); {id} — ID задачи из середины списка.
+SUITE = (
+    ('current', ['current'], False),
+    ('search текст и категория', ['search', '-t', 'отчёт', '-c', 'Дом', '-i'], False),
+    ('search срок и приоритет', ['search', '-p', '2', '--due-from', '2024-06-01', '--due-to', '2024-06-30', '-i'],
+     False),
+    ('search --sort --top', ['search', '-s', '0', '--sort', 'priority', '--top', '20'], False),
+    ('csv', ['csv', '-o', 'out.csv'], False),
+    ('stats', ['stats'], False),
+    ('add', ['add', 'Название', 'Описание', 'Дом', '2024-12-01', '1'], True),
+    ('completed', ['completed', '{id}'], True),
+    ('edit', ['edit', '{id}', 'Название', 'Описание', 'Дом', '2024-12-01', '1', '0'], True),
+    ('del', ['del', '-i', '{id}'], True),
+)
+
+
+def restore(name: str | None, stats: dict | None = None):
+    """
+    Восстановление исходного хранилища замера commands (перед изменяющей командой).
+    :param name: Режим хранения (None — только удаление файлов хранилища).
+    :param stats: Счётчики исходного хранилища: записываются с версией восстановленного JSON-файла, снимка
+        или манифеста шардов (в базе SQLite они уже есть), чтобы команды работали с действительными счётчиками.
+    """
+    for path in (TASKS_JSON, TASKS_JOURNAL, f'{TASKS_JSON}.stats', TASKS_DB, f'{TASKS_DB}-wal', f'{TASKS_DB}-shm',
+                 TASKS_SNAPSHOT, f'{TASKS_SNAPSHOT}.stats', TASKS_SHARDS, f'{TASKS_SHARDS}.stats'):
+        remove(path)
+        remove(f'{path}.history')
+    if name == 'sqlite':
+        shutil.copyfile('pristine.db', TASKS_DB)
+    elif name == 'snapshot':
+        shutil.copyfile('pristine.snap', TASKS_SNAPSHOT)
+        if stats is not None:
+            storage.SnapshotStorage(TASKS_SNAPSHOT, PRIORITIES).save_stats(stats)
+    elif name == 'shards':
+        shutil.copytree('pristine.shards', TASKS_SHARDS)
+        if stats is not None:
+            storage.ShardedStorage(TASKS_SHARDS, PRIORITIES).save_stats(stats)
+    elif name is not None:
+        shutil.copyfile('pristine.json', TASKS_JSON)
+        if stats is not None:
+            storage.JsonStorage(TASKS_JSON, TASKS_JOURNAL).save_stats(stats)
+
+
+def run_script(argv: list) -> float:
+    """
+    Запуск TaskManager.py отдельным процессом (вывод отбрасывается).
+    :param argv: Аргументы команды.
+    :return: Время выполнения (с).
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'TaskManager.py')
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, script, *argv], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    t = time.perf_counter() - start
+    if out.returncode:
+        raise RuntimeError(f'{' '.join(argv)}: {out.stderr.decode(errors='replace')}')
+    return t
+
+
+def bench_commands(tm: TaskManager, sizes: list[int]):
+    """
+    Команды целиком, каждая — отдельным процессом над синтетическим хранилищем (generate, зерно --seed):
+    время (медиана --repeat запусков), пиковая память и время фаз по --metrics (загрузка, команда, вывод,
+    сохранение). Замер --metrics — отдельный первый запуск (он же прогревает кэш файлов): tracemalloc замедляет
+    выделение памяти, поэтому время фаз в нём больше времени запусков без замера. Пиковая память — по tracemalloc:
+    RSS порождённого процесса включает память родителя на момент fork и для сравнения прогонов не годится.
+    Изменяющие команды выполняются каждый раз над исходным хранилищем. Результаты записываются в RESULTS.
+    """
+    for n in sizes:
+        write_store('pristine.json', n, SETTINGS['seed'])
+        stats = TaskStats(Task(**task) for task in generate(n, SETTINGS['seed'])).as_dict()
+        reset()
+        for name in SETTINGS['storages']:
+            if name == 'sqlite':
+                restore('json')
+                run_script(['migrate'])
+                db = storage.SqliteStorage(TASKS_DB, PRIORITIES)
+                db.save_stats(stats)
+                db.db.close()
+                os.replace(TASKS_DB, 'pristine.db')
+            elif name == 'snapshot':
+                restore('json')
+                run_script(['migrate', '--to', 'snapshot'])
+                os.replace(TASKS_SNAPSHOT, 'pristine.snap')
+            elif name == 'shards':
+                restore('json')
+                run_script(['migrate', '--to', 'shards'])
+                os.replace(TASKS_SHARDS, 'pristine.shards')
+            restore(name, stats)
+            for title, argv, changes in SUITE:
+                argv = ['--storage', name, *(arg.format(id=n // 2 or 1) for arg in argv)]
+                if changes:
+                    restore(name, stats)
+                if os.path.exists('metrics.ndjson'):
+                    os.remove('metrics.ndjson')
+                run_script(['--metrics', 'metrics.ndjson', *argv])
+                with open('metrics.ndjson', encoding='utf8') as file:
+                    metrics = json.loads(file.readline())
+                times = []
+                for _ in range(SETTINGS['repeat']):
+                    if changes:
+                        restore(name, stats)
+                    times.append(run_script(argv))
+                t = sorted(times)[len(times) // 2]
+                RESULTS.append(dict(bench='commands', storage=name, name=title, n=n, time=t, times=times,
+                                    peak_memory=metrics['peak_memory'], phases=metrics['phases']))
+                phases = '  '.join(f'{key} {metrics['phases'][key] * 1000:7.1f}'
+                                   for key in ('load', 'command', 'render', 'save'))
+                memory = metrics['peak_memory'] / (1 << 20)
+                print(f'{name:<8} {title:<26} N={n:>9}  {t * 1000:9.1f} мс  память {memory:7.1f} МиБ  '
+                      f'фазы (tracemalloc), мс: {phases}')
+        restore(None)
+        for path in ('pristine.json', 'pristine.db', 'pristine.snap', 'pristine.shards', 'out.csv', 'metrics.ndjson'):
+            remove(path)
+
+
+def compare(old: dict, new: dict, threshold: float) -> int:
+    """
+    Сравнение результатов двух прогонов (--json): регрессия — время (медиана) или пиковая память больше базовых
+    более чем на threshold и не меньше чем на 5 мс / 1 МиБ. Время считается ухудшившимся, только если и самый быстрый
+    новый запуск медленнее самого медленного базового (разброс запусков не перекрывается): иначе это шум.
+    :param old: Базовые результаты.
+    :param new: Новые результаты.
+    :param threshold: Допустимое относительное ухудшение (0.15 — 15 %).
+    :return: Количество регрессий.
+    """
+    def key(result: dict) -> tuple:
+        return result['bench'], result['storage'], result['name'], result['n']
+
+    base = {key(result): result for result in old['results']}
+    regressions = 0
+    for result in new['results']:
+        prev = base.get(key(result))
+        if prev is None:
+            continue
+        notes = []
+        for metric, floor, unit, scale in (('time', 0.005, 'мс', 1000),
+                                           ('peak_memory', 1 << 20, 'МиБ', 1 / (1 << 20))):
+            a, b = prev[metric], result[metric]
+            change = b / a - 1 if a else 0.0
+            apart = metric != 'time' or min(result['times']) > max(prev['times'])
+            mark = ''
+            if change > threshold and b - a >= floor and apart:
+                mark = ' РЕГРЕССИЯ'
+                regressions += 1
+            elif change < -threshold and a - b >= floor:
+                mark = ' улучшение'
+            notes.append(f'{a * scale:9.1f} → {b * scale:9.1f} {unit} ({change:+7.1%}){mark}')
+        print(f'{result['storage']:<8} {result['name']:<26} N={result['n']:>9}  {'  '.join(notes)}')
+    print(f'Регрессий: {regressions} (порог {threshold:.0%}).')
+    return regressions
+
+
+BENCHES = dict(index=bench_index, delete=bench_delete, storage=bench_storage, sqlite=bench_sqlite, load=bench_load,
+               snapshot=bench_snapshot, shards=bench_shards, startup=bench_startup, memory=bench_memory,
+               text=bench_text, parallel=bench_parallel, query=bench_query, sort=bench_sort, render=bench_render,
+               dates=bench_dates, export=bench_export, stress=bench_stress,
+               serve=bench_serve, batch=bench_batch, shell=bench_shell, stats=bench_stats,
+               profile=bench_profile, commands=bench_commands)
+BENCHES['import'] = bench_import  # import — ключевое слово, в dict(...) не передаётся.
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='benchmarks.py', description='Замеры производительности менеджера задач.')
+    parser.add_argument('bench', nargs='*', help=f'Имена замеров: {', '.join(BENCHES)} (по умолчанию — все).')
+    parser.add_argument('-n', '--sizes', nargs='*', type=int, default=[10_000, 100_000],
+                        help='Размеры хранилища (количество задач, от 1 тыс. до 10 млн).')
+    parser.add_argument('--seed', type=int, default=0, help='Зерно генератора задач замера commands.')
+    parser.add_argument('--repeat', type=int, default=3, help='Количество запусков команды в замере commands.')
+    parser.add_argument('--storages', nargs='*', choices=STORAGES, default=['json'],
+                        help='Режимы хранения замера commands (по умолчанию json).')
+    parser.add_argument('--json', metavar='FILE', help='Запись результатов замера commands в JSON-файл.')
+    parser.add_argument('--compare', nargs='+', metavar='FILE',
+                        help='Сравнение с базовыми результатами (--json) и вывод регрессий; с двумя файлами — '
+                             'сравнение без замеров. Код завершения 1, если есть регрессии.')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Порог регрессии: допустимое относительное ухудшение (по умолчанию 0.15).')
+    args = parser.parse_args()
+    for name in args.bench:
+        if name not in BENCHES:
+            parser.error(f'неизвестный замер {name!r}')
+    if args.compare and len(args.compare) > 2:
+        parser.error('--compare принимает один или два файла')
+    baseline = None
+    if args.compare:
+        with open(args.compare[0], encoding='utf8') as file:
+            baseline = json.load(file)
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[1], encoding='utf8') as file:
+            results = json.load(file)
+    else:
+        SETTINGS.update(seed=args.seed, repeat=args.repeat, storages=args.storages)
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)  # Замеры не должны затрагивать рабочий tasks.json.
+            tm = TaskManager()
+            for name in args.bench or BENCHES:
+                print(f'== {name} ==')
+                BENCHES[name](tm, args.sizes)
+            os.chdir(cwd)
+        results = dict(meta=dict(time=datetime.now().isoformat(timespec='seconds'), version=VERSION,
+                                 python=platform.python_version(), platform=platform.platform(),
+                                 cpus=os.cpu_count(), sizes=args.sizes, seed=args.seed, repeat=args.repeat),
+                       results=RESULTS)
+        if args.json:
+            with open(args.json, 'w', encoding='utf8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=4)
+    if baseline is not None:
+        print('== compare ==')
+        if compare(baseline, results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
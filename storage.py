@@ -0,0 +1,1515 @@
+"""
+Хранилища списка задач менеджера задач.
+
+Хранилище отвечает только за чтение и запись данных: задачи передаются ему объектами с методом as_dict
+(словарь полей задачи), а возвращаются из него словарями полей задачи
+(ID, название, описание, категория, срок, приоритет, статус).
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from datetime import date
+from heapq import merge, nsmallest
+from itertools import islice
+from operator import itemgetter
+from json.encoder import encode_basestring_ascii
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки не поддерживаются.
+    fcntl = None
+
+FIELDS = ('id', 'title', 'description', 'category', 'due_date', 'priority', 'status')  # Поля задачи.
+CHUNK = 1 << 18  # Размер блока (символов) при потоковом чтении JSON-файла.
+WHITESPACE = re.compile(r'[ \t\n\r]*')  # Пробельные символы JSON.
+# Ключ ID в JSON-файле (кавычка внутри строкового значения всегда экранирована, поэтому совпадение — это ключ).
+ID_KEY = re.compile(rb'"id"\s*:\s*(\d+)')
+# Задача в JSON-файле (с отступами, как у json.dump(..., indent=4)).
+TASK_JSON = '    {\n' + ',\n'.join(f'        "{field}": %s' for field in FIELDS) + '\n    }'
+SNAPSHOT_MAGIC = b'TASKSNP1'  # Сигнатура файла снимка (SnapshotStorage).
+# Заголовок снимка: сигнатура, поколение (номер записи), количество задач, размер кучи строк, байты устаревших строк.
+SNAPSHOT_HEADER = struct.Struct('<8sQQQQ')
+# Запись задачи фиксированной длины: ID, приоритет, статус, порядковый номер дня срока (0 — срок хранится строкой).
+SNAPSHOT_RECORD = struct.Struct('<qbbxxi')
+# Ссылки на строки задачи в куче (смещение, длина в байтах UTF-8): название, описание, категория, срок выполнения
+# не в формате гггг-мм-дд.
+SNAPSHOT_REFS = struct.Struct('<' + 'QI' * 4)
+SNAPSHOT_REF = struct.Struct('<QI')  # Одна ссылка на строку.
+
+
+def iter_json_array(file, chunk: int = CHUNK):
+    """
+    Потоковое чтение JSON-массива: элементы разбираются и возвращаются по одному,
+    в памяти одновременно находятся только текущий блок файла и текущий элемент.
+    :param file: Текстовый файл, содержащий JSON-массив.
+    :param chunk: Размер блока чтения (символов).
+    :return: Итератор элементов массива.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+
+    def skip() -> bool:
+        """Пропуск пробельных символов с дочитыванием файла. False — файл закончился."""
+        nonlocal buf, pos
+        while True:
+            pos = WHITESPACE.match(buf, pos).end()
+            if pos < len(buf):
+                return True
+            buf = file.read(chunk)
+            pos = 0
+            if not buf:
+                return False
+
+    if not skip():
+        return  # Пустой файл.
+    if buf[pos] != '[':
+        raise ValueError('Ожидался JSON-массив.')
+    pos += 1
+    if skip() and buf[pos] == ']':
+        return
+    while True:
+        if not skip():
+            raise ValueError('Неожиданный конец JSON-массива.')
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            more = file.read(chunk)
+            if not more:
+                raise
+            buf = buf[pos:] + more  # Элемент не поместился в блок: дочитывание.
+            pos = 0
+            continue
+        pos = end
+        yield item
+        if not skip():
+            raise ValueError('Неожиданный конец JSON-массива.')
+        if buf[pos] == ']':
+            return
+        if buf[pos] != ',':
+            raise ValueError(f'Ожидалась запятая в JSON-массиве, найдено {buf[pos]!r}.')
+        pos += 1
+
+
+
+def _encode_value(value) -> str:
+    """
+    Значение поля задачи в JSON (как json.dumps).
+    """
+    if value.__class__ is str:
+        return encode_basestring_ascii(value)
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if value.__class__ is int:
+        return int.__repr__(value)
+    return json.dumps(value)
+
+
+def iter_dump(tasks):
+    """
+    Запись списка задач в том же виде, что и json.dump(tasks, file, indent=4), но частями по задаче
+    и без медленного (написанного на Python) кодировщика json с отступами: строки кодируются функцией C-модуля
+    и подставляются в шаблон TASK_JSON.
+    :param tasks: Итерируемый набор словарей полей задач (поля FIELDS по порядку).
+    :return: Итератор частей текста.
+    """
+    encode = encode_basestring_ascii
+    sep = '[\n'  # Разделитель перед первой задачей.
+    for task in tasks:
+        yield sep + TASK_JSON % (_encode_value(task['id']), encode(task['title']), encode(task['description']),
+                                 encode(task['category']), encode(task['due_date']),
+                                 _encode_value(task['priority']), _encode_value(task['status']))
+        sep = ',\n'
+    yield '[]' if sep == '[\n' else '\n]'
+
+
+class Conflict(Exception):
+    """
+    Хранилище изменено другим процессом после чтения (версия не совпадает): изменения не сохранены.
+    """
+
+
+class Rollback(Exception):
+    """
+    Отмена транзакции (см. Storage.transaction): изменения не сохраняются.
+    """
+
+
+class Storage:
+    """
+    Хранилище списка задач (базовый класс).
+    Одновременный доступ нескольких процессов согласуется рекомендательной блокировкой (fcntl.flock) файла
+    <путь>.lock: чтение — под общей блокировкой, запись — под исключительной (см. lock).
+    """
+    name = ''  # Имя хранилища для параметра --storage.
+    lazy = False  # False — список задач загружается целиком; True — запросы выполняются самим хранилищем.
+    path = ''  # Путь к файлу хранилища.
+    label = ''  # Название хранилища в плане поиска (lazy).
+    waited = 0.0  # Суммарное время ожидания блокировок процессом (с).
+
+    @contextmanager
+    def lock(self, exclusive: bool = False):
+        """
+        Блокировка хранилища на время чтения (общая) или записи (исключительная).
+        Вложенная блокировка не ждёт повторно: общая внутри исключительной ничего не делает,
+        исключительная внутри общей повышает её и по завершении понижает обратно.
+        :param exclusive: True — исключительная блокировка (запись).
+        """
+        outer = getattr(self, 'locked', None)  # Уже установленная блокировка: LOCK_SH, LOCK_EX или None.
+        if fcntl is None or outer == fcntl.LOCK_EX or (outer == fcntl.LOCK_SH and not exclusive):
+            yield
+            return
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        if outer is None:
+            self.lock_file = open(f'{self.path}.lock', 'a')
+        start = time.perf_counter()
+        fcntl.flock(self.lock_file, mode)
+        Storage.waited += time.perf_counter() - start
+        self.locked = mode
+        try:
+            yield
+        finally:
+            if outer is None:
+                self.lock_file.close()  # Закрытие файла снимает блокировку.
+                self.locked = self.lock_file = None
+            else:
+                fcntl.flock(self.lock_file, outer)
+                self.locked = outer
+
+    def version(self):
+        """
+        Версия хранилища для оптимистической проверки: изменяется при каждой записи.
+        :return: Сравнимое значение (None — хранилище версий не различает).
+        """
+        return None
+
+    @contextmanager
+    def transaction(self):
+        """
+        Несколько сохранений как одно: при исключении не сохраняется ни одно.
+        Хранилища, загружаемые целиком, сохраняют изменения одной записью, транзакция им не нужна.
+        """
+        yield
+
+    def load_stats(self) -> dict | None:
+        """
+        Чтение агрегированных счётчиков списка задач, сохранённых рядом с ним (см. save_stats): из файла
+        <путь>.stats, если он записан при текущей версии хранилища (иначе список задач изменён без обновления
+        счётчиков).
+        :return: Словарь счётчиков или None, если они не сохранены или устарели.
+        """
+        try:
+            with open(f'{self.path}.stats', 'r', encoding='utf8') as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if data.get('version') != json.dumps(self.version()):
+            return None
+        return data.get('stats')
+
+    def save_stats(self, stats: dict | None):
+        """
+        Сохранение агрегированных счётчиков списка задач (после сохранения изменений списка,
+        под той же исключительной блокировкой): в файл <путь>.stats с текущей версией хранилища
+        (атомарно, через временный файл).
+        :param stats: Словарь счётчиков (None — счётчики неизвестны, сохранённые удаляются).
+        """
+        path = f'{self.path}.stats'
+        if stats is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        with open(f'{path}.tmp', 'w', encoding='utf8') as file:
+            json.dump({'version': json.dumps(self.version()), 'stats': stats}, file, ensure_ascii=False)
+        os.replace(f'{path}.tmp', path)
+
+    def load_history(self) -> list[dict]:
+        """
+        Чтение истории изменений списка задач (см. save_history) из файла <путь>.history.
+        :return: Записи истории от старых к новым.
+        """
+        try:
+            with open(f'{self.path}.history', 'r', encoding='utf8') as file:
+                return [json.loads(line) for line in file]
+        except FileNotFoundError:
+            return []
+
+    def save_history(self, records: list[dict], drop: int | None = 0, size: int = 1 << 20):
+        """
+        Сохранение истории изменений списка задач (после сохранения изменений, под той же исключительной
+        блокировкой): новые записи дописываются в файл <путь>.history по одной в строке. Если файл больше size байт
+        или записи удаляются, он перезаписывается атомарно (через временный файл) с новейшими записями
+        не больше чем на половину size.
+        :param records: Новые записи (JSON-объекты).
+        :param drop: Количество удаляемых последних записей (отменённых); None — удаляются все.
+        :param size: Наибольший размер файла (байт).
+        """
+        path = f'{self.path}.history'
+        lines = [json.dumps(record, ensure_ascii=False) + '\n' for record in records]
+        if drop == 0 and (not os.path.exists(path) or os.path.getsize(path) < size):
+            with open(path, 'a', encoding='utf8') as file:
+                file.writelines(lines)
+            return
+        kept = []
+        if drop is not None and os.path.exists(path):
+            with open(path, 'r', encoding='utf8') as file:
+                kept = file.readlines()
+            kept = kept[:len(kept) - drop]
+        kept += lines
+        total = 0
+        for k in range(len(kept) - 1, -1, -1):  # Новейшие записи, вместе не больше половины size.
+            total += len(kept[k].encode())
+            if total > size // 2:
+                kept = kept[k + 1:]
+                break
+        with open(f'{path}.tmp', 'w', encoding='utf8') as file:
+            file.writelines(kept)
+        os.replace(f'{path}.tmp', path)
+
+    def load(self):
+        """
+        Чтение списка задач.
+        :return: Итератор словарей полей задач.
+        """
+        return iter(())
+
+    def max_id(self) -> int:
+        """
+        :return: Наибольший ID задачи в хранилище (0, если хранилище пусто).
+        """
+        return max((task['id'] for task in self.load()), default=0)
+
+    def save(self, tasks: list, changes: dict):
+        """
+        Сохранение изменений списка задач.
+        :param tasks: Полный список задач (для хранилищ, перезаписывающих файл целиком).
+        :param changes: Изменения: {ID: задача или None для удалённой задачи}.
+        """
+        raise NotImplementedError
+
+    def append(self, changes: dict):
+        """
+        Сохранение новых задач без загрузки списка задач.
+        :param changes: Новые задачи: {ID: задача}.
+        """
+        self.save(list(changes.values()), changes)
+
+
+class JsonStorage(Storage):
+    """
+    Хранение в JSON-файле, перезаписываемом целиком при каждом сохранении.
+    """
+    name = 'json'
+
+    def __init__(self, path: str, journal: str | None = None):
+        """
+        Хранение в JSON-файле.
+        :param path: Путь к JSON-файлу с задачами.
+        :param journal: Путь к журналу изменений. Журнал применяется при загрузке и удаляется после сохранения.
+        """
+        self.path = path
+        self.journal = journal
+
+    def load(self):
+        """
+        Потоковое чтение списка задач в порядке файла с применением журнала изменений.
+        Задачи, изменённые в журнале, возвращаются в изменённом виде, удалённые — пропускаются,
+        добавленные — возвращаются после задач из файла. Порядок ID не гарантируется.
+        :return: Итератор словарей полей задач.
+        """
+        changes = self._read_journal() if self.journal and os.path.exists(self.journal) else {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf8') as file:
+                for task in iter_json_array(file):
+                    if changes and task['id'] in changes:
+                        task = changes.pop(task['id'])
+                        if task is None:
+                            continue
+                    yield task
+        yield from (task for task in changes.values() if task is not None)
+
+    def _read_journal(self) -> dict:
+        """
+        Чтение журнала изменений.
+        Каждая строка журнала — JSON-объект {"put": [задачи], "del": [ID]} с изменениями одного сохранения.
+        :return: Итоговые изменения: {ID: словарь полей задачи или None для удалённой задачи}.
+        """
+        changes = {}
+        with open(self.journal, 'r', encoding='utf8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Недописанная (оборванная) последняя запись.
+                for i in record.get('del', ()):
+                    changes[i] = None
+                for task in record.get('put', ()):
+                    changes[task['id']] = task
+        return changes
+
+    def max_id(self) -> int:
+        """
+        Наибольший ID задачи без разбора JSON: поиск ключей "id" в файле блоками и в журнале.
+        """
+        res = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as file:
+                tail = b''
+                while block := file.read(CHUNK):
+                    # Хвост предыдущего блока — на случай ключа, разрезанного границей блоков.
+                    block = tail + block
+                    res = max(res, max((int(m) for m in ID_KEY.findall(block)), default=0))
+                    tail = block[-32:]
+        if self.journal and os.path.exists(self.journal):
+            res = max(res, max(self._read_journal(), default=0))
+        return res
+
+    def version(self) -> tuple:
+        """
+        Версия: номер индексного дескриптора, размер и время изменения JSON-файла и журнала
+        (файл заменяется новым при каждой записи, журнал только дописывается).
+        """
+        res = []
+        for path in (self.path, self.journal):
+            try:
+                stat = os.stat(path)
+            except (FileNotFoundError, TypeError):
+                res.append(None)
+            else:
+                res.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        return tuple(res)
+
+    @contextmanager
+    def _replace(self, copy: bool = False):
+        """
+        Атомарная запись JSON-файла: во временный файл, который затем заменяет JSON-файл (os.replace),
+        поэтому другие процессы видят либо старый, либо новый файл целиком, но не частично записанный.
+        :param copy: Временный файл — копия JSON-файла (для дописывания).
+        :return: Контекстный менеджер двоичного временного файла.
+        """
+        temp = f'{self.path}.tmp'
+        if copy:
+            shutil.copyfile(self.path, temp)  # Копирование средствами ОС, без разбора JSON.
+        try:
+            with open(temp, 'r+b' if copy else 'wb') as file:
+                yield file
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp, self.path)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def save(self, tasks: list, changes: dict):
+        with self._replace() as file:
+            for text in iter_dump(task.as_dict() for task in tasks):
+                file.write(text.encode())
+        if self.journal and os.path.exists(self.journal):
+            os.remove(self.journal)
+
+    def append(self, changes: dict):
+        """
+        Дописывание новых задач в конец JSON-массива без разбора файла: в копию файла, которая затем
+        заменяет его (см. _replace). Формат совпадает с записываемым методом save.
+        """
+        tasks = [task.as_dict() for task in changes.values()]
+        text = ''.join(iter_dump(tasks))[1:]  # Элементы массива и закрывающая скобка без открывающей.
+        if not os.path.exists(self.path) or not os.path.getsize(self.path):
+            with self._replace() as file:
+                file.write(('[' + text).encode())
+            return
+        with self._replace(copy=True) as file:
+            end = file.seek(0, os.SEEK_END)
+            pos = max(end - 64, 0)
+            file.seek(pos)
+            tail = file.read().rstrip()
+            if not tail.endswith(b']'):
+                raise ValueError(f'Файл {self.path} не содержит JSON-массив.')
+            body = tail[:-1].rstrip()  # Конец файла до закрывающей скобки (без пробельных символов).
+            empty = body.endswith(b'[') or (not body and not pos)  # Пустой массив.
+            file.seek(pos + len(body))
+            file.truncate()
+            file.write((text if empty else ',' + text).encode())
+
+
+class JournalStorage(JsonStorage):
+    """
+    Хранение в JSON-файле с дозаписью изменений в журнал и сворачиванием журнала по достижении порога размера.
+    """
+    name = 'journal'
+
+    def __init__(self, path: str, journal: str, limit: int):
+        """
+        Хранение в JSON-файле с журналом изменений.
+        :param path: Путь к JSON-файлу с задачами.
+        :param journal: Путь к журналу изменений.
+        :param limit: Размер журнала (байт), по достижении которого он сворачивается в JSON-файл.
+        """
+        super().__init__(path, journal)
+        self.limit = limit
+
+    def save(self, tasks: list, changes: dict):
+        self.append(changes)
+        if os.path.getsize(self.journal) >= self.limit:
+            super().save(tasks, changes)
+
+    def append(self, changes: dict):
+        """
+        Дозапись изменений в журнал одной строкой (без сворачивания: список задач может быть не загружен).
+        """
+        record = {
+            'put': [task.as_dict() for task in changes.values() if task is not None],
+            'del': [i for i, task in changes.items() if task is None]
+        }
+        with open(self.journal, 'a', encoding='utf8') as file:
+            file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class SqliteStorage(Storage):
+    """
+    Хранение в базе данных SQLite с индексами по ID, категории, статусу, приоритету и сроку выполнения.
+    Задачи не загружаются целиком: поиск и выборка по ID и категории выполняются запросами к базе.
+    Приоритет хранится номером, статус — числом 0 или 1.
+    """
+    name = 'sqlite'
+    lazy = True
+    label = 'SQLite'
+    nested = False  # Запись внутри транзакции transaction (фиксируется по её завершении).
+    # Столбец category_key — категория в нижнем регистре (lower() в SQLite не работает с кириллицей).
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY, title TEXT NOT NULL, description TEXT NOT NULL, '
+        'category TEXT NOT NULL, due_date TEXT NOT NULL, priority INTEGER NOT NULL, status INTEGER NOT NULL, '
+        'category_key TEXT NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS tasks_category ON tasks (category_key)',
+        'CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status)',
+        'CREATE INDEX IF NOT EXISTS tasks_due_date ON tasks (due_date)',
+        'CREATE INDEX IF NOT EXISTS tasks_priority ON tasks (priority)',
+        # Полнотекстовый триграммный индекс названий и описаний, синхронизируемый с таблицей триггерами.
+        "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_text USING fts5(title, description, content='tasks', "
+        "content_rowid='id', tokenize='trigram')",
+        'CREATE TRIGGER IF NOT EXISTS tasks_text_insert AFTER INSERT ON tasks BEGIN '
+        'INSERT INTO tasks_text (rowid, title, description) VALUES (new.id, new.title, new.description); END',
+        'CREATE TRIGGER IF NOT EXISTS tasks_text_delete AFTER DELETE ON tasks BEGIN '
+        "INSERT INTO tasks_text (tasks_text, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END",
+        'CREATE TRIGGER IF NOT EXISTS tasks_text_update AFTER UPDATE OF title, description ON tasks BEGIN '
+        "INSERT INTO tasks_text (tasks_text, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        'INSERT INTO tasks_text (rowid, title, description) VALUES (new.id, new.title, new.description); END',
+        # Агрегированные счётчики списка задач (JSON), записываемые в одной транзакции с изменениями.
+        'CREATE TABLE IF NOT EXISTS stats (id INTEGER PRIMARY KEY CHECK (id = 0), data TEXT NOT NULL)',
+    )
+    # Вставка или замена задачи. UPSERT, а не INSERT OR REPLACE: замена строки не вызывает триггер удаления.
+    UPSERT = (
+        'INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET title = excluded.title, '
+        'description = excluded.description, category = excluded.category, due_date = excluded.due_date, '
+        'priority = excluded.priority, status = excluded.status, category_key = excluded.category_key'
+    )
+    SELECT = f'SELECT {', '.join(FIELDS)} FROM tasks'
+    # Порядок результата поиска: {ключ сортировки: ORDER BY}; срок и приоритет — по индексам tasks_due_date
+    # и tasks_priority.
+    ORDERS = dict(id='id', due_date='due_date, id', priority='priority DESC, id')
+
+    def __init__(self, path: str, priorities: tuple):
+        """
+        Хранение в базе данных SQLite.
+        :param path: Путь к файлу базы данных.
+        :param priorities: Названия приоритетов по порядку номеров (для приведения названия к номеру).
+        """
+        import sqlite3  # Импорт только при работе с базой данных.
+        self.path = path
+        self.priorities = priorities
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode = WAL')  # Запись без перезаписи страниц базы и fsync на каждую команду.
+        self.db.execute('PRAGMA synchronous = NORMAL')
+        self.db.create_function('py_lower', 1, str.lower, deterministic=True)
+        if len(self._tables()) < 2:
+            # Схема создаётся (дополняется) под исключительной блокировкой: запись в базу другим процессом посреди
+            # его сохранения прервала бы его транзакцию (SQLITE_BUSY_SNAPSHOT).
+            with self.lock(exclusive=True):
+                text = 'tasks_text' in self._tables()
+                with self.db:
+                    for sql in self.SCHEMA:
+                        self.db.execute(sql)
+                    if not text:  # База создана до появления полнотекстового индекса.
+                        self.db.execute("INSERT INTO tasks_text (tasks_text) VALUES ('rebuild')")
+
+    def _tables(self) -> set:
+        """
+        :return: Уже созданные таблицы последних добавленных в схему (полнотекстовый индекс и счётчики).
+        """
+        rows = self.db.execute("SELECT name FROM sqlite_master WHERE name IN ('tasks_text', 'stats')")
+        return {row[0] for row in rows}
+
+    @staticmethod
+    def _row(cursor, row: tuple) -> dict:
+        """
+        Преобразование строки таблицы в словарь полей задачи.
+        """
+        task = dict(zip(FIELDS, row))
+        task['status'] = bool(task['status'])
+        return task
+
+    def _values(self, task) -> tuple:
+        """
+        Значения полей задачи для записи в таблицу.
+        :param task: Задача (объект с методом as_dict или словарь полей).
+        """
+        if not isinstance(task, dict):
+            task = task.as_dict()
+        p = task['priority']
+        if isinstance(p, str):
+            p = self.priorities.index(p)
+        return *(task[f] for f in FIELDS[:5]), p, int(task['status']), task['category'].lower()
+
+    def _query(self, sql: str, params=()):
+        """
+        Выполнение запроса, строки результата которого — словари полей задач.
+        """
+        cur = self.db.cursor()
+        cur.row_factory = self._row
+        return cur.execute(sql, params)
+
+    def max_id(self) -> int:
+        """
+        :return: Наибольший ID задачи в базе (0, если база пуста).
+        """
+        return self.db.execute('SELECT coalesce(max(id), 0) FROM tasks').fetchone()[0]
+
+    def version(self) -> int:
+        """
+        Версия: счётчик PRAGMA data_version, изменяющийся при записи в базу другими соединениями.
+        """
+        return self.db.execute('PRAGMA data_version').fetchone()[0]
+
+    def get(self, i: int) -> dict | None:
+        """
+        Выборка задачи по ID.
+        :return: Словарь полей задачи или None.
+        """
+        return self._query(f'{self.SELECT} WHERE id = ?', (i,)).fetchone()
+
+    def category(self, key: str) -> list[dict]:
+        """
+        Выборка задач категории без учёта регистра.
+        :param key: Категория в нижнем регистре.
+        :return: Список словарей полей задач, упорядоченный по ID.
+        """
+        return self._query(f'{self.SELECT} WHERE category_key = ? ORDER BY id', (key,)).fetchall()
+
+    def all(self):
+        """
+        :return: Итератор словарей полей всех задач, упорядоченных по ID.
+        """
+        return self._query(f'{self.SELECT} ORDER BY id')
+
+    def _where(self, text: str | None = None, category: str | None = None, status: int | None = None,
+               inner: bool = False, priority: int | None = None, due_from: str | None = None,
+               due_to: str | None = None, limit: int | None = None, offset: int = 0,
+               sort: str = 'id') -> tuple | None:
+        """
+        Запрос поиска задач. Условия те же, что и в TaskManager.Query; все условия передаются базе одним запросом,
+        индекс (по тексту, категории, статусу, приоритету или сроку) выбирает планировщик SQLite.
+        :return: Текст запроса и параметры или None, если результат заведомо пуст.
+        """
+        where = []
+        params = []
+        if text:
+            text = text.lower()
+            if len(text) < 3:
+                where.append('(instr(py_lower(title), ?) OR instr(py_lower(description), ?))')
+                params += [text] * 2
+            else:
+                # Кандидаты — из триграммного индекса, точная проверка — как при поиске в памяти.
+                where.append('(id IN (SELECT rowid FROM tasks_text WHERE tasks_text MATCH ?) '
+                             'AND (instr(py_lower(title), ?) OR instr(py_lower(description), ?)))')
+                params += [f'"{text.replace('"', '""')}"', text, text]
+        if category:
+            where.append('instr(category, ?)')
+            params.append(category)
+        if status is not None:
+            where.append('status = ?')
+            params.append(int(status))
+        if priority is not None:
+            where.append('priority = ?')
+            params.append(priority)
+        if due_from or due_to:
+            where.append('due_date BETWEEN ? AND ?')
+            params += [due_from or '', due_to or '\uffff']
+        if not where and not inner:
+            return None
+        sql = self.SELECT
+        if where:
+            sql += f' WHERE {(' AND ' if inner else ' OR ').join(where)}'
+        sql += f' ORDER BY {self.ORDERS[sort]}'
+        if limit is not None or offset:
+            sql += ' LIMIT ? OFFSET ?'
+            params += [-1 if limit is None else limit, offset]
+        return sql, params
+
+    def select(self, **conditions):
+        """
+        Поиск задач.
+        :param conditions: Условия поиска (см. _where).
+        :return: Итератор словарей полей задач, упорядоченных по ID.
+        """
+        query = self._where(**conditions)
+        if query is None:
+            return iter(())
+        return self._query(*query)
+
+    def explain(self, **conditions) -> list[str]:
+        """
+        План поиска задач (EXPLAIN QUERY PLAN).
+        :param conditions: Условия поиска (см. _where).
+        :return: Шаги плана.
+        """
+        query = self._where(**conditions)
+        if query is None:
+            return ['условия не заданы: результат пуст']
+        return [row[3] for row in self.db.execute(f'EXPLAIN QUERY PLAN {query[0]}', query[1])]
+
+    @contextmanager
+    def transaction(self):
+        if self.nested:  # Вложенная транзакция — часть внешней.
+            yield
+            return
+        self.db.execute('BEGIN')
+        self.nested = True
+        try:
+            yield
+        except BaseException:
+            self.db.rollback()
+            raise
+        else:
+            self.db.commit()
+        finally:
+            self.nested = False
+
+    def _commit(self):
+        """
+        Фиксация записи по завершении блока (внутри transaction — по завершении транзакции).
+        """
+        return nullcontext() if self.nested else self.db
+
+    def load_stats(self) -> dict | None:
+        row = self.db.execute('SELECT data FROM stats').fetchone()
+        return row and json.loads(row[0])
+
+    def save_stats(self, stats: dict | None):
+        with self._commit():
+            if stats is None:
+                self.db.execute('DELETE FROM stats')
+            else:
+                self.db.execute('INSERT OR REPLACE INTO stats VALUES (0, ?)', (json.dumps(stats, ensure_ascii=False),))
+
+    def save(self, tasks: list, changes: dict):
+        with self._commit():
+            self.db.executemany(self.UPSERT, (self._values(task) for task in changes.values() if task is not None))
+            self.db.executemany('DELETE FROM tasks WHERE id = ?',
+                                ((i,) for i, task in changes.items() if task is None))
+
+    def insert(self, tasks) -> int:
+        """
+        Импорт задач одной транзакцией (задачи с существующими ID заменяются).
+        :param tasks: Итерируемый набор словарей полей задач с приведёнными приоритетом и статусом.
+        :return: Количество импортированных задач.
+        """
+        cnt = 0
+
+        def values():
+            nonlocal cnt
+            for task in tasks:
+                cnt += 1
+                yield self._values(task)
+
+        with self._commit():
+            self.db.executemany(self.UPSERT, values())
+            self.db.execute('DELETE FROM stats')  # Счётчики устарели: пересчитываются командой stats.
+        return cnt
+
+
+def _day(value: str) -> int:
+    """
+    Порядковый номер дня даты в формате гггг-мм-дд (как Task.to_day).
+    :return: Порядковый номер дня или 0, если дата не в формате гггг-мм-дд.
+    """
+    if len(value) == 10 and value[4] == value[7] == '-':
+        try:
+            return date.fromisoformat(value).toordinal()
+        except ValueError:
+            pass
+    return 0
+
+
+class SnapshotStorage(Storage):
+    """
+    Хранение в компактном двоичном снимке, читаемом через отображение файла в память (mmap): задачи не загружаются
+    целиком, а каждый запрос читает только нужные страницы файла.
+    Файл: заголовок (SNAPSHOT_HEADER), куча строк UTF-8 (одинаковые категории — один раз), записи фиксированной длины
+    (SNAPSHOT_RECORD, упорядочены по ID) и ссылки на строки в куче (SNAPSHOT_REFS, в том же порядке).
+    Выборка по ID — двоичный поиск по записям; проверки статуса, приоритета и срока читают только записи (16 байт
+    на задачу), строки читаются из кучи только для найденных задач и условий по тексту и категории.
+    Изменения только полей записей пишутся на место, остальные — перезаписью снимка во временный файл,
+    в начало кучи которого копируется старая куча (строки неизменённых задач не читаются).
+    """
+    name = 'snapshot'
+    lazy = True
+    label = 'Снимок'
+    # Ключи сортировки результата поиска пар (номер записи, запись), как в TaskManager.Query.KEYS.
+    KEYS = dict(
+        due_date=lambda item: (item[1][3] or date.max.toordinal() + 1, item[1][0]),
+        priority=lambda item: (-item[1][1], item[1][0]),
+    )
+
+    def __init__(self, path: str, priorities: tuple):
+        """
+        Хранение в двоичном снимке.
+        :param path: Путь к файлу снимка.
+        :param priorities: Названия приоритетов по порядку номеров (для приведения названия к номеру).
+        """
+        self.path = path
+        self.priorities = priorities
+        self.map = None  # Отображение файла снимка в память.
+        self.mapped = None  # (индексный дескриптор, размер) отображённого файла.
+        self.count = self.heap = self.records = self.refs = 0  # Количество задач и смещения разделов файла.
+
+    def _open(self) -> mmap.mmap | None:
+        """
+        Отображение файла снимка в память (только чтение). Отображение используется повторно, пока файл не заменён
+        новым; записи, изменённые на месте, видны через него сразу. Старое отображение не закрывается явно:
+        его могут читать незавершённые итераторы.
+        :return: Отображение или None, если снимок не создан.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        key = stat and (stat.st_ino, stat.st_size)
+        if key != self.mapped:
+            self.map = None
+            self.count = 0
+            if stat and stat.st_size:
+                with open(self.path, 'rb') as file:
+                    m = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, _, count, heap, _ = SNAPSHOT_HEADER.unpack_from(m)
+                if magic != SNAPSHOT_MAGIC:
+                    raise ValueError(f'Файл {self.path} не является снимком списка задач.')
+                self.map = m
+                self.count = count
+                self.heap = SNAPSHOT_HEADER.size
+                self.records = self.heap + heap + -heap % 8
+                self.refs = self.records + count * SNAPSHOT_RECORD.size
+            self.mapped = key
+        return self.map
+
+    def _header(self) -> tuple:
+        """
+        :return: Поколение, количество задач, размер кучи и байты устаревших строк текущего снимка.
+        """
+        return SNAPSHOT_HEADER.unpack_from(self._open())[1:]
+
+    def version(self) -> tuple:
+        """
+        Версия: индексный дескриптор файла (заменяется при перезаписи) и поколение (увеличивается при любой записи,
+        в том числе на месте).
+        """
+        if self._open() is None:
+            return None, 0
+        return self.mapped[0], self._header()[0]
+
+    def max_id(self) -> int:
+        m = self._open()
+        if not self.count:
+            return 0
+        return SNAPSHOT_RECORD.unpack_from(m, self.records + (self.count - 1) * SNAPSHOT_RECORD.size)[0]
+
+    def _id(self, k: int) -> int:
+        """
+        :return: ID задачи записи с номером k.
+        """
+        return SNAPSHOT_RECORD.unpack_from(self.map, self.records + k * SNAPSHOT_RECORD.size)[0]
+
+    def _find(self, i: int, lo: int = 0) -> int:
+        """
+        Двоичный поиск записи по ID.
+        :param lo: Номер записи, с которой начинается поиск.
+        :return: Номер первой записи с ID не меньше i (self.count — таких нет).
+        """
+        return bisect_left(range(self.count), i, lo, key=self._id)
+
+    def _string(self, m: mmap.mmap, k: int, n: int) -> str:
+        """
+        Строка задачи из кучи.
+        :param k: Номер записи.
+        :param n: Номер строки (см. SNAPSHOT_REFS).
+        """
+        offset, length = SNAPSHOT_REF.unpack_from(m, self.refs + k * SNAPSHOT_REFS.size + n * SNAPSHOT_REF.size)
+        return str(m[self.heap + offset:self.heap + offset + length], 'utf8')
+
+    def _task(self, m: mmap.mmap, k: int) -> dict:
+        """
+        Словарь полей задачи записи с номером k.
+        """
+        i, p, s, day = SNAPSHOT_RECORD.unpack_from(m, self.records + k * SNAPSHOT_RECORD.size)
+        refs = SNAPSHOT_REFS.unpack_from(m, self.refs + k * SNAPSHOT_REFS.size)
+        heap = self.heap
+        title, description, category, due = (str(m[heap + refs[n]:heap + refs[n] + refs[n + 1]], 'utf8')
+                                             for n in range(0, 8, 2))
+        return dict(id=i, title=title, description=description, category=category,
+                    due_date=date.fromordinal(day).isoformat() if day else due, priority=p, status=bool(s))
+
+    def get(self, i: int) -> dict | None:
+        """
+        Выборка задачи по ID.
+        :return: Словарь полей задачи или None.
+        """
+        m = self._open()
+        if m is None:
+            return None
+        k = self._find(i)
+        return self._task(m, k) if k < self.count and self._id(k) == i else None
+
+    def category(self, key: str) -> list[dict]:
+        """
+        Выборка задач категории без учёта регистра: читаются ссылки на строки, а каждая различная строка
+        категории — один раз.
+        :param key: Категория в нижнем регистре.
+        :return: Список словарей полей задач, упорядоченный по ID.
+        """
+        m = self._open()
+        if m is None:
+            return []
+        found = {}  # {ссылка на строку категории: совпадение}.
+        res = []
+        for k, refs in enumerate(SNAPSHOT_REFS.iter_unpack(memoryview(m)[self.refs:])):
+            ref = refs[4:6]
+            match = found.get(ref)
+            if match is None:
+                match = found[ref] = str(m[self.heap + ref[0]:self.heap + sum(ref)], 'utf8').lower() == key
+            if match:
+                res.append(self._task(m, k))
+        return res
+
+    def all(self):
+        """
+        :return: Итератор словарей полей всех задач, упорядоченных по ID.
+        """
+        m = self._open()
+        return (self._task(m, k) for k in range(self.count if m else 0))
+
+    def _matches(self, m: mmap.mmap, text: str | None = None, category: str | None = None,
+                 status: int | None = None, inner: bool = False, priority: int | None = None,
+                 due_from: str | None = None, due_to: str | None = None):
+        """
+        Поиск задач перебором записей. Условия те же, что и в TaskManager.Query. Поля записей (статус, приоритет,
+        срок) проверяются раньше строк, строки читаются из кучи только для условий по тексту и категории
+        (и срока не в формате гггг-мм-дд); каждая различная строка категории проверяется один раз.
+        :return: Итератор пар (номер записи, запись), упорядоченных по ID.
+        """
+        checks = []  # Проверки: функция(номер записи, запись) -> bool.
+        if status is not None:
+            checks.append(lambda k, r: r[2] == status)
+        if priority is not None:
+            checks.append(lambda k, r: r[1] == priority)
+        if due_from or due_to:
+            first = due_from and _day(due_from) or 1
+            last = due_to and _day(due_to) or date.max.toordinal()
+            low, high = due_from or '', due_to or '\uffff'
+            checks.append(lambda k, r: first <= r[3] <= last if r[3] else low <= self._string(m, k, 3) <= high)
+        if category:
+            found = {}  # {ссылка на строку категории: совпадение}.
+
+            def check_category(k: int, r: tuple) -> bool:
+                ref = SNAPSHOT_REF.unpack_from(m, self.refs + k * SNAPSHOT_REFS.size + 2 * SNAPSHOT_REF.size)
+                match = found.get(ref)
+                if match is None:
+                    match = found[ref] = category in str(m[self.heap + ref[0]:self.heap + sum(ref)], 'utf8')
+                return match
+
+            checks.append(check_category)
+        if text:
+            text = text.lower()
+            checks.append(lambda k, r: text in self._string(m, k, 0).lower() or text in self._string(m, k, 1).lower())
+        if not checks and not inner:
+            return
+        records = enumerate(SNAPSHOT_RECORD.iter_unpack(memoryview(m)[self.records:self.refs]))
+        if len(checks) == 1:  # Одно условие (частый случай) — без обхода списка проверок.
+            check = checks[0]
+            yield from ((k, r) for k, r in records if check(k, r))
+            return
+        test = all if inner else any
+        for k, r in records:
+            if test(check(k, r) for check in checks):
+                yield k, r
+
+    def select(self, limit: int | None = None, offset: int = 0, sort: str = 'id', **conditions):
+        """
+        Поиск задач.
+        :param conditions: Условия поиска (см. _matches).
+        :return: Итератор словарей полей задач, упорядоченных по ID (или по ключу sort).
+        """
+        m = self._open()
+        if m is None:
+            return iter(())
+        matches = self._matches(m, **conditions)
+        if sort != 'id':
+            if limit is None:
+                matches = sorted(matches, key=self.KEYS[sort])
+            else:
+                matches = nsmallest(offset + limit, matches, key=self.KEYS[sort])
+        if offset or limit is not None:
+            matches = islice(matches, offset, None if limit is None else offset + limit)
+        return (self._task(m, k) for k, _ in matches)
+
+    def explain(self, text: str | None = None, category: str | None = None, status: int | None = None,
+                inner: bool = False, priority: int | None = None, due_from: str | None = None,
+                due_to: str | None = None, sort: str = 'id', **page) -> list[str]:
+        """
+        План поиска задач.
+        :param conditions: Условия поиска (см. _matches).
+        :return: Шаги плана.
+        """
+        fields = [name for name, value in (('статус', status is not None), ('приоритет', priority is not None),
+                                           ('срок', due_from or due_to)) if value]
+        strings = [name for name, value in (('категория', category), ('текст', text)) if value]
+        if not fields and not strings and not inner:
+            return ['условия не заданы: результат пуст']
+        self._open()
+        steps = [f'перебор записей фиксированной длины ({self.count} по {SNAPSHOT_RECORD.size} байт), '
+                 f'проверка полей записей ({', '.join(fields) or 'нет'})']
+        if strings:
+            steps.append(f'чтение строк из кучи для проверки ({', '.join(strings)})'
+                         f'{' только у задач, прошедших проверку полей' if inner and fields else ''}')
+        if sort != 'id':
+            steps.append(f'сортировка найденных задач ({sort})')
+        return steps
+
+    def _fields(self, task) -> dict:
+        """
+        Поля задачи для записи в снимок.
+        :param task: Задача (объект с методом as_dict или словарь полей).
+        :return: Словарь полей с номером приоритета.
+        """
+        if not isinstance(task, dict):
+            task = task.as_dict()
+        p = task['priority']
+        if isinstance(p, str):
+            p = self.priorities.index(p)
+        return dict(task, priority=p)
+
+    @staticmethod
+    def _due(task: dict) -> tuple[int, str]:
+        """
+        Срок выполнения задачи для записи: порядковый номер дня и строка для кучи (пустая, если срок — дата
+        в формате гггг-мм-дд, восстанавливаемая по номеру дня без потерь).
+        """
+        due = task['due_date']
+        day = _day(due)
+        if day and date.fromordinal(day).isoformat() == due:
+            return day, ''
+        return 0, due
+
+    def save(self, tasks: list, changes: dict):
+        changes = {i: task and self._fields(task) for i, task in changes.items()}
+        if not self._patch(changes):
+            self._merge(changes)
+
+    def _patch(self, changes: dict) -> bool:
+        """
+        Запись изменений на место, если у изменённых задач изменены только поля записей (статус, приоритет,
+        дата срока): записи перезаписываются в файле снимка без его копирования, поколение увеличивается.
+        :param changes: Изменения: {ID: словарь полей задачи или None для удалённой задачи}.
+        :return: False — изменения требуют перезаписи снимка (добавление, удаление, изменение строк).
+        """
+        m = self._open()
+        if m is None:
+            return False
+        patches = []  # (смещение записи в файле, новая запись).
+        for i, task in changes.items():
+            k = self._find(i)
+            if task is None or k == self.count or self._id(k) != i:
+                return False
+            day, due = self._due(task)
+            if (task['title'], task['description'], task['category'], due) != tuple(
+                    self._string(m, k, n) for n in range(4)):
+                return False
+            patches.append((self.records + k * SNAPSHOT_RECORD.size,
+                            SNAPSHOT_RECORD.pack(i, task['priority'], int(task['status']), day)))
+        generation = self._header()[0]
+        with open(self.path, 'r+b') as file:
+            for pos, record in patches:
+                file.seek(pos)
+                file.write(record)
+            file.seek(len(SNAPSHOT_MAGIC))
+            file.write(struct.pack('<Q', generation + 1))
+            file.flush()
+            os.fsync(file.fileno())
+        return True
+
+    def _merge(self, changes: dict):
+        """
+        Перезапись снимка с изменениями: неизменённые записи копируются диапазонами, старая куча — целиком
+        (без чтения строк). Когда устаревших строк в куче становится больше половины, куча строится заново.
+        :param changes: Изменения: {ID: словарь полей задачи или None для удалённой задачи}.
+        """
+        m = self._open()
+        if m is None:
+            self._write(sorted((task for task in changes.values() if task is not None), key=lambda t: t['id']))
+            return
+        _, count, heap, garbage = self._header()
+        found = {}  # {ID: номер записи} изменённых задач, имеющихся в снимке.
+        for i in changes:
+            k = self._find(i)
+            if k < count and self._id(k) == i:
+                found[i] = k
+                refs = SNAPSHOT_REFS.unpack_from(m, self.refs + k * SNAPSHOT_REFS.size)
+                garbage += refs[1] + refs[3] + refs[7]  # Категории общие: не учитываются.
+        compact = garbage * 2 > heap
+
+        def items():
+            """Задачи нового снимка по возрастанию ID: диапазоны номеров записей и словари полей."""
+            k = 0
+            for i in sorted(changes):
+                j = found.get(i)
+                end = self._find(i, k) if j is None else j
+                if end > k:
+                    yield range(k, end)
+                k = end if j is None else j + 1
+                if changes[i] is not None:
+                    yield changes[i]
+            if k < count:
+                yield range(k, count)
+
+        if compact:
+            self._write(task for item in items()
+                        for task in (map(partial(self._task, m), item) if isinstance(item, range) else (item,)))
+        else:
+            self._write(items(), heap, garbage)
+
+    def _write(self, tasks, heap: int | None = None, garbage: int = 0) -> int:
+        """
+        Запись снимка во временный файл, который затем заменяет файл снимка (атомарно, как у JsonStorage):
+        куча пишется потоком, записи и ссылки на строки (64 байта на задачу) накапливаются в памяти и пишутся за ней.
+        Если задачи пришли не по порядку ID, записи упорядочиваются перед записью (при повторе ID остаётся последняя).
+        :param tasks: Итератор задач: словари полей или диапазоны номеров записей текущего снимка (копируются).
+        :param heap: Размер кучи текущего снимка, копируемой в начало новой (None — куча строится заново).
+        :param garbage: Байты устаревших строк в копируемой куче.
+        :return: Количество задач.
+        """
+        m = self.map if heap is not None else None
+        generation = self._header()[0] + 1 if self._open() is not None else 0
+        records, refs = bytearray(), bytearray()
+        shared = {}  # {категория: ссылка}: одинаковые категории хранятся в куче один раз.
+        temp = f'{self.path}.tmp'
+        size = 0  # Размер кучи.
+        last = 0  # ID предыдущей задачи.
+        ordered = True
+        try:
+            with open(temp, 'wb') as file:
+                file.write(bytes(SNAPSHOT_HEADER.size))
+                if m is not None:
+                    file.write(memoryview(m)[self.heap:self.heap + heap])
+                    size = heap
+
+                def put(value: str) -> tuple[int, int]:
+                    """Дописывание строки в кучу. :return: Ссылка (смещение, длина)."""
+                    nonlocal size
+                    data = value.encode()
+                    if not data:
+                        return 0, 0
+                    file.write(data)
+                    size += len(data)
+                    return size - len(data), len(data)
+
+                for task in tasks:
+                    if isinstance(task, range):
+                        records += m[self.records + task.start * SNAPSHOT_RECORD.size:
+                                     self.records + task.stop * SNAPSHOT_RECORD.size]
+                        refs += m[self.refs + task.start * SNAPSHOT_REFS.size:
+                                  self.refs + task.stop * SNAPSHOT_REFS.size]
+                        i = self._id(task.stop - 1)
+                        ordered = ordered and self._id(task.start) > last
+                    else:
+                        i = task['id']
+                        ordered = ordered and i > last
+                        day, due = self._due(task)
+                        category = shared.get(task['category'])
+                        if category is None:
+                            category = shared[task['category']] = put(task['category'])
+                        records += SNAPSHOT_RECORD.pack(i, task['priority'], int(task['status']), day)
+                        refs += SNAPSHOT_REFS.pack(*put(task['title']), *put(task['description']), *category,
+                                                   *put(due))
+                    last = i
+                count = len(records) // SNAPSHOT_RECORD.size
+                if not ordered:
+                    records, refs, count = self._order(records, refs)
+                file.write(bytes(-size % 8))
+                file.write(records)
+                file.write(refs)
+                file.seek(0)
+                file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, generation, count, size, garbage))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp, self.path)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+        return count
+
+    @staticmethod
+    def _order(records: bytearray, refs: bytearray) -> tuple[bytes, bytes, int]:
+        """
+        Упорядочивание записей и ссылок на строки по ID (при повторе ID остаётся последняя запись).
+        :return: Записи, ссылки и количество задач.
+        """
+        rs, fs = SNAPSHOT_RECORD.size, SNAPSHOT_REFS.size
+        position = {record[0]: k for k, record in enumerate(SNAPSHOT_RECORD.iter_unpack(records))}
+        order = [position[i] for i in sorted(position)]
+        return (b''.join(records[k * rs:(k + 1) * rs] for k in order),
+                b''.join(refs[k * fs:(k + 1) * fs] for k in order), len(order))
+
+    def insert(self, tasks) -> int:
+        """
+        Импорт задач (задачи с существующими ID заменяются). В пустой снимок задачи пишутся потоком.
+        :param tasks: Итерируемый набор словарей полей задач с приведёнными приоритетом и статусом.
+        :return: Количество импортированных задач.
+        """
+        if self._open() is None or not self.count:
+            return self._write(map(self._fields, tasks))
+        changes = {task['id']: self._fields(task) for task in tasks}
+        self.save([], changes)
+        return len(changes)
+
+
+class ShardedStorage(Storage):
+    """
+    Хранение в каталоге шардов: задачи каждой категории (без учёта регистра) — в отдельном JSON-файле того же вида,
+    что и JSON-файл списка задач, и манифест (manifest.json) с именем файла, количеством задач и диапазоном ID
+    каждого шарда, а также последним выданным ID.
+    Команды с условием по категории (del --category, search --category --inner) читают и перезаписывают только шарды
+    нужных категорий. Файлы шардов не изменяются: при сохранении изменённые шарды пишутся в новые файлы
+    (с номером поколения в имени), после чего атомарно заменяется манифест — другие процессы видят либо старые,
+    либо новые шарды целиком. Последний выданный ID не уменьшается при удалении задач, поэтому ID не повторяются.
+    """
+    name = 'shards'
+    lazy = True
+    label = 'Шарды'
+    MANIFEST = 'manifest.json'  # Имя файла манифеста в каталоге шардов.
+
+    def __init__(self, path: str, priorities: tuple):
+        """
+        Хранение в каталоге шардов.
+        :param path: Путь к каталогу шардов.
+        :param priorities: Названия приоритетов по порядку номеров (для приведения номера к названию).
+        """
+        self.path = path
+        self.priorities = priorities
+        self.ranks = {p: n for n, p in enumerate(priorities)}  # {название приоритета: номер}.
+        self.manifest = None  # Прочитанный манифест.
+        self.raw = None  # Содержимое прочитанного манифеста.
+        self.loaded = {}  # Прочитанные шарды: {имя файла: {ID: словарь полей задачи}} (файлы не изменяются).
+        # Ключи сортировки результата поиска словарей полей задач, как в TaskManager.Query.KEYS.
+        self.keys = dict(
+            due_date=lambda task: (_day(task['due_date']) or date.max.toordinal() + 1, task['id']),
+            priority=lambda task: (-self.ranks[task['priority']], task['id']),
+        )
+
+    def _manifest(self) -> dict:
+        """
+        Манифест: разбирается заново, только если содержимое файла изменено другим процессом. Содержимое сравнивается
+        целиком (файл мал): индексный дескриптор, размер и время изменения заменённого файла могут совпасть
+        с прежними (дескриптор повторно используется, время — с точностью до такта часов ядра). Шарды,
+        не входящие в манифест, исключаются из прочитанных.
+        :return: {'generation': поколение, 'last_id': последний выданный ID,
+            'shards': {категория в нижнем регистре: {'file', 'count', 'min_id', 'max_id'}}}.
+        """
+        try:
+            with open(os.path.join(self.path, self.MANIFEST), 'rb') as file:
+                raw = file.read()
+        except FileNotFoundError:
+            raw = None
+        if raw != self.raw or self.manifest is None:
+            self.manifest = dict(generation=0, last_id=0, shards={}) if raw is None else json.loads(raw)
+            files = {shard['file'] for shard in self.manifest['shards'].values()}
+            self.loaded = {name: tasks for name, tasks in self.loaded.items() if name in files}
+            self.raw = raw
+        return self.manifest
+
+    def _shard(self, key: str) -> dict:
+        """
+        Задачи шарда (читаются один раз). Чтение без блокировки: если файл шарда, указанный прочитанным манифестом,
+        уже заменён и удалён другим процессом, манифест перечитывается под общей блокировкой (замена шардов
+        и удаление старых файлов выполняются под исключительной) и читается текущий файл шарда.
+        :param key: Категория в нижнем регистре.
+        :return: {ID: словарь полей задачи}, упорядоченный по ID (пустой, если шарда нет в манифесте).
+        """
+        shard = self.manifest['shards'].get(key)
+        if shard is None:
+            return {}
+        tasks = self.loaded.get(shard['file'])
+        if tasks is None:
+            try:
+                tasks = self._read(shard['file'])
+            except FileNotFoundError:
+                with self.lock():
+                    shard = self._manifest()['shards'].get(key)
+                    if shard is None:  # Шард удалён вместе с последней задачей категории.
+                        return {}
+                    tasks = self.loaded.get(shard['file']) or self._read(shard['file'])
+            self.loaded[shard['file']] = tasks
+        return tasks
+
+    def _read(self, name: str) -> dict:
+        """
+        Чтение файла шарда.
+        :param name: Имя файла в каталоге.
+        :return: {ID: словарь полей задачи}.
+        """
+        with open(os.path.join(self.path, name), 'r', encoding='utf8') as file:
+            return {task['id']: task for task in json.load(file)}
+
+    def version(self) -> str:
+        """
+        Версия: хеш содержимого манифеста (в нём номер поколения, изменяемый при каждой записи). Пока манифест
+        не создан, версия тоже определена (не None), чтобы первые записи нескольких процессов проверялись.
+        """
+        self._manifest()
+        return hashlib.sha1(self.raw or b'').hexdigest()
+
+    def max_id(self) -> int:
+        return self._manifest()['last_id']
+
+    def _keys(self, i: int) -> list[str]:
+        """
+        Шарды, диапазон ID которых включает i: сначала уже прочитанные.
+        :return: Список категорий в нижнем регистре.
+        """
+        shards = self._manifest()['shards']
+        keys = [key for key, shard in shards.items() if shard['min_id'] <= i <= shard['max_id']]
+        return sorted(keys, key=lambda key: shards[key]['file'] not in self.loaded)
+
+    def get(self, i: int) -> dict | None:
+        """
+        Выборка задачи по ID: шарды с подходящим диапазоном ID читаются, пока задача не найдена.
+        :return: Словарь полей задачи или None.
+        """
+        for key in self._keys(i):
+            task = self._shard(key).get(i)
+            if task is not None:
+                return dict(task)
+        return None
+
+    def category(self, key: str) -> list[dict]:
+        """
+        Выборка задач категории без учёта регистра: читается один шард.
+        :param key: Категория в нижнем регистре.
+        :return: Список словарей полей задач, упорядоченный по ID.
+        """
+        if key not in self._manifest()['shards']:
+            return []
+        return [dict(task) for task in self._shard(key).values()]
+
+    def all(self):
+        """
+        :return: Итератор словарей полей всех задач, упорядоченных по ID (слияние шардов).
+        """
+        shards = [self._shard(key).values() for key in self._manifest()['shards']]
+        return map(dict, merge(*shards, key=itemgetter('id')))
+
+    def _select_keys(self, category: str | None, inner: bool) -> list[str]:
+        """
+        Шарды, в которых могут быть найденные задачи: при условии по категории, обязательном для всех задач (inner), —
+        только шарды категорий, содержащих её фрагмент без учёта регистра.
+        :return: Список категорий в нижнем регистре.
+        """
+        shards = self._manifest()['shards']
+        if category and inner:
+            category = category.lower()
+            return [key for key in shards if category in key]
+        return list(shards)
+
+    def _matches(self, keys: list[str], text: str | None = None, category: str | None = None,
+                 status: int | None = None, inner: bool = False, priority: int | None = None,
+                 due_from: str | None = None, due_to: str | None = None):
+        """
+        Поиск задач перебором шардов. Условия те же, что и в TaskManager.Query.
+        :param keys: Просматриваемые шарды (см. _select_keys).
+        :return: Итератор словарей полей задач, упорядоченных по ID.
+        """
+        checks = []  # Проверки: функция(словарь полей задачи) -> bool.
+        if text:
+            text = text.lower()
+            checks.append(lambda t: text in t['title'].lower() or text in t['description'].lower())
+        if category:
+            checks.append(lambda t: category in t['category'])
+        if status is not None:
+            checks.append(lambda t: t['status'] == bool(status))
+        if priority is not None:
+            name = self.priorities[priority]
+            checks.append(lambda t: t['priority'] == name)
+        if due_from or due_to:
+            first = due_from and _day(due_from) or 1
+            last = due_to and _day(due_to) or date.max.toordinal()
+            low, high = due_from or '', due_to or '\uffff'
+
+            def check_due(t: dict) -> bool:
+                day = _day(t['due_date'])
+                return first <= day <= last if day else low <= t['due_date'] <= high
+
+            checks.append(check_due)
+        if not checks and not inner:
+            return iter(())
+        test = all if inner else any
+        shards = ((t for t in self._shard(key).values() if test(check(t) for check in checks)) for key in keys)
+        return merge(*shards, key=itemgetter('id'))
+
+    def select(self, limit: int | None = None, offset: int = 0, sort: str = 'id', **conditions):
+        """
+        Поиск задач.
+        :param conditions: Условия поиска (см. _matches).
+        :return: Итератор словарей полей задач, упорядоченных по ID (или по ключу sort).
+        """
+        matches = self._matches(self._select_keys(conditions.get('category'), conditions.get('inner')), **conditions)
+        if sort != 'id':
+            if limit is None:
+                matches = sorted(matches, key=self.keys[sort])
+            else:
+                matches = nsmallest(offset + limit, matches, key=self.keys[sort])
+        if offset or limit is not None:
+            matches = islice(matches, offset, None if limit is None else offset + limit)
+        return map(dict, matches)
+
+    def explain(self, text: str | None = None, category: str | None = None, status: int | None = None,
+                inner: bool = False, priority: int | None = None, due_from: str | None = None,
+                due_to: str | None = None, sort: str = 'id', **page) -> list[str]:
+        """
+        План поиска задач.
+        :param conditions: Условия поиска (см. _matches).
+        :return: Шаги плана.
+        """
+        names = [name for name, value in (('текст', text), ('категория', category), ('статус', status is not None),
+                                          ('приоритет', priority is not None), ('срок', due_from or due_to)) if value]
+        if not names and not inner:
+            return ['условия не заданы: результат пуст']
+        shards = self._manifest()['shards']
+        keys = self._select_keys(category, inner)
+        steps = [f'выбор шардов по манифесту: {len(keys)} из {len(shards)}'
+                 f'{f' (категории, содержащие «{category}» без учёта регистра)' if category and inner else ''}',
+                 f'перебор задач выбранных шардов ({sum(shards[key]['count'] for key in keys)}), '
+                 f'проверка условий ({', '.join(names) or 'нет'})']
+        if sort != 'id':
+            steps.append(f'сортировка найденных задач ({sort})')
+        return steps
+
+    def _fields(self, task) -> dict:
+        """
+        Поля задачи для записи в шард (в том же виде, что и в JSON-файле списка задач).
+        :param task: Задача (объект с методом as_dict или словарь полей).
+        :return: Словарь полей с названием приоритета.
+        """
+        if not isinstance(task, dict):
+            return task.as_dict()
+        p = task['priority']
+        return dict(task, priority=self.priorities[p]) if isinstance(p, int) else dict(task)
+
+    def save(self, tasks: list, changes: dict):
+        self._apply({i: task and self._fields(task) for i, task in changes.items()})
+
+    def _apply(self, changes: dict):
+        """
+        Запись изменений: читаются и перезаписываются только шарды изменённых задач. Шард, в котором задача была
+        до изменения категории или удаления, ищется сначала среди изменяемых и прочитанных шардов, затем по диапазонам
+        ID манифеста; новые задачи (ID больше последнего выданного) не ищутся.
+        :param changes: Изменения: {ID: словарь полей задачи или None для удалённой задачи}.
+        """
+        manifest = self._manifest()
+        shards = manifest['shards']
+        last = manifest['last_id']
+        touched = {}  # Новое содержимое изменяемых шардов: {категория в нижнем регистре: {ID: задача}}.
+
+        def contents(key: str) -> dict:
+            """Содержимое изменяемого шарда (копия прочитанного)."""
+            if key not in touched:
+                touched[key] = dict(self._shard(key)) if key in shards else {}
+            return touched[key]
+
+        def holder(i: int) -> str | None:
+            """Шард, содержащий задачу с ID i."""
+            for key, found in touched.items():
+                if i in found:
+                    return key
+            for key in self._keys(i):
+                if key not in touched and i in self._shard(key):
+                    return key
+            return None
+
+        for i, task in changes.items():
+            key = None if task is None else task['category'].lower()
+            if key is None or i not in contents(key):
+                old = holder(i) if i <= last else None
+                if old is not None:
+                    del contents(old)[i]
+            if key is not None:
+                contents(key)[i] = task
+        generation = manifest['generation'] + 1
+        shards = dict(shards)
+        os.makedirs(self.path, exist_ok=True)
+        for key, found in touched.items():
+            if not found:
+                shards.pop(key, None)
+                continue
+            found = dict(sorted(found.items()))
+            name = f'{hashlib.sha1(key.encode()).hexdigest()[:16]}-{generation}.json'
+            self._write(name, iter_dump(found.values()))
+            shards[key] = dict(file=name, count=len(found), min_id=next(iter(found)), max_id=next(reversed(found)))
+            self.loaded[name] = found
+        last = max(last, max((i for i, task in changes.items() if task is not None), default=0))
+        self.manifest = dict(generation=generation, last_id=last, shards=shards)
+        text = json.dumps(self.manifest, ensure_ascii=False, indent=4)
+        self._write(self.MANIFEST, [text])
+        self.raw = text.encode()
+        files = {shard['file'] for shard in shards.values()}
+        self.loaded = {name: tasks for name, tasks in self.loaded.items() if name in files}
+        for name in os.listdir(self.path):  # Заменённые шарды (и оставшиеся после сбоя записи).
+            if name != self.MANIFEST and name not in files:
+                os.remove(os.path.join(self.path, name))
+
+    def _write(self, name: str, parts):
+        """
+        Атомарная запись файла каталога шардов: во временный файл, который затем заменяет файл (os.replace).
+        :param name: Имя файла в каталоге.
+        :param parts: Итерируемый набор частей текста.
+        """
+        path = os.path.join(self.path, name)
+        temp = f'{path}.tmp'
+        try:
+            with open(temp, 'wb') as file:
+                for text in parts:
+                    file.write(text.encode())
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp, path)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def insert(self, tasks) -> int:
+        """
+        Импорт задач (задачи с существующими ID заменяются, в том числе в шардах других категорий).
+        :param tasks: Итерируемый набор словарей полей задач с приведёнными приоритетом и статусом.
+        :return: Количество импортированных задач.
+        """
+        changes = {task['id']: self._fields(task) for task in tasks}
+        self._apply(changes)
+        return len(changes)
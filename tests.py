@@ -1,5 +1,19 @@
+import contextlib
+import fcntl
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import signal
+import time
+from datetime import date
+
 import pytest
-from TaskManager import TaskManager
+
+import storage
+from TaskManager import Query, Task, TaskManager, TaskStats, forward
 
 TEST = (
     '-' * 112 + '\n' + ' ' * 48 + 'Результат поиска' + ' ' * 48 + '\n' + '—' * 112 + '\n' +
@@ -101,3 +115,820 @@ def test_del_category(get_tm):
     args = get_tm.parser.parse_args(['del', '-c', ' -v- ', 'Тест'])
     assert get_tm.delete(args) == ('Задача с категорией « -v- » не найдена.\n'
                                    'Задача «Тест edit» удалена. (Категория «Тест».)\n')
+
+
+@pytest.fixture()
+def empty_tm(tmp_path, monkeypatch):
+    """
+    Менеджер задач с пустым хранилищем во временном каталоге (общее состояние восстанавливается после теста).
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(TaskManager, 'tasks', [])
+    monkeypatch.setattr(TaskManager, 'ids', {})
+    monkeypatch.setattr(TaskManager, 'categories', {})
+    monkeypatch.setattr(TaskManager, 'loaded', False)
+    monkeypatch.setattr(TaskManager, 'counted', False)
+    monkeypatch.setattr(TaskManager, 'texts', None)
+    monkeypatch.setattr(TaskManager, 'orders', {})
+    monkeypatch.setattr(Task, 'index', 0)
+    return TaskManager()
+
+
+def add_tasks(tm, *rows):
+    for row in rows:
+        tm.add(tm.parser.parse_args(['add', *row]))
+
+
+def test_index(empty_tm):
+    tm = empty_tm
+    add_tasks(tm, ('A', 'a', 'Дом', '2024-12-01', '0'), ('B', 'b', 'Работа', '2024-12-02', '1'))
+    assert tm.ids[2].title == 'B' and set(tm.categories) == {'дом', 'работа'}
+    tm.edit(tm.parser.parse_args(['edit', '2', 'B', 'b', 'Дом', '2024-12-02', '1', '0']))
+    assert list(tm.categories) == ['дом'] and list(tm.categories['дом']) == [1, 2]
+    tm.delete(tm.parser.parse_args(['del', '-i', '1']))
+    assert list(tm.ids) == [2] and [t.id for t in tm.tasks] == [2]
+
+
+def test_del_bulk(empty_tm):
+    tm = empty_tm
+    add_tasks(tm, *((f'T{i}', 't', 'Дом' if i % 2 else 'Работа', '2024-12-01', '0') for i in range(1, 7)))
+    assert tm.delete(tm.parser.parse_args(['del', '-i', '1', '4', '1'])) == (
+        'Задача «T1» удалена. (ID 1.)\nЗадача «T4» удалена. (ID 4.)\nЗадача с ID 1 не найдена.\n'
+    )
+    assert [t.id for t in tm.tasks] == [2, 3, 5, 6]
+    tm.delete(tm.parser.parse_args(['del', '-c', 'дом']))
+    assert [t.id for t in tm.tasks] == [2, 6] and list(tm.ids) == [2, 6]
+
+
+def reload(tm):
+    tm._open('json')
+    tm = TaskManager()
+    tm._load()
+    return tm
+
+
+def test_journal(empty_tm):
+    tm = empty_tm
+    tm.search(tm.parser.parse_args(['search', '-s', '0']))
+    tm._save()
+    assert not os.path.exists('tasks.json') and not os.path.exists('tasks.journal')
+    add_tasks(tm, ('A', 'a', 'Дом', '2024-12-01', '2'), ('B', 'b', 'Работа', '2024-12-02', '1'))
+    tm._save()
+    snapshot = os.path.getmtime('tasks.json'), os.path.getsize('tasks.json')
+    tm.storage = tm._get_storage('journal')
+    tm.completed(tm.parser.parse_args(['completed', '1']))
+    tm._save()
+    tm.delete(tm.parser.parse_args(['del', '-i', '2']))
+    add_tasks(tm, ('C', 'c', 'Дом', '2024-12-03', '0'))
+    tm._save()
+    assert (os.path.getmtime('tasks.json'), os.path.getsize('tasks.json')) == snapshot
+    tm = reload(tm)
+    assert [(t.id, t.title, t.priority, t.status) for t in tm.tasks] == [
+        (1, 'A', 'Высокий', True), (3, 'C', 'Низкий', False)
+    ]
+    tm.storage = tm._get_storage('journal')
+    tm.storage.limit = 1
+    tm.completed(tm.parser.parse_args(['completed', '3']))
+    tm._save()
+    assert not os.path.exists('tasks.journal')
+    assert [t.status for t in reload(tm).tasks] == [True, True]
+
+
+def test_sqlite(empty_tm):
+    tm = empty_tm
+    add_tasks(tm, ('Тест A', 'Описание', 'Дом', '2024-12-01', '2'), ('B', 'b тест', 'Работа', '2024-12-02', '1'),
+              ('C', 'c', 'Дом', '2024-12-03', '0'))
+    tm._save()
+    assert tm.migrate(tm.parser.parse_args(['migrate'])) == 'Импортировано задач: 3. Смотрите файл tasks.db.\n'
+    expected = tm.search(tm.parser.parse_args(['search', '-t', 'тЕСт', '-c', 'До']))
+    tm._open('sqlite')
+    tm._load()
+    assert tm.tasks == [] and Task.index == 3
+    tm.result = ''
+    assert tm.search(tm.parser.parse_args(['search', '-t', 'тЕСт', '-c', 'До'])) == expected
+    tm.completed(tm.parser.parse_args(['completed', '1']))
+    tm.delete(tm.parser.parse_args(['del', '-c', 'дом']))
+    add_tasks(tm, ('D', 'd', 'Дом', '2024-12-04', '0'))
+    tm._save()
+    tm._open('sqlite')
+    assert [(t.id, t.status) for t in tm._all()] == [(2, False), (4, False)]
+
+
+def test_snapshot(empty_tm):
+    tm = empty_tm
+    tasks = [dict(id=i, title=f'Задача {i}', description='описание', category=('Дом', 'Работа')[i % 2],
+                  due_date='завтра' if i == 4 else f'2024-12-{i:02}', priority='Низкий', status='Не выполнена')
+             for i in (3, 1, 4, 2)]
+    with open('tasks.json', 'w') as file:
+        json.dump(tasks, file)
+    assert tm.migrate(tm.parser.parse_args(['migrate', '--to', 'snapshot'])).startswith('Импортировано задач: 4.')
+    tm._open('snapshot')
+    db = tm.storage
+    assert [t['id'] for t in db.all()] == [1, 2, 3, 4] and db.get(4)['due_date'] == 'завтра' and db.get(5) is None
+    assert [t['id'] for t in db.category('дом')] == [2, 4] and db.max_id() == 4
+    version, size = db.version(), os.path.getsize('tasks.snap')
+    tm.completed(tm.parser.parse_args(['completed', '2', '3']))
+    tm._save()  # Изменены только поля записей: запись на место.
+    assert db.version() == (version[0], version[1] + 1) and os.path.getsize('tasks.snap') == size
+    assert [t.id for t in tm._select(Query(status=1))] == [2, 3]
+    tm.edit(tm.parser.parse_args(['edit', '1', 'Новое название', 'описание', 'Учёба', '2024-12-05', '2', '0']))
+    tm.delete(tm.parser.parse_args(['del', '-i', '3']))
+    add_tasks(tm, ('Ещё', 'задача', 'Дом', '2024-12-06', '1'))
+    tm._save()  # Перезапись с копированием кучи.
+    assert db.version()[1] == version[1] + 2
+    tm._open('snapshot')
+    db = tm.storage
+    assert [(t.id, t.title, t.category, t.status) for t in tm._all()] == [
+        (1, 'Новое название', 'Учёба', False), (2, 'Задача 2', 'Дом', True), (4, 'Задача 4', 'Дом', False),
+        (5, 'Ещё', 'Дом', False)]
+    query = Query(priority=0, due_from='2024-12-01', inner=True, sort='priority')  # Срок «завтра» — строкой.
+    assert [t.id for t in tm._select(query)] == [2, 4]
+    assert 'Снимок: перебор записей' in tm.search(tm.parser.parse_args(['search', '-c', 'Дом', '--explain']))
+    garbage = []  # Байты устаревших строк после каждого сохранения.
+    for n in range(6):  # Когда устаревших строк больше половины кучи, куча строится заново.
+        tm.edit(tm.parser.parse_args(['edit', '1', f'Н{n}' * 20, 'О' * 40, 'Дом', '2024-12-05', '2', '0']))
+        tm._save()
+        garbage.append(db._header()[3])
+    assert garbage[0] > 0 and 0 in garbage and tm._get(1).title == 'Н5' * 20
+    tm.export_csv(tm.parser.parse_args(['csv', '-o', 'export.json']))
+    with open('export.json') as file:
+        assert [t['id'] for t in json.load(file)] == [1, 2, 4, 5]
+
+
+def test_shards(empty_tm):
+    tm = empty_tm
+    tasks = [dict(id=i, title=f'Задача {i}', description='описание', category=('Дом', 'Работа', 'дом')[i % 3],
+                  due_date=f'2024-12-{i:02}', priority='Низкий', status='Не выполнена') for i in (5, 1, 4, 2, 3)]
+    with open('tasks.json', 'w') as file:
+        json.dump(tasks, file)
+    assert tm.migrate(tm.parser.parse_args(['migrate', '--to', 'shards'])).startswith('Импортировано задач: 5.')
+    tm._open('shards')
+    db = tm.storage
+    manifest = db._manifest()
+    assert manifest['last_id'] == 5 and {key: (s['count'], s['min_id'], s['max_id'])
+                                         for key, s in manifest['shards'].items()} == {'дом': (3, 2, 5),
+                                                                                       'работа': (2, 1, 4)}
+    assert [t['id'] for t in db.all()] == [1, 2, 3, 4, 5] and db.get(4)['category'] == 'Работа' and db.get(6) is None
+    files = set(os.listdir('tasks.shards'))
+    tm._open('shards')
+    db = tm.storage
+    assert [t.id for t in tm._select(Query(category='Раб', status=0, inner=True))] == [1, 4]
+    assert list(db.loaded) == [db.manifest['shards']['работа']['file']]  # Прочитан только шард категории.
+    tm._get_category('Работа')
+    assert len(db.loaded) == 1
+    plan = tm.search(tm.parser.parse_args(['search', '-i', '-c', 'Раб', '--explain']))
+    assert 'Шарды: выбор шардов по манифесту: 1 из 2' in plan
+    tm.delete(tm.parser.parse_args(['del', '-c', 'работа']))
+    tm._save()
+    home = db.manifest['shards']['дом']['file']  # Шард другой категории не перезаписан.
+    assert list(db.manifest['shards']) == ['дом'] and home in files and set(os.listdir('tasks.shards')) == {
+        home, 'manifest.json'}
+    tm.delete(tm.parser.parse_args(['del', '-i', '5']))
+    add_tasks(tm, ('Новая', 'задача', 'Учёба', '2024-12-06', '1'))  # ID не повторяет удалённый.
+    tm.edit(tm.parser.parse_args(['edit', '2', 'Перенесена', 'описание', 'Учёба', '2024-12-07', '2', '1']))
+    tm._save()
+    tm._open('shards')
+    assert [(t.id, t.category) for t in tm._all()] == [(2, 'Учёба'), (3, 'Дом'), (6, 'Учёба')]
+    assert tm.storage.max_id() == 6 and len(os.listdir('tasks.shards')) == 3
+    assert [t.id for t in tm._select(Query(priority=2, sort='priority'))] == [2]
+    assert [t.id for t in tm._get_category('ДОМ')] == [3]
+    reader = storage.ShardedStorage('tasks.shards', ())
+    reader._manifest()  # Манифест прочитан, шарды ещё нет.
+    tm.completed(tm.parser.parse_args(['completed', '3']))  # Другой процесс заменяет шард (старый файл удалён).
+    with tm.storage.lock(exclusive=True):
+        tm._save()
+    assert [(t['id'], t['status']) for t in reader._shard('дом').values()] == [(3, True)]  # Не FileNotFoundError.
+
+
+def test_iter_json_array():
+    data = [{'id': i, 'title': 'т' * i, 'n': [1, {'x': ' , ] '}]} for i in range(1, 30)]
+    for text in (json.dumps(data), json.dumps(data, indent=4, ensure_ascii=False), ' [ ] ', ''):
+        for chunk in (1, 7, 1 << 16):
+            assert list(storage.iter_json_array(io.StringIO(text), chunk)) == (data if len(text) > 5 else [])
+    with pytest.raises(ValueError):
+        list(storage.iter_json_array(io.StringIO(json.dumps(data)[:-3]), 7))
+
+
+def test_load_unordered(empty_tm):
+    tasks = [dict(id=i, title=f'T{i}', description='', category='Дом', due_date='2024-12-01', priority='Низкий',
+                  status='Не выполнена') for i in (3, 1, 2)]
+    with open('tasks.json', 'w') as file:
+        json.dump(tasks, file)
+    with open('tasks.journal', 'w', encoding='utf8') as file:
+        file.write(json.dumps({'put': [dict(tasks[0], title='T3*', id=3), dict(tasks[0], id=5)], 'del': [1]}) + '\n')
+    tm = reload(empty_tm)
+    assert [(t.id, t.title) for t in tm.tasks] == [(2, 'T2'), (3, 'T3*'), (5, 'T3')] and Task.index == 5
+
+
+def test_add_without_load(empty_tm):
+    tm = empty_tm
+    add_tasks(tm, ('A', 'a', 'Дом', '2024-12-01', '2'))
+    tm._save()
+    assert not tm.loaded and tm.tasks[0].id == 1
+    add_tasks(tm, ('B', 'b', 'Дом', '2024-12-02', '1'), ('C', 'c', 'Дом', '2024-12-03', '0'))
+    tm._save()
+    with open('tasks.json') as file:
+        appended = file.read()
+    tm = reload(tm)
+    assert [t.id for t in tm.tasks] == [1, 2, 3]
+    tm.storage.save(tm.tasks, {})
+    with open('tasks.json') as file:
+        assert file.read() == appended
+    tm._open('journal')
+    add_tasks(tm, ('D', 'd', 'Дом', '2024-12-04', '0'))
+    tm._save()
+    assert not tm.loaded and os.path.exists('tasks.journal')
+    assert [t.id for t in reload(tm).tasks] == [1, 2, 3, 4]
+
+
+def test_task_slots(monkeypatch):
+    monkeypatch.setattr(Task, 'index', 0)
+    task = Task('A', 'a', 'Дом', '2024-12-01', 2, id=100000)
+    assert not hasattr(task, '__dict__') and task.priority == 'Высокий' and task._priority == 2
+    task.priority = 'Низкий'
+    assert task.as_dict() == dict(id=100000, title='A', description='a', category='Дом', due_date='2024-12-01',
+                                  priority='Низкий', status=False)
+
+
+def test_columnar(empty_tm):
+    tasks = [dict(id=i, title=f'T{i}', description='тест' * (i % 2), category=('Дом', 'Работа', 'Дом')[i % 3],
+                  due_date='2024-12-01' if i != 4 else 'завтра', priority=i % 3, status=bool(i % 4))
+             for i in (5, 1, 4, 2, 3)]
+    with open('tasks.json', 'w') as file:
+        json.dump(tasks, file)
+    commands = (['current'], ['search', '-t', 'ТЕСТ', '-c', 'Раб'], ['search', '-i', '-t', 'тест', '-s', '1'],
+                ['search', '-c', 'Д'], ['csv'])
+    expected = []
+    for command in commands:
+        tm = reload(empty_tm)
+        args = tm.parser.parse_args(command)
+        expected.append(args.func(args))
+    with open('tasks.csv') as file:
+        expected.append(file.read())
+    for command, result in zip(commands, expected):
+        empty_tm._open('json')
+        tm = TaskManager(columnar=True)
+        args = tm.parser.parse_args(command)
+        assert args.func(args) == result
+        assert tm.table is not None and not tm.tasks
+    with open('tasks.csv') as file:
+        assert file.read() == expected[-1]
+
+
+def test_text_index(empty_tm):
+    tm = empty_tm
+    add_tasks(tm, *((f'Задача {i} {"ОТЧЁТ" if i % 3 else "план"}', f'описание {i * 7}', 'Дом', '2024-12-01', '0')
+                    for i in range(1, 40)))
+    queries = ('отчёт', 'ПЛАН', 'ча 1', ' 7', '49', 'нет такого', '"', 'а')
+
+    def check():
+        for q in queries:
+            for inner in (False, True):
+                query = Query(q, inner=inner)
+                assert [t.id for t in tm._select(query)] == [t.id for t in tm.tasks if query.match(t)]
+                query = Query(q, status=1, inner=True)
+                assert [t.id for t in tm._select(query)] == [t.id for t in tm.tasks if query.match(t)]
+
+    explain = tm.search(tm.parser.parse_args(['search', '-t', 'отчёт', '--explain']))
+    assert 'Перебор всех задач' in explain  # Отдельная команда не строит индекс ради одного поиска.
+    check()
+    assert tm.texts is None
+    tm.resident = True  # Пакетный режим, оболочка, демон.
+    check()
+    assert tm.texts is not None
+    tm.edit(tm.parser.parse_args(['edit', '3', 'Новый отчёт', 'без плана', 'Дом', '2024-12-01', '0', '1']))
+    tm.delete(tm.parser.parse_args(['del', '-i', '4', '5']))
+    add_tasks(tm, ('Ещё план', 'x', 'Дом', '2024-12-01', '0'))
+    tm.completed(tm.parser.parse_args(['completed', '1', '2', '3']))
+    check()
+    tm._save()
+    tm.migrate(tm.parser.parse_args(['migrate']))
+    tm._open('sqlite')
+    tm.edit(tm.parser.parse_args(['edit', '6', 'Переименована', 'пусто', 'Дом', '2024-12-01', '0', '0']))
+    tm._save()
+    assert [t.id for t in tm._select(Query('переимен'))] == [6]
+    assert 6 not in [t.id for t in tm._select(Query('отчёт'))]
+
+
+def test_query(empty_tm):
+    tm = empty_tm
+    add_tasks(tm, *((f'Задача {i}', f'описание {"отчёт" if i % 4 else "план"}', ('Дом', 'Работа', 'Учёба')[i % 3],
+                     f'2024-12-{i % 28 + 1:02}', str(i % 3)) for i in range(1, 60)))
+    tm.completed(tm.parser.parse_args(['completed', *map(str, range(1, 60, 5))]))
+    tm._save()
+    queries = (
+        [], ['-i'], ['-t', 'отчёт'], ['-c', 'Раб', '-t', 'план'], ['-i', '-c', 'Раб', '-t', 'план'],
+        ['-i', '-c', 'Дом', '-p', '2', '--due-from', '2024-12-05', '--due-to', '2024-12-20'],
+        ['-c', 'Учёба', '-s', '1'], ['-i', '-s', '0', '--limit', '5', '--offset', '3'], ['-p', '0', '--limit', '4'],
+        ['-c', 'о', '-t', 'ча'], ['-i', '-t', 'за', '--due-to', '2024-12-10'],
+    )
+    expected = {}
+    for q in queries:
+        args = tm.parser.parse_args(['search', *q])
+        query = Query(args.text, args.category, args.status, args.inner, args.priority, args.due_from, args.due_to)
+        found = [t.id for t in tm.tasks if query.match(t)]
+        expected[tuple(q)] = found[args.offset:None if args.limit is None else args.offset + args.limit]
+        query.limit, query.offset = args.limit, args.offset
+        assert [t.id for t in tm._select(query)] == expected[tuple(q)]
+    plan = tm.search(tm.parser.parse_args(['search', '-i', '-c', 'Раб', '-t', 'план', '--explain']))
+    assert 'индекс категорий «Раб»' in plan or 'триграммный индекс текста «план»' in plan
+    assert 'Перебор всех задач' in tm.search(tm.parser.parse_args(['search', '-s', '1', '-t', 'план', '--explain']))
+    assert tm.search(tm.parser.parse_args(['search', '--due-from', 'day'])).startswith('Ошибка')
+    tm.migrate(tm.parser.parse_args(['migrate']))
+    tm.migrate(tm.parser.parse_args(['migrate', '--to', 'snapshot']))
+    for name, columnar in (('json', True), ('snapshot', False), ('sqlite', False)):
+        tm._open(name)
+        tm.columnar = columnar
+        for q in queries:
+            args = tm.parser.parse_args(['search', *q])
+            query = Query(args.text, args.category, args.status, args.inner, args.priority, args.due_from,
+                          args.due_to, args.limit, args.offset)
+            assert [t.id for t in tm._select(query)] == expected[tuple(q)], (name, q)
+    assert 'SQLite:' in tm.search(tm.parser.parse_args(['search', '-i', '-p', '1', '--explain']))
+
+
+def test_sort(empty_tm, monkeypatch):
+    tm = empty_tm
+    monkeypatch.setattr(TaskManager, '_yesterday', staticmethod(lambda: '2024-12-10'))
+    add_tasks(tm, *((f'Задача {i}', 'описание', ('Дом', 'Работа')[i % 2], f'2024-12-{(i * 7) % 28 + 1:02}', str(i % 3))
+                    for i in range(1, 41)))
+    tm.completed(tm.parser.parse_args(['completed', *map(str, range(1, 41, 3))]))
+    tm._save()
+    queries = (
+        ('current', '--sort', 'due_date', '--top', '5'), ('current', '--sort', 'priority'),
+        ('current', '--overdue', '--sort', 'priority', '--top', '3'),
+        ('search', '-i', '-c', 'Дом', '--sort', 'due_date', '--top', '4'),
+        ('search', '--overdue', '--sort', 'due_date'),
+        ('search', '-i', '--due-from', '2024-12-20', '--sort', 'priority'),
+        ('search', '-p', '2', '--sort', 'due_date', '--top', '3', '--offset', '2'),
+    )
+
+    def expected(argv):
+        args = tm.parser.parse_args(argv)
+        if argv[0] == 'current':
+            tasks = [t for t in tm.tasks if not t.status and (not args.overdue or t.due_date <= '2024-12-10')]
+            limit, offset = args.top, 0
+        else:
+            query = tm._get_query(args)
+            tasks = [t for t in tm.tasks if query.match(t)]
+            limit, offset = query.limit, query.offset
+        tasks.sort(key=Query.KEYS[args.sort])
+        return [t.id for t in tasks[offset:None if limit is None else offset + limit]]
+
+    def found(argv):
+        args = tm.parser.parse_args(argv)
+        if argv[0] == 'current':
+            args = tm.parser.parse_args(['search', '-i', '-s', '0', *argv[1:]])
+        return [t.id for t in tm._select(tm._get_query(args))]
+
+    for argv in queries:
+        assert found(argv) == expected(argv), argv
+    assert set(tm.orders) == {'due_date', 'priority'}
+    # Индексы поддерживаются при изменении, добавлении и удалении задач.
+    tm.edit(tm.parser.parse_args(['edit', '2', 'Задача 2', 'описание', 'Дом', '2024-11-01', '2', '0']))
+    add_tasks(tm, ('Новая', 'задача', 'Дом', '2024-11-02', '2'))
+    tm.delete(tm.parser.parse_args(['del', '-i', '5']))
+    for name in tm.orders:
+        assert list(tm.orders[name]) == [t.id for t in sorted(tm.tasks, key=Query.KEYS[name])]
+    for argv in queries:
+        assert found(argv) == expected(argv), argv
+    assert found(queries[0])[:2] == [2, 41]
+    assert 'Обход упорядоченного индекса' in tm.search(tm.parser.parse_args(['search', '-i', '--sort', 'priority',
+                                                                            '--explain']))
+    assert 'диапазон упорядоченного индекса сроков' in tm.search(tm.parser.parse_args(['search', '--overdue',
+                                                                                       '--explain']))
+    tm._save()
+    results = {argv: expected(argv) for argv in queries}
+    tm.migrate(tm.parser.parse_args(['migrate']))
+    tm.migrate(tm.parser.parse_args(['migrate', '--to', 'snapshot']))
+    for name, columnar in (('json', True), ('snapshot', False), ('sqlite', False)):
+        tm._open(name)
+        tm.columnar = columnar
+        for argv in queries:
+            assert found(argv) == results[argv], (name, argv)
+
+
+def test_parallel(empty_tm, monkeypatch):
+    tm = empty_tm
+    monkeypatch.setattr('TaskManager.SHARD_MIN', 10)
+    add_tasks(tm, *((f'Задача {"ё" * (i % 7)}{i}', f'описание {"отчёт" if i % 4 else "план"}',
+                     ('Дом', 'Работа')[i % 2], f'2024-12-{i % 28 + 1:02}', str(i % 3)) for i in range(1, 50)))
+    tm.completed(tm.parser.parse_args(['completed', *map(str, range(1, 50, 4))]))
+    assert tm._select_parallel(Query('план'), 3) is not None and tm._select_parallel(Query('план'), 9) is not None
+    widths = dict(tm.name_length)  # Длины строк-ячеек по заголовкам: растут с каждой таблицей.
+    for argv in (['search', '-t', 'отчёт'], ['search', '-t', 'план', '-s', '1'],
+                 ['search', '-i', '-c', 'Дом', '-p', '1'], ['search', '-t', 'нет такого'],
+                 ['search', '-i', '-s', '0', '--sort', 'priority', '--top', '5'],
+                 ['search', '-c', 'Раб', '-s', '0', '--sort', 'due_date', '--offset', '3'],
+                 ['search', '-t', 'отчёт', '--sort', 'priority', '--top', '4'],
+                 ['current'], ['current', '--sort', 'due_date', '--top', '3']):
+        tm.name_length = dict(widths)
+        args = tm.parser.parse_args(argv)
+        expected = args.func(args)
+        tm.name_length = dict(widths)
+        TaskManager.texts = None  # Триграммный индекс не построен: поиск по тексту — параллельный.
+        args = tm.parser.parse_args([*argv, '--jobs', '3'])
+        assert args.func(args) == expected, argv
+
+
+def test_parse_date(monkeypatch):
+    import dateutil.parser as date_parser
+    TaskManager._parse_free_date.cache_clear()
+    for value in ('2024-12-10', '10.12.2024', 'Dec 10 2024', '2024/12/10', '20241210'):
+        assert TaskManager._parse_date(value) == date_parser.parse(value).strftime('%Y-%m-%d')
+    with pytest.raises(ValueError):
+        TaskManager._parse_date('2024-02-30')
+    calls = []
+    monkeypatch.setattr(date_parser, 'parse', lambda value: calls.append(value) or date_parser.parser().parse(value))
+    TaskManager._parse_free_date.cache_clear()
+    for _ in range(3):
+        assert TaskManager._parse_date('2024-12-10') == '2024-12-10'
+        assert TaskManager._parse_date('10 Dec 2024') == '2024-12-10'
+    assert calls == ['10 Dec 2024']
+    task = Task('a', 'b', 'c', '2024-12-10', 0, 1)
+    assert task.day == date(2024, 12, 10).toordinal()
+    assert task.due_date == task.as_dict()['due_date'] == '2024-12-10'
+    task.due_date = 'когда-нибудь'
+    assert task.day == 0 and task.due_date == 'когда-нибудь'
+
+
+def test_import(empty_tm):
+    tm = empty_tm
+    add_tasks(tm, ('Старая', 'задача', 'Дом', '2024-12-01', '1'))
+    tm.completed(tm.parser.parse_args(['completed', '1']))
+    tm.export_csv(tm.parser.parse_args(['csv']))
+    rows = [dict(id=7, title=f'Задача {i}', description='описание', category='Работа', due_date='10 Dec 2024',
+                 priority=i % 3, status=i % 2) for i in range(25)]
+    with open('tasks.ndjson', 'w', encoding='utf8') as file:
+        for row in rows:
+            file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        file.write('{"title": "без полей"}\n\n{не JSON\n')
+        file.write(json.dumps(dict(rows[0], priority='Высокий', status='Выполнена', due_date='день')) + '\n')
+        file.write(json.dumps(dict(rows[0], priority=1.0)) + '\n' + json.dumps(dict(rows[0], priority=True)) + '\n')
+    with open('tasks_import.json', 'w', encoding='utf8') as file:
+        json.dump(rows[:3], file)
+    res = tm.import_tasks(tm.parser.parse_args(['import', 'tasks.csv']))
+    assert res == 'Импортировано задач: 1.\n'
+    res = tm.import_tasks(tm.parser.parse_args(['import', 'tasks.ndjson']))
+    assert res.startswith('Импортировано задач: 25.\nПропущено записей с ошибками: 5.\nЗапись 26: нет поля')
+    assert 'Запись 28: неверный JSON.' in res and "Запись 29: неверный срок выполнения 'день'." in res
+    assert res.endswith('Запись 30: неверный приоритет 1.0.\nЗапись 31: неверный приоритет True.\n')
+    assert tm.import_tasks(tm.parser.parse_args(['import', 'tasks_import.json', '-w', '2'])) == (
+        'Импортировано задач: 3.\n')
+    assert tm.import_tasks(tm.parser.parse_args(['import', 'tasks.txt'])) == 'Файл tasks.txt не найден.\n'
+    tm._save()
+    tm = reload(tm)
+    assert [t.id for t in tm.tasks] == list(range(1, 31))
+    assert tm.ids[2].as_dict() == dict(tm.ids[1].as_dict(), id=2)
+    assert [(t.due_date, t.priority, t.status) for t in tm.tasks[2:5]] == [
+        ('2024-12-10', 'Низкий', False), ('2024-12-10', 'Средний', True), ('2024-12-10', 'Высокий', False)]
+    with open('broken.json', 'w', encoding='utf8') as file:
+        file.write('[' + json.dumps(rows[0]) + ', 1')
+    assert tm.import_tasks(tm.parser.parse_args(['import', 'broken.json'])).startswith('Ошибка чтения файла')
+    assert not tm.changes and Task.index == 30
+
+
+def test_import_broken(empty_tm, capsys, monkeypatch):
+    tm = empty_tm
+    add_tasks(tm, *[(f'Задача {i}', 'описание', 'Дом', '2024-12-01', '0') for i in range(3)])
+    tm._save()
+    tm._reset()
+    monkeypatch.setattr('TaskManager.IMPORT_BATCH', 2)  # Первый пакет проверен до ошибки структуры.
+    row = json.dumps(dict(title='T', description='d', category='Дом', due_date='2024-12-01', priority=0, status=0))
+    with open('bad.json', 'w', encoding='utf8') as file:
+        file.write(f'[{row}, {row}, {row}, 1')
+    with open('bad.csv', 'w', encoding='utf8') as file:
+        file.write('title,description\n"' + 'x' * 200000 + '",d\n')
+    with open('cmds.txt', 'w', encoding='utf8') as file:
+        file.write('import bad.json\nimport bad.csv\nadd Новая описание Дом 2024-12-01 0\n')
+    capsys.readouterr()
+    assert tm.run(['batch', 'cmds.txt']) == 1
+    out = capsys.readouterr()
+    assert 'Задача «Новая» добавлена. Присвоен ID 4.' in out.out  # ID не повторяет сохранённые.
+    assert out.err.startswith('Строка 1: Ошибка чтения файла bad.json: ')
+    assert out.err.splitlines()[1].startswith('Строка 2: Ошибка чтения файла bad.csv: field larger than field limit')
+
+
+def test_export(empty_tm, capsys):
+    tm = empty_tm
+    add_tasks(tm, *((f'Задача {i}', 'описание, "с запятой"', ('Дом', 'Работа')[i % 2], '2024-12-01', str(i % 3))
+                    for i in range(1, 26)))
+    tm.completed(tm.parser.parse_args(['completed', '3', '4']))
+
+    def export(*argv):
+        return tm.export_csv(tm.parser.parse_args(['csv', *argv]))
+
+    assert export() == 'Выгружено задач: 25. Смотрите файл tasks.csv.'
+    with open('tasks.csv', encoding='utf8') as file:
+        expected = io.StringIO()
+        writer = csv.DictWriter(expected, storage.FIELDS, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(task.as_dict() for task in tm.tasks)
+        assert file.read() == expected.getvalue()
+    assert 'строк/с' in capsys.readouterr().err
+    res = export('-o', 'work.ndjson.gz', '-c', 'Раб', '-s', '0')
+    assert res == 'Выгружено задач: 12. Смотрите файл work.ndjson.gz.'
+    with gzip.open('work.ndjson.gz', 'rt', encoding='utf8') as file:
+        rows = [json.loads(line) for line in file]
+    assert rows == [t.as_dict() for t in tm.tasks if t.category == 'Работа' and not t.status]
+    export('-o', 'tasks.columns', '-a', '-p', '2', '-t', 'Задача 1')
+    with open('tasks.columns', encoding='utf8') as file:
+        columns = json.loads(file.read())
+    assert columns['id'] == [t.id for t in tm.tasks if t.priority == 'Высокий' or 'Задача 1' in t.title]
+    assert export('-o', 'inc.csv', '--incremental') == 'Выгружено задач: 25. Смотрите файл inc.csv.'
+    assert export('-o', 'inc.csv', '--incremental') == 'Выгружено задач: 0. Смотрите файл inc.csv.'
+    tm.completed(tm.parser.parse_args(['completed', '7']))
+    tm.delete(tm.parser.parse_args(['del', '-i', '1', '2']))
+    add_tasks(tm, ('Новая', 'задача', 'Дом', '2024-12-02', '0'))
+    assert export('-o', 'inc.csv', '--incremental') == 'Выгружено задач: 2. Смотрите файл inc.csv.'
+    with open('inc.csv', encoding='utf8') as file:
+        assert [row['id'] for row in csv.DictReader(file)] == ['7', '26']
+    capsys.readouterr()
+    assert export('-o', '-', '-f', 'ndjson', '-t', 'Новая') is None
+    assert json.loads(capsys.readouterr().out)['id'] == 26
+
+
+def stress_worker(name: str, worker: int, count: int):
+    """
+    Процесс теста одновременного доступа: добавляет задачи и отмечает их выполненными.
+    """
+    tm = TaskManager(name)
+    tm._reset()
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        for k in range(count):
+            tm.run(['--storage', name, 'add', f'W{worker}-{k}', 'stress', 'Тест', '2024-12-01', '0'])
+            i = out.getvalue().rsplit('ID ', 1)[1].split('.')[0]
+            tm.run(['--storage', name, 'completed', i])
+
+
+@pytest.mark.parametrize('name', ['json', 'journal', 'sqlite', 'snapshot', 'shards'])
+def test_concurrent(empty_tm, name):
+    workers, count = 4, 15
+    ctx = multiprocessing.get_context('fork')
+    processes = [ctx.Process(target=stress_worker, args=(name, w, count)) for w in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    tm = TaskManager(name)
+    tm._reset()
+    tm._load()
+    tasks = list(tm._all())
+    assert sorted(t.id for t in tasks) == list(range(1, workers * count + 1))  # Ни одна задача не потеряна.
+    assert sorted(t.title for t in tasks) == sorted(f'W{w}-{k}' for w in range(workers) for k in range(count))
+    assert all(t.status for t in tasks)  # Ни одна отметка не потеряна.
+
+
+def test_conflict(empty_tm):
+    tm = empty_tm
+    add_tasks(tm, ('A', 'a', 'Дом', '2024-12-01', '0'), ('B', 'b', 'Дом', '2024-12-01', '0'))
+    tm._save()
+    other = storage.JsonStorage('tasks.json', 'tasks.journal')
+    tm.completed(tm.parser.parse_args(['completed', '1']))
+    other.save([Task('A', 'a', 'Дом', '2024-12-01', 0, 1), Task('C', 'c', 'Дом', '2024-12-01', 0, 3)], {})
+    with pytest.raises(storage.Conflict):
+        tm._save()
+    tm._reset()
+    args = tm.parser.parse_args(['completed', '1'])
+    completed = args.func
+
+    def func(args):  # Другой процесс изменяет хранилище во время первого выполнения команды.
+        res = completed(args)
+        if not tm.conflicts:
+            other.save([Task('A', 'a', 'Дом', '2024-12-01', 0, 1), Task('D', 'd', 'Дом', '2024-12-01', 0, 4)], {})
+        return res
+
+    args.func = func
+    assert tm._execute(args) == 'Задача «A» отмечена как «Выполнена».\n' and tm.conflicts == 1
+    tm = reload(tm)
+    assert [(t.id, t.status) for t in tm.tasks] == [(1, True), (4, False)]
+
+
+def serve_worker(interval: str):
+    tm = TaskManager()
+    tm._reset()
+    with contextlib.redirect_stderr(io.StringIO()):
+        tm.run(['serve', '-S', 'test.sock', '-i', interval])
+
+
+def test_serve(empty_tm, capsys):
+    tm = empty_tm
+    add_tasks(tm, ('A', 'a', 'Дом', '2024-12-01', '0'), ('B', 'b', 'Работа', '2024-12-02', '1'))
+    tm._save()
+    assert not forward(['current'], 'test.sock')  # Демон не запущен.
+    daemon = multiprocessing.get_context('fork').Process(target=serve_worker, args=('60',))
+    daemon.start()
+    try:
+        # Файл сокета появляется (bind) чуть раньше, чем демон принимает соединения (listen).
+        while not os.path.exists('test.sock') or not forward(['--version'], 'test.sock'):
+            time.sleep(0.01)
+        capsys.readouterr()
+        assert forward(['completed', '1'], 'test.sock')
+        assert capsys.readouterr().out == 'Задача «A» отмечена как «Выполнена».\n\n'
+        assert forward(['search', '-s', '1'], 'test.sock')
+        assert ' 1 | A ' in capsys.readouterr().out
+        assert forward(['csv', '-o', 'tasks.ndjson.gz'], 'test.sock')
+        assert 'строк/с' in capsys.readouterr().err
+        with gzip.open('tasks.ndjson.gz', 'rt', encoding='utf8') as file:
+            assert [json.loads(line)['status'] for line in file] == [True, False]
+        assert not forward(['add_inter'], 'test.sock') and not forward(['serve', '-S', 'test.sock'], 'test.sock')
+        with open('tasks.json', encoding='utf8') as file:  # Без блокировки: демон держит её до сохранения.
+            assert json.load(file)[0]['status'] is False  # Изменение ещё не сохранено (сохранение раз в 60 с).
+    finally:
+        os.kill(daemon.pid, signal.SIGTERM)
+        daemon.join()
+    assert not os.path.exists('test.sock')
+    assert reload(tm).ids[1].status is True  # Сохранено при остановке демона.
+
+
+@pytest.mark.parametrize('name', ['json', 'sqlite'])
+def test_batch(empty_tm, capsys, name):
+    tm = empty_tm
+    tm._open(name)
+
+    def stored():
+        tm._reset()
+        return [(t.id, t.status) for t in tm._all()]
+
+    with open('cmds.txt', 'w', encoding='utf8') as file:
+        file.write('# Пакет\nadd "Задача 1" описание Дом 2024-12-01 0\nadd "Задача 2" описание Работа 2024-12-02 1\n\n'
+                   'completed 1 7\nedit 2 X Y Дом day 1 0\nadd_inter\nadd "1\nsearch -c Дом\n')
+    capsys.readouterr()
+    assert tm.run(['--storage', name, 'batch', 'cmds.txt']) == 1  # Код завершения: есть ошибки.
+    out = capsys.readouterr()
+    assert out.out.endswith('Выполнено команд: 7, с ошибками: 4.\n\n') and ' 1 | Задача 1 ' in out.out
+    assert out.err.splitlines() == [
+        'Строка 5: Задача с ID 7 не найдена.',
+        'Строка 6: Ошибка в введённых данных! Проверьте дату срока выполнения и статус.',
+        'Строка 7: интерактивные команды, serve, batch и shell в пакете не выполняются',
+        'Строка 8: No closing quotation',
+    ]
+    assert stored() == [(1, True), (2, False)]
+    with open('cmds.txt', 'w', encoding='utf8') as file:
+        file.write('add A a Дом 2024-12-01 0\ncompleted 1\ndel -i 2\nadd B b Дом 2024-12-01 x\n'
+                   'add C c Дом 2024-12-01 0\n')
+    tm.run(['--storage', name, 'batch', '--atomic', 'cmds.txt'])
+    out = capsys.readouterr().out
+    assert out.endswith('Ошибка в строке 4. Изменения не сохранены (выполнено команд до ошибки: 3).\n\n')
+    assert stored() == [(1, True), (2, False)]
+    with open('cmds.txt', 'w', encoding='utf8') as file:
+        file.write('add "Ошибка в отчёте" a Дом 2024-12-01 0\ncompleted 3\ndel -i 2\n')  # Слова ошибок в данных.
+    assert tm.run(['--storage', name, 'batch', '-a', 'cmds.txt']) == 0
+    assert capsys.readouterr().out.endswith('Выполнено команд: 3, с ошибками: 0.\n\n')
+    assert stored() == [(1, True), (3, True)]
+
+
+def test_session_widths(empty_tm, capsys):
+    tm = empty_tm
+    tm.run(['add', 'Очень длинное название задачи по работе', 'a', 'Работа', '2024-12-01', '0'])
+    tm.run(['add', 'B', 'b', 'Дом', '2024-12-01', '0'])
+    capsys.readouterr()
+    tm.run(['search', '-c', 'Дом'])
+    alone = capsys.readouterr().out
+    with open('cmds.txt', 'w', encoding='utf8') as file:
+        file.write('search -c Работа\nsearch -c Дом\n')
+    tm.run(['batch', 'cmds.txt'])  # Столбцы второй таблицы не шире, чем при отдельном запуске.
+    assert capsys.readouterr().out.endswith(alone + 'Выполнено команд: 2, с ошибками: 0.\n\n')
+    tm._request(['search', '-c', 'Работа'])
+    assert tm._request(['search', '-c', 'Дом'])[1].decode() == alone
+
+
+class ShellInput:
+    """
+    Ввод оболочки: строки команд; функции из списка выполняются между командами.
+    """
+
+    def __init__(self, *lines):
+        self.lines = list(lines)
+
+    def isatty(self) -> bool:
+        return False
+
+    def readline(self) -> str:
+        while self.lines and callable(self.lines[0]):
+            self.lines.pop(0)()
+        return self.lines.pop(0) + '\n' if self.lines else ''
+
+
+def test_shell(empty_tm, capsys, monkeypatch):
+    tm = empty_tm
+    add_tasks(tm, ('A', 'a', 'Дом', '2024-12-01', '0'), ('B', 'b', 'Проект 1', '2024-12-02', '1'))
+    tm._save()
+    stored = []  # Статусы задач в JSON-файле по ходу сеанса.
+
+    def store():
+        with open('tasks.json', encoding='utf8') as file:
+            stored.append([t['status'] for t in json.load(file)])
+
+    def locked():  # До сохранения хранилище заблокировано оболочкой.
+        with open('tasks.json.lock') as file, pytest.raises(BlockingIOError):
+            fcntl.flock(file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+
+    monkeypatch.setattr('sys.stdin', ShellInput('completed 1', store, locked, 'search -s 1', '', 'bad', 'serve',
+                                                'save', store, 'add C c Дом 2024-12-03 2', 'quit', 'completed 2'))
+    capsys.readouterr()
+    tm.run(['shell'])
+    out = capsys.readouterr()
+    assert stored == [[False, False], [True, False]] and ' 1 | A ' in out.out
+    assert out.out.endswith('Изменения сохранены.\nЗадача «C» добавлена. Присвоен ID 3.\n\n'
+                            'Сеанс завершён. Изменения сохранены.\n\n')
+    errors = [row for row in out.err.splitlines() if row.startswith('Ошибка')]
+    assert len(errors) == 2 and 'invalid choice' in errors[0]
+    assert errors[1] == 'Ошибка: serve, batch и shell в оболочке не выполняются'
+    stored.clear()
+    monkeypatch.setattr('sys.stdin', ShellInput('completed 2', store, 'current'))
+    tm.run(['shell', '--interval', '0'])  # Сохранение после каждой команды.
+    assert stored == [[True, True, False]] and capsys.readouterr().out.endswith('Сеанс завершён.\n\n')
+    assert tm._complete('', 'c') == ['completed', 'current', 'csv']
+    assert tm._complete('del -c Дом', "'пр") == ["'Проект 1'"]
+    assert tm._complete('add X "y z"', 'д') == ['Дом'] and tm._complete('add X', 'д') == []
+    assert tm._complete('edit', '') == ['1', '2', '3'] and tm._complete('del -i 1', '') == ['1', '2', '3']
+    assert tm._complete('search -i', '--ca') == ['--category'] and tm._complete('search -c Дом', '') == []
+
+
+@pytest.mark.parametrize('name', ['json', 'journal', 'sqlite'])
+def test_stats(empty_tm, capsys, name):
+    tm = empty_tm
+    for argv in (['add', 'A', 'a', 'Дом', '2000-01-01', '2'], ['add', 'Длинное', 'b', 'Работа', '2999-01-01', '0'],
+                 ['add', 'C', 'c', 'Дом', '2000-01-02', '1'], ['completed', '1'], ['stats'],
+                 ['edit', '2', 'B', 'b', 'Дом', '2001-01-01', '1', '0'], ['del', '-i', '3'],
+                 ['add', 'D', 'd', 'Учёба', '2999-01-01', '0']):
+        tm.run(['--storage', name, *argv])
+    out = capsys.readouterr().out
+    assert 'Счётчики не сохранены или устарели' in out and 'Всего задач: 3.' in out  # Первый stats — пересчёт.
+    tm.run(['--storage', name, 'stats'])
+    out = capsys.readouterr().out
+    assert out.startswith('Всего задач: 3.\nПо статусам: Не выполнена — 2, Выполнена — 1.\n')
+    assert 'Просроченные: 1.\nПо категориям:\n    Дом — 2\n    Учёба — 1\n' in out and 'Название — 1,' in out
+    tm._reset()
+    tm._load(full=False)
+    stats = tm.stats
+    assert stats == TaskStats(tm._all()) and stats.priorities == [1, 1, 1]
+    if name == 'sqlite':  # Счётчики испорчены: расхождение находит проверка.
+        db = storage.SqliteStorage('tasks.db', ())  # Другое соединение (процесс).
+        db.db.execute("UPDATE stats SET data = json_set(data, '$.total', 5)")
+        db.db.commit()
+        tm.run(['--storage', name, 'stats', '--check'])
+        assert capsys.readouterr().out.startswith('Счётчики расходились со списком задач (total): пересчитаны.\n')
+    else:  # Список изменён без обновления счётчиков: они устарели.
+        storage.JsonStorage('tasks.json', 'tasks.journal').save([], {})
+        tm.run(['--storage', name, 'stats'])
+        out = capsys.readouterr().out
+        assert out.startswith('Счётчики не сохранены или устарели') and 'Всего задач: 0.' in out
+    tm.run(['--storage', name, 'stats', '--check'])
+    assert capsys.readouterr().out.startswith('Счётчики согласованы со списком задач.\n')
+
+
+def test_undo(empty_tm, capsys, monkeypatch):
+    tm = empty_tm
+    for argv in (['add', 'A', 'a', 'Дом', '2030-01-01', '1'], ['add', 'B', 'b', 'Работа', '2030-01-02', '2'],
+                 ['completed', '1']):
+        tm.run(argv)
+    version = tm.storage.version()
+    tm.run(['edit', '2', 'B', 'b', 'Работа', '2030-01-02', '2', '0'])  # Без изменений: хранилище не перезаписано.
+    assert tm.storage.version() == version and len(tm.storage.load_history()) == 3
+    tm.run(['del', '-i', '2'])
+    capsys.readouterr()
+    tm.run(['history', '-n', '2'])
+    assert capsys.readouterr().out.endswith(
+        ' completed:\n    изменена задача с ID 1: Статус: Не выполнена → Выполнена\n'
+        f'{tm.storage.load_history()[-1]['time']} del:\n    удалена задача с ID 2 «B»\n\n')
+    tm.run(['undo', '-n', '2'])
+    reload(tm)
+    assert [t.as_dict() for t in tm.tasks] == [
+        dict(id=1, title='A', description='a', category='Дом', due_date='2030-01-01', priority='Средний', status=False),
+        dict(id=2, title='B', description='b', category='Работа', due_date='2030-01-02', priority='Высокий',
+             status=False)]
+    assert [r['command'] for r in tm.storage.load_history()] == ['add', 'add']  # Отменённые записи удалены.
+    tm._reset()
+    storage.JsonStorage('tasks.json', 'tasks.journal').save([], {})  # Изменение без учёта в истории.
+    tm.run(['undo'])
+    assert 'изменена после команды add' in capsys.readouterr().out
+    tm._reset()
+    assert [r['command'] for r in tm.storage.load_history()] == ['add', 'add']
+    monkeypatch.setattr('TaskManager.HISTORY_TASKS', 1)  # Большие изменения очищают историю.
+    for argv in (['add', 'C', 'c', 'Дом', '2030-01-03', '0'], ['add', 'D', 'd', 'Дом', '2030-01-04', '0'],
+                 ['del', '-c', 'Дом'], ['add', 'E', 'e', 'Дом', '2030-01-05', '0']):
+        tm.run(argv)
+    assert [r['command'] for r in tm.storage.load_history()] == ['add']
+
+
+def test_profile(empty_tm, capsys):
+    tm = empty_tm
+    tm.run(['add', 'A', 'a', 'Дом', '2024-12-01', '0'])
+    capsys.readouterr()
+    tm.run(['--profile', '--metrics', 'metrics.ndjson', '--cprofile', 'run.prof', 'completed', '1'])
+    err = capsys.readouterr().err
+    assert err.startswith('Профиль команды completed:\n  разбор аргументов ')
+    assert 'сохранение' in err and 'Пиковая память (tracemalloc): ' in err
+    assert err.endswith('Загружено задач: 1, сохранено изменений: 1.\n')
+    assert not {'_load', '_save', '_set_name_length', '_set_result'} & set(vars(tm))  # Обёртки сняты.
+    tm.run(['--metrics', 'metrics.ndjson', 'current'])
+    assert capsys.readouterr().err == ''
+    with open('metrics.ndjson', encoding='utf8') as file:
+        first, second = map(json.loads, file)
+    assert first['command'] == 'completed' and first['changes'] == 1 and first['phases']['save'] > 0
+    assert second['command'] == 'current' and second['tasks'] == 1 and second['peak_memory'] > 0
+    assert set(second['phases']) == {'parse', 'load', 'command', 'render', 'save'}
+    assert os.path.getsize('run.prof') > 0